@@ -47,6 +47,97 @@ class Settings(BaseSettings):
         "level3PointsBonus": 10.0,  # Instant points bonus per level 3 referral
     }
     
+    # Leaderboards - "auto" uses Redis when reachable, otherwise an in-process board
+    LEADERBOARD_BACKEND: str = "auto"
+    LEADERBOARD_RECONCILE_INTERVAL: int = 600  # Rebuild from the users table every 10 minutes
+    
+    # Referral graph analytics index
+    REFERRAL_GRAPH_REFRESH_INTERVAL: int = 60  # Pick up new signups at most once a minute
+    REFERRAL_GRAPH_FULL_RELOAD_INTERVAL: int = 3600  # Full reload catches late referral code submissions
+    
+    # Reward ledger
+    REWARD_LEDGER_BATCH_SIZE: int = 500  # Rows per multi-row INSERT at commit
+    REWARD_LEDGER_COMPACTION_INTERVAL: int = 300  # Fold new events into snapshots every 5 minutes
+    REWARD_LEDGER_COMPACTION_CHUNK: int = 10000  # Events per compaction step
+    REWARD_LEDGER_COMPACTION_LAG: int = 60  # Leave events younger than this in the tail
+    
+    # Mining stats anchors
+    MINING_STATS_CACHE_TTL: int = 120  # Seconds an anchor may be served without touching the DB
+    MINING_STATS_CACHE_MAX_ENTRIES: int = 100000  # In-process cache bound when Redis is unavailable
+    
+    # Mining auto-claim scheduler (opt-in)
+    MINING_AUTO_CLAIM_ENABLED: bool = False
+    MINING_AUTO_CLAIM_INTERVAL: int = 300  # Look for matured sessions every 5 minutes
+    MINING_AUTO_CLAIM_CHUNK: int = 1000  # Sessions credited per UPDATE
+    
+    # Issuance forecasting
+    FORECAST_SNAPSHOT_TTL: int = 300  # Reuse the user snapshot across forecasts for 5 minutes
+    FORECAST_MAX_DAYS: int = 365
+    
+    # KYC state - "auto" uses Redis when reachable (required for more than one worker)
+    KYC_STATE_BACKEND: str = "auto"
+    KYC_SESSION_TTL: int = 1800  # Liveness sessions expire after 30 minutes
+    KYC_ATTEMPT_WINDOW: int = 3600  # Attempts are counted over a sliding hour
+    KYC_ATTEMPT_BUCKETS: int = 12  # Sliding window resolution (5 minutes with the default window)
+    KYC_BAN_DURATION: int = 3600
+    KYC_VIOLATION_TTL: int = 86400  # Duplicate violations are kept for a day
+    KYC_EXPIRY_TICK_INTERVAL: int = 5  # Seconds between expiry ticks of the in-process store
+    
+    # AWS Rekognition client
+    KYC_AWS_MAX_CONCURRENCY: int = 16  # Executor threads and HTTP connection pool size
+    KYC_AWS_CONNECT_TIMEOUT: float = 3.0
+    KYC_AWS_READ_TIMEOUT: float = 10.0
+    KYC_AWS_CALL_TIMEOUT: float = 15.0  # Upper bound per call, including time queued for a thread
+    
+    # KYC liveness provider - "auto" uses Rekognition when AWS credentials are set, the simulator otherwise
+    KYC_PROVIDER: str = "auto"
+    KYC_SIMULATOR_LATENCY_MS: float = 300.0  # Median simulated provider call latency
+    KYC_SIMULATOR_LATENCY_SIGMA: float = 0.5  # Lognormal spread of the latency
+    KYC_SIMULATOR_PROCESSING_SECONDS: float = 2.0  # Sessions report IN_PROGRESS until this old
+    KYC_SIMULATOR_PASS_RATE: float = 0.9
+    KYC_SIMULATOR_DUPLICATE_RATE: float = 0.0  # Share of sessions that reuse one shared face
+    KYC_PROVIDER_FALLBACK: str = ""  # Provider for new sessions while the configured one's circuit is open (never "simulator" in production)
+    
+    # Provider circuit breaker and health probe
+    KYC_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive timeouts, connection errors, throttles or 5xx
+    KYC_BREAKER_RESET_SECONDS: float = 30.0  # Open period before a trial call is let through
+    KYC_HEALTH_PROBE_INTERVAL: float = 15.0
+    KYC_HEALTH_PROBE_TIMEOUT: float = 5.0
+    
+    # verify-result long polling (?wait=seconds)
+    KYC_LONG_POLL_MAX_SECONDS: float = 25.0  # Stay under typical proxy idle timeouts
+    KYC_WATCH_INITIAL_DELAY: float = 0.5  # First gap between provider polls, grown 1.5x per poll
+    KYC_WATCH_MAX_DELAY: float = 5.0
+    
+    # Post-liveness face review (hashing, dedup, bans) runs in background batches
+    KYC_REVIEW_WORKERS: int = 2
+    KYC_REVIEW_BATCH_SIZE: int = 16
+    KYC_REVIEW_BATCH_WINDOW: float = 0.25  # Seconds a worker waits to fill a batch
+    KYC_REVIEW_CONCURRENCY: int = 8  # Concurrent provider calls across all review workers
+    KYC_REVIEW_STALE_SECONDS: int = 120  # Re-queue reviews still pending after this long (e.g. worker restart)
+    
+    # KYC images - written to disk, most recent also held in memory
+    KYC_IMAGE_DIR: str = "kyc_images"
+    KYC_IMAGE_MEMORY_MAX_BYTES: int = 32 * 1024 * 1024
+    
+    # Face images are downscaled and re-encoded before provider calls
+    KYC_IMAGE_MAX_DIMENSION: int = 1280  # Longest side; Rekognition needs faces of ~100px, not 12 MP
+    KYC_IMAGE_JPEG_QUALITY: int = 88
+    KYC_IMAGE_WORKERS: int = 2
+    
+    # Face similarity index
+    KYC_FACE_MATCH_THRESHOLD: float = 0.05  # Max distance between normalized landmark vectors to count as the same face
+    KYC_FACE_INDEX_BRUTE_FORCE_MAX: int = 10000  # Above this many faces, candidates come from the LSH tables (brute force is ~0.5ms here)
+    KYC_FACE_INDEX_TABLES: int = 24
+    KYC_FACE_INDEX_HASHES: int = 8  # Projections combined per table; more means fewer candidates per lookup
+    KYC_FACE_INDEX_RELOAD_INTERVAL: int = 3600  # Full reload drops faces deleted by other workers
+    
+    # Offline re-dedup of stored faces (scripts/rededup_faces.py)
+    KYC_REDEDUP_DIR: str = "kyc_rededup"  # Checkpoint and intermediate files; a run resumes from here
+    KYC_REDEDUP_PARTITIONS: int = 64  # Bucket partitions, one process pool task each
+    KYC_REDEDUP_CHUNK_SIZE: int = 50000  # Faces exported per checkpoint
+    KYC_REDEDUP_VIOLATION_TTL: int = 2592000  # Scan findings stay in the violations list for 30 days (clusters are also kept in the DB)
+    
     # Admin - Replace with your actual admin wallet addresses
     ADMIN_WALLET_ADDRESSES: List[str] = [
         "0x0000000000000000000000000000000000000000"  # Replace with your admin wallet
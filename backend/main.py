@@ -12,6 +12,9 @@ from database import get_db, engine
 from models import Base
 from routers import auth, users, tasks, admin, analytics, kyc
 from config import settings
+from services.leaderboard_service import start_reconcile_thread
+from services.reward_ledger import start_compaction_thread
+from services.mining_scheduler import start_auto_claim_thread
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -31,6 +34,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # Read by clients that revalidate with If-None-Match
 )
 
 # Security
@@ -44,6 +48,15 @@ app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 app.include_router(kyc.router, prefix="/api/kyc", tags=["KYC"])
 
+@app.on_event("startup")
+async def start_background_jobs():
+    # Seed the leaderboards from the users table and keep them reconciled
+    start_reconcile_thread()
+    # Fold reward events into balance snapshots
+    start_compaction_thread()
+    # Credit matured mining sessions in batches (only if MINING_AUTO_CLAIM_ENABLED)
+    start_auto_claim_thread()
+
 @app.get("/")
 async def root():
     return {
@@ -37,20 +37,19 @@ def run_migration():
         """)
         
         if cursor.fetchone():
-            print("face_hash column already exists, skipping migration")
-            cursor.close()
-            conn.close()
-            return True
-        
-        # Add face_hash column
-        cursor.execute("""
-            ALTER TABLE users 
-            ADD COLUMN face_hash VARCHAR(255) NULL
-        """)
+            print("face_hash column already exists, skipping column creation")
+        else:
+            # Add face_hash column
+            cursor.execute("""
+                ALTER TABLE users 
+                ADD COLUMN face_hash VARCHAR(255) NULL
+            """)
         
-        # Create index on face_hash for faster lookups
+        # Unique index so a face can only complete KYC on one account
+        # (same name as the index declared on the User model)
+        cursor.execute("DROP INDEX IF EXISTS idx_users_face_hash")
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_users_face_hash 
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_users_face_hash 
             ON users(face_hash)
         """)
         
@@ -58,8 +57,8 @@ def run_migration():
         conn.close()
         
         print(f"✅ PostgreSQL Migration completed successfully at {datetime.now()}")
-        print("   - Added face_hash column to users table")
-        print("   - Created index on face_hash for performance")
+        print("   - Ensured face_hash column on users table")
+        print("   - Created unique index ix_users_face_hash")
         
         return True
         
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Migration to make users.face_hash unique so duplicate-face detection is enforced by the database
+"""
+import sqlite3
+import os
+from datetime import datetime
+
+def run_migration():
+    """Add face_hash if missing and replace its plain index with a unique one"""
+    
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'cryptoairdrop.db')
+    
+    if not os.path.exists(db_path):
+        print(f"Database not found at: {db_path}")
+        return False
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'face_hash' not in columns:
+            cursor.execute("""
+                ALTER TABLE users 
+                ADD COLUMN face_hash VARCHAR(255) NULL
+            """)
+        
+        # A unique index can't be built over existing duplicates
+        cursor.execute("""
+            SELECT face_hash, COUNT(*) FROM users 
+            WHERE face_hash IS NOT NULL 
+            GROUP BY face_hash HAVING COUNT(*) > 1
+        """)
+        duplicates = cursor.fetchall()
+        if duplicates:
+            print(f"❌ Migration aborted: {len(duplicates)} face hashes are shared by several users")
+            for face_hash, count in duplicates[:20]:
+                print(f"   - {face_hash}: {count} users")
+            conn.close()
+            return False
+        
+        # Same name as the unique index declared on the User model
+        cursor.execute("DROP INDEX IF EXISTS idx_users_face_hash")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_users_face_hash 
+            ON users(face_hash)
+        """)
+        
+        conn.commit()
+        conn.close()
+        
+        print(f"✅ Migration completed successfully at {datetime.now()}")
+        print("   - Ensured face_hash column on users table")
+        print("   - Replaced idx_users_face_hash with unique index ix_users_face_hash")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        if 'conn' in locals():
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    run_migration()
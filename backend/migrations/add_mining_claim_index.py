@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+SQLite migration to add the (is_mining, last_mining_claim) index used by the mining auto-claim scheduler
+(PostgreSQL deployments run add_mining_claim_index_postgresql.py)
+"""
+import sqlite3
+import os
+from datetime import datetime
+
+def run_migration():
+    """Create index on users(is_mining, last_mining_claim)"""
+    
+    db_path = os.path.join(os.path.dirname(__file__), '..', 'cryptoairdrop.db')
+    
+    if not os.path.exists(db_path):
+        print(f"Database not found at: {db_path}")
+        return False
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        # Same name as the Index declared on the User model, so create_all and this script agree
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_users_is_mining_last_mining_claim 
+            ON users(is_mining, last_mining_claim)
+        """)
+        
+        conn.commit()
+        conn.close()
+        
+        print(f"✅ Migration completed successfully at {datetime.now()}")
+        print("   - Created index on users(is_mining, last_mining_claim)")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        if 'conn' in locals():
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL Migration to add the (is_mining, last_mining_claim) index used by the mining auto-claim scheduler
+"""
+import os
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from datetime import datetime
+
+def run_migration():
+    """Create index on users(is_mining, last_mining_claim) in PostgreSQL without locking writes"""
+
+    # Get database connection details from environment
+    db_host = os.getenv('DB_HOST', 'localhost')
+    db_port = os.getenv('DB_PORT', '5432')
+    db_name = os.getenv('DB_NAME', 'cryptoairdrop')
+    db_user = os.getenv('DB_USER', 'postgres')
+    db_password = os.getenv('DB_PASSWORD', '')
+
+    try:
+        # Connect to PostgreSQL
+        conn = psycopg2.connect(
+            host=db_host,
+            port=db_port,
+            database=db_name,
+            user=db_user,
+            password=db_password
+        )
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+
+        # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+        cursor.execute("""
+            SELECT i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'ix_users_is_mining_last_mining_claim'
+        """)
+        row = cursor.fetchone()
+        if row and not row[0]:
+            print("Found an invalid ix_users_is_mining_last_mining_claim, rebuilding it")
+            cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_is_mining_last_mining_claim")
+
+        # Same name and columns as the Index declared on the User model, so create_all and this script agree
+        cursor.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_is_mining_last_mining_claim
+            ON users(is_mining, last_mining_claim)
+        """)
+
+        cursor.close()
+        conn.close()
+
+        print(f"✅ PostgreSQL Migration completed successfully at {datetime.now()}")
+        print("   - Created index ix_users_is_mining_last_mining_claim on users(is_mining, last_mining_claim)")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ PostgreSQL Migration failed: {e}")
+        if 'conn' in locals():
+            conn.close()
+        return False
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -36,14 +36,18 @@ class User(Base):
     kyc_completed = Column(Boolean, default=False)
     is_admin = Column(Boolean, default=False)  # Admin status
     
-    # KYC Face tracking (temporarily disabled - using in-memory storage)
-    # face_hash = Column(String, nullable=True, index=True)  # Unique face identifier for deduplication
+    # KYC Face tracking - unique so a face can only complete KYC on one account
+    face_hash = Column(String(255), nullable=True, unique=True, index=True)
     
     # Mining fields - using default values for now
     mining_points = Column(Float, default=0.0, server_default='0.0')
     mining_speed = Column(Float, default=10.0, server_default='10.0')  # points per hour
     last_mining_claim = Column(DateTime(timezone=True), nullable=True)
     is_mining = Column(Boolean, default=False, server_default='false')
+    
+    __table_args__ = (
+        Index("ix_users_is_mining_last_mining_claim", "is_mining", "last_mining_claim"),  # Matured session scans
+    )
 
 class AdminNotification(Base):
     __tablename__ = "admin_notifications"
@@ -70,3 +74,55 @@ class SystemSettings(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class RewardEvent(Base):
+    __tablename__ = "reward_events"
+    
+    # Append-only: rows are never updated or deleted
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # No FK so history survives user deletion
+    event_type = Column(String, nullable=False)  # 'referral_level1', 'mining_claim', 'base_airdrop', etc.
+    balance = Column(String, nullable=False)  # 'mining_points', 'total_earnings' or 'referral_earnings'
+    amount = Column(Float, nullable=False)
+    related_user_id = Column(Integer, nullable=True)  # e.g. the referred user for referral credits
+    event_data = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_reward_events_user_id_id", "user_id", "id"),  # Snapshot tail scans
+    )
+
+class RewardBalanceSnapshot(Base):
+    __tablename__ = "reward_balance_snapshots"
+    
+    # Balances folded from every event up to and including last_event_id
+    user_id = Column(Integer, primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+    mining_points = Column(Float, default=0.0)
+    total_earnings = Column(Float, default=0.0)
+    referral_earnings = Column(Float, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class FaceEmbedding(Base):
+    __tablename__ = "face_embeddings"
+    
+    # Normalized landmark vector of a user's KYC reference face, for near-duplicate search
+    id = Column(Integer, primary_key=True, index=True)  # Increasing ids let workers load new rows incrementally
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+    vector = Column(LargeBinary, nullable=False)  # float32 array, see services/face_similarity.py
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class KycDuplicateCluster(Base):
+    __tablename__ = "kyc_duplicate_clusters"
+    
+    # A group of accounts found sharing one face by the batch re-dedup scan; kept until deleted
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, nullable=False)  # Re-dedup run that found it
+    position = Column(Integer, nullable=False)  # Cluster index within the run, so a resumed report skips it
+    user_ids = Column(JSON, nullable=False)  # Oldest account first
+    user_emails = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_kyc_duplicate_clusters_run_id_position", "run_id", "position", unique=True),
+    )
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
@@ -10,6 +11,15 @@ from schemas import UserResponse
 from routers.auth import get_current_user
 from config import settings
 from services.notification_service import NotificationService
+from services.mining_speed_service import SPEED_SETTING_KEYS, start_recompute_job, get_current_job
+from services import reward_ledger
+from services.mining_stats_cache import mining_stats_cache
+from services import mining_scheduler
+from services.kyc_state import kyc_state, USER as KYC_USER
+from services.face_similarity import remove_face_vector, face_index_stats
+from services.issuance_forecast import run_forecast
+from services.leaderboard_service import leaderboard
+from services.session_hooks import after_commit
 
 router = APIRouter()
 
@@ -171,23 +181,19 @@ async def clear_kyc_cache(admin_user: User = Depends(is_admin)):
         )
 
 @router.get("/kyc-cache-status")
-async def get_kyc_cache_status(admin_user: User = Depends(is_admin)):
+async def get_kyc_cache_status(admin_user: User = Depends(is_admin), db: Session = Depends(get_db)):
     """Get KYC cache status and statistics (admin only)"""
     try:
-        # Import KYC cache variables
-        from routers.kyc import active_sessions, user_attempts, face_attempts, banned_users, banned_faces, face_hash_storage, duplicate_violations
-        
         return {
             "success": True,
             "cache_stats": {
-                "active_sessions": len(active_sessions),
-                "user_attempts": len(user_attempts),
-                "face_attempts": len(face_attempts),
-                "banned_users": len(banned_users),
-                "banned_faces": len(banned_faces),
-                "face_hash_storage": len(face_hash_storage),
-                "duplicate_violations": len(duplicate_violations)
+                **kyc_state.stats(),
+                "face_hash_storage": db.query(func.count(User.id)).filter(User.face_hash.isnot(None)).scalar()
             },
+            "state_backend": kyc_state.backend_name,
+            "expiry": kyc_state.expiry_stats(),
+            "face_index": face_index_stats(),
+            "attempt_keys": kyc_state.attempt_stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -208,22 +214,15 @@ async def reset_user_kyc(user_id: int, admin_user: User = Depends(is_admin), db:
                 detail="User not found"
             )
         
-        # Reset KYC status
+        # Reset KYC status and release the face hash for re-verification
         user.kyc_completed = False
-        
-        # Clear user's KYC-related cache data
-        from routers.kyc import user_attempts, banned_users, face_hash_storage
+        user.face_hash = None
+        remove_face_vector(db, user_id)
         
         # Remove from caches
-        if user_id in user_attempts:
-            del user_attempts[user_id]
-        if user_id in banned_users:
-            banned_users.discard(user_id)
-        
-        # Remove face hash if exists
-        face_hashes_to_remove = [fh for fh, uid in face_hash_storage.items() if uid == user_id]
-        for fh in face_hashes_to_remove:
-            del face_hash_storage[fh]
+        kyc_state.reset_attempts(KYC_USER, user_id)
+        kyc_state.unban(KYC_USER, user_id)
+        kyc_state.delete_user_sessions(user_id)
         
         db.commit()
         
@@ -255,18 +254,9 @@ async def get_user_kyc_status(user_id: int, admin_user: User = Depends(is_admin)
                 detail="User not found"
             )
         
-        # Get cache data
-        from routers.kyc import user_attempts, banned_users, face_hash_storage, active_sessions
-        
-        # Find user's face hash
-        user_face_hash = None
-        for fh, uid in face_hash_storage.items():
-            if uid == user_id:
-                user_face_hash = fh
-                break
-        
         # Find active sessions for this user
-        user_sessions = [sid for sid, data in active_sessions.items() if data.get('user_id') == user_id]
+        user_sessions = kyc_state.sessions_for_user(user_id)
+        attempt_count = kyc_state.attempt_count(KYC_USER, user_id)
         
         return {
             "success": True,
@@ -279,10 +269,10 @@ async def get_user_kyc_status(user_id: int, admin_user: User = Depends(is_admin)
                 "updated_at": user.updated_at.isoformat() if user.updated_at else None
             },
             "cache_data": {
-                "has_attempts": user_id in user_attempts,
-                "attempt_count": len(user_attempts.get(user_id, [])),
-                "is_banned": user_id in banned_users,
-                "face_hash": user_face_hash,
+                "has_attempts": attempt_count > 0,
+                "attempt_count": attempt_count,
+                "is_banned": kyc_state.is_banned(KYC_USER, user_id),
+                "face_hash": user.face_hash,
                 "active_sessions": user_sessions
             },
             "timestamp": datetime.utcnow().isoformat()
@@ -296,14 +286,20 @@ async def get_user_kyc_status(user_id: int, admin_user: User = Depends(is_admin)
         )
 
 @router.get("/face-hash-storage")
-async def get_face_hash_storage(admin_user: User = Depends(is_admin)):
-    """Get all face hash storage data (admin only)"""
+async def get_face_hash_storage(
+    skip: int = 0,
+    limit: int = 1000,
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Get stored face hashes, one page at a time (admin only)"""
     try:
-        from routers.kyc import face_hash_storage
+        query = db.query(User.face_hash, User.id).filter(User.face_hash.isnot(None))
+        rows = query.order_by(User.id).offset(skip).limit(limit).all()
         
         # Convert face hash storage to a more readable format
         face_hash_data = []
-        for face_hash, user_id in face_hash_storage.items():
+        for face_hash, user_id in rows:
             face_hash_data.append({
                 "face_hash": face_hash,
                 "user_id": user_id
@@ -311,7 +307,7 @@ async def get_face_hash_storage(admin_user: User = Depends(is_admin)):
         
         return {
             "success": True,
-            "face_hash_count": len(face_hash_storage),
+            "face_hash_count": query.count(),
             "face_hashes": face_hash_data,
             "timestamp": datetime.utcnow().isoformat()
         }
@@ -356,6 +352,8 @@ async def ban_user(
         # Ban the user
         user.is_active = False
         user.kyc_completed = False  # Reset KYC status when banned
+        mining_stats_cache.invalidate(user.id)
+        after_commit(db, lambda: leaderboard.remove_user(user_id))
         
         # Create admin notification for manual ban
         try:
@@ -415,6 +413,10 @@ async def unban_user(
         
         # Unban the user
         user.is_active = True
+        # Back on the boards once the unban commits; scores are read now, before commit expires them
+        referrals = (user.level1_referrals or 0) + (user.level2_referrals or 0) + (user.level3_referrals or 0)
+        mining_points = user.mining_points
+        after_commit(db, lambda: leaderboard.record_user(user_id, referrals=referrals, mining_points=mining_points))
         db.commit()
         
         return {
@@ -559,10 +561,16 @@ async def update_system_settings(
         
         db.commit()
         
+        # Reward formula changed - bring existing users' mining speed in line with it
+        recompute_job = None
+        if SPEED_SETTING_KEYS.intersection(updated_settings):
+            recompute_job = start_recompute_job().to_dict()
+        
         return {
             "success": True,
             "message": "Settings updated successfully",
-            "updated_settings": updated_settings
+            "updated_settings": updated_settings,
+            "mining_speed_recompute": recompute_job
         }
         
     except Exception as e:
@@ -570,4 +578,193 @@ async def update_system_settings(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update settings: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/mining-speed/recompute")
+async def recompute_mining_speed(
+    request: dict,
+    admin_user: User = Depends(is_admin)
+):
+    """Recompute every user's mining speed from the current reward settings (admin only)"""
+    dry_run = bool(request.get("dry_run", False))
+    chunk_size = int(request.get("chunk_size", 10000))
+    
+    job = start_recompute_job(dry_run=dry_run, chunk_size=chunk_size)
+    
+    return {
+        "success": True,
+        "message": ("Mining speed recomputation queued after the current run" if job.rerun_requested
+                    else "Mining speed recomputation started") + (" (dry run)" if dry_run else ""),
+        "job": job.to_dict()
+    }
+
+@router.get("/mining-speed/recompute/status")
+async def get_mining_speed_recompute_status(admin_user: User = Depends(is_admin)):
+    """Get progress of the latest mining speed recomputation (admin only)"""
+    job = get_current_job()
+    
+    return {
+        "success": True,
+        "job": job.to_dict() if job else None
+    }
+
+@router.get("/rewards/ledger/{user_id}")
+async def audit_user_rewards(
+    user_id: int,
+    limit: int = 100,
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Audit a user's reward ledger against their cached balances (admin only)"""
+    try:
+        return {
+            "success": True,
+            **reward_ledger.audit_user(db, user_id, limit=max(1, min(limit, 1000)))
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to audit reward ledger: {str(e)}"
+        )
+
+@router.post("/rewards/ledger/{user_id}/rebuild")
+async def rebuild_user_rewards(
+    user_id: int,
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Reset a user's cached balances to the reward ledger balance (admin only)"""
+    balances = reward_ledger.rebuild_user_balance(db, user_id)
+    if balances is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    mining_stats_cache.invalidate(user_id)
+    
+    return {
+        "success": True,
+        "message": f"Balances rebuilt from reward ledger for user {user_id}",
+        "balances": balances
+    }
+
+@router.post("/rewards/ledger/compact")
+async def compact_reward_ledger(
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Fold new reward events into balance snapshots now (admin only)"""
+    try:
+        return {
+            "success": True,
+            **reward_ledger.compact_snapshots(db)
+        }
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compact reward ledger: {str(e)}"
+        )
+
+@router.get("/mining/auto-claim/status")
+async def get_auto_claim_status(admin_user: User = Depends(is_admin)):
+    """Get auto-claim scheduler throughput metrics (admin only)"""
+    return {
+        "success": True,
+        "auto_claim": mining_scheduler.metrics.to_dict()
+    }
+
+@router.post("/mining/auto-claim/run")
+async def run_auto_claim_now(
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Claim all matured mining sessions now (admin only)"""
+    try:
+        return {
+            "success": True,
+            "tick": mining_scheduler.run_auto_claim(db)
+        }
+    except Exception as e:
+        db.rollback()
+        mining_scheduler.metrics.record_error()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to run auto-claim: {str(e)}"
+        )
+
+@router.post("/rewards/forecast")
+async def forecast_issuance(
+    request: dict,
+    admin_user: User = Depends(is_admin),
+    db: Session = Depends(get_db)
+):
+    """Project points and tokens issued under proposed reward parameters (admin only)
+
+    Body: {"days": 30, "scenarios": [{"name": "...", "baseMiningSpeed": 8, ...}],
+    "retention": 0.98, "daily_signups": 500, "referral_share": null, "mining_adoption": null}
+    """
+    try:
+        days = int(request.get("days", 30))
+        retention = float(request.get("retention", 1.0))
+        daily_signups = float(request.get("daily_signups", 0))
+        # None means "measure it from the current user base"
+        shares = {
+            name: None if request.get(name) is None else float(request.get(name))
+            for name in ("referral_share", "mining_adoption")
+        }
+    except (TypeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid forecast parameters: {str(e)}"
+        )
+    if days < 1 or days > settings.FORECAST_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days must be between 1 and {settings.FORECAST_MAX_DAYS}"
+        )
+    for name, value in {"retention": retention, **shares}.items():
+        if value is not None and not 0 <= value <= 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{name} must be between 0 and 1"
+            )
+    if daily_signups < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="daily_signups must not be negative"
+        )
+    scenarios = request.get("scenarios", [])
+    if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="scenarios must be a list of parameter objects"
+        )
+    
+    try:
+        # A cold snapshot loads every active user; keep that off the event loop
+        forecast = await asyncio.to_thread(
+            run_forecast,
+            db,
+            scenarios,
+            days=days,
+            retention=retention,
+            daily_signups=daily_signups,
+            referral_share=shares["referral_share"],
+            mining_adoption=shares["mining_adoption"],
+            refresh_snapshot=bool(request.get("refresh_snapshot", False))
+        )
+        return {
+            "success": True,
+            "forecast": forecast
+        }
+    except (TypeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid forecast parameters: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to run issuance forecast: {str(e)}"
+        )
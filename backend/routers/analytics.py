@@ -6,7 +6,8 @@ from datetime import datetime, timedelta
 
 from database import get_db
 from models import User
-from routers.auth import get_current_user
+from routers.auth import get_current_user, get_admin_user
+from services.referral_graph import referral_graph
 
 router = APIRouter()
 
@@ -22,3 +23,52 @@ async def get_dashboard_analytics(current_user: User = Depends(get_current_user)
         "level2_referrals": current_user.level2_referrals,
         "level3_referrals": current_user.level3_referrals
     }
+
+@router.get("/admin/referral-graph/subtree/{user_id}")
+async def get_referral_subtree(
+    user_id: int,
+    max_depth: int = 10,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Get downline size and per-level breakdown for a user (admin only)"""
+    subtree = referral_graph.get(db).subtree(user_id, max_depth=max(1, min(max_depth, 100)))
+    if subtree is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found in referral graph"
+        )
+    return subtree
+
+@router.get("/admin/referral-graph/depth-histogram")
+async def get_referral_depth_histogram(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Get the distribution of users by referral depth (admin only)"""
+    return referral_graph.get(db).depth_histogram()
+
+@router.get("/admin/referral-graph/top-downlines")
+async def get_top_downlines(
+    limit: int = 10,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Get users with the largest downlines (admin only)"""
+    return {
+        "top_downlines": referral_graph.get(db).top_downlines(max(1, min(limit, 1000)))
+    }
+
+@router.get("/admin/referral-graph/status")
+async def get_referral_graph_status(current_user: User = Depends(get_admin_user)):
+    """Get referral graph index status (admin only)"""
+    return referral_graph.status()
+
+@router.post("/admin/referral-graph/refresh")
+async def refresh_referral_graph(
+    full: bool = False,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Refresh the referral graph index now (admin only)"""
+    return referral_graph.refresh(db, full=full)
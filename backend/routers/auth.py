@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy import update
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
@@ -13,8 +14,14 @@ from email.mime.multipart import MIMEMultipart
 
 from database import get_db
 from models import User
-from schemas import UserCreate, UserResponse, Token, UserLogin, EmailVerification, ResendVerificationRequest, MiningStatsResponse, StartMiningResponse
+from schemas import UserCreate, UserResponse, Token, UserLogin, EmailVerification, ResendVerificationRequest, MiningStatsResponse, MiningAnchorResponse, StartMiningResponse
 from config import settings
+from services.leaderboard_service import leaderboard
+from services.mining_speed_service import get_reward_parameters, mining_speed_expression
+from services.reward_ledger import record_reward
+from services.mining_stats_cache import mining_stats_cache, build_mining_anchor
+from services.session_hooks import after_commit
+from services.face_similarity import remove_face_vector
 
 # Note: Rate limiting removed to avoid scoping issues
 
@@ -684,6 +691,11 @@ async def update_user(
     if "wallet_address" in user_data:
         user.wallet_address = user_data["wallet_address"]
     if "total_earnings" in user_data:
+        record_reward(
+            db, user.id, "admin_adjustment", "total_earnings",
+            (user_data["total_earnings"] or 0.0) - (user.total_earnings or 0.0),
+            event_data={"adjusted_by": current_user.id}
+        )
         user.total_earnings = user_data["total_earnings"]
     if "is_active" in user_data:
         # Prevent admin users from being banned through admin panel
@@ -698,6 +710,7 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    mining_stats_cache.invalidate(user.id)
     
     return {
         "message": "User updated successfully",
@@ -767,8 +780,10 @@ async def ban_user(
     
     # Ban the user
     user.is_active = False
+    after_commit(db, lambda: leaderboard.remove_user(user_id))
     db.commit()
     db.refresh(user)
+    mining_stats_cache.invalidate(user.id)
     
     return {
         "message": f"User {user.email} has been successfully banned!",
@@ -790,9 +805,12 @@ async def delete_user(
             detail="User not found"
         )
     
-    # Delete user
+    # Delete user (and the KYC face vector referencing it)
+    remove_face_vector(db, user_id)
     db.delete(user)
     db.commit()
+    leaderboard.remove_user(user_id)
+    mining_stats_cache.invalidate(user_id)
     
     return {
         "message": "User deleted successfully"
@@ -832,24 +850,95 @@ async def get_mining_stats(current_user: User = Depends(get_current_user)):
         points_earned_since_last_claim=points_earned
     )
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header value (possibly a list or weak validators) against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+@router.get("/mining/stats/anchor", response_model=MiningAnchorResponse)
+async def get_mining_anchor(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """Get mining rate and anchor timestamp so the client can extrapolate points locally"""
+    anchor = mining_stats_cache.get(int(user_id))
+    if anchor is None:
+        # Cache miss - load with the usual user checks (banned users are never cached)
+        user = get_current_user(user_id, db)
+        anchor = build_mining_anchor(user)
+        mining_stats_cache.set(user.id, anchor)
+    
+    headers = {"ETag": anchor["etag"], "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), anchor["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    response.headers.update(headers)
+    return MiningAnchorResponse(
+        mining_points=anchor["mining_points"],
+        mining_speed=anchor["mining_speed"],
+        points_per_second=anchor["points_per_second"],
+        is_mining=anchor["is_mining"],
+        anchor_at=anchor["anchor_at"],
+        next_claim_at=anchor["next_claim_at"],
+        max_claim_points=anchor["max_claim_points"],
+        server_time=datetime.now(timezone.utc)
+    )
+
+def mining_claim_conflict():
+    """Another request changed the mining session between our read and our compare-and-set"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Mining session was already updated by another request. Please refresh your mining stats."
+    )
+
 @router.post("/mining/start", response_model=StartMiningResponse)
 async def start_mining(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Start or claim mining"""
     now = datetime.now(timezone.utc)
     
-    if current_user.is_mining and current_user.last_mining_claim:
+    # Both branches are a single compare-and-set on the last_mining_claim we read,
+    # so double-clicks and retried requests can't credit the same window twice
+    seen_claim = current_user.last_mining_claim
+    
+    if current_user.is_mining and seen_claim:
         # Ensure last_mining_claim is timezone-aware for comparison
-        last_claim = current_user.last_mining_claim
+        last_claim = seen_claim
         if last_claim.tzinfo is None:
             last_claim = last_claim.replace(tzinfo=timezone.utc)
         time_since_last_claim = (now - last_claim).total_seconds()
         hours_since_last_claim = time_since_last_claim / 3600
         
         if hours_since_last_claim >= 24:
-            # Claim mining rewards
-            points_earned = current_user.mining_speed * 24
-            current_user.mining_points += points_earned
-            current_user.last_mining_claim = now
+            # Claim mining rewards - credited SQL-side so concurrent writers can't lose the increment
+            claimed = db.execute(
+                update(User)
+                .where(
+                    User.id == current_user.id,
+                    User.is_mining == True,
+                    User.last_mining_claim == seen_claim
+                )
+                .values(
+                    mining_points=User.mining_points + User.mining_speed * 24,
+                    last_mining_claim=now
+                )
+                .returning(User.mining_speed, User.mining_points)
+                .execution_options(synchronize_session="fetch")
+            ).first()
+            if not claimed:
+                db.rollback()
+                raise mining_claim_conflict()
+            
+            points_earned = claimed.mining_speed * 24
+            record_reward(
+                db, current_user.id, "mining_claim", "mining_points", points_earned,
+                event_data={"claim_window_start": last_claim.isoformat()}
+            )
+            user_id, mining_points = current_user.id, claimed.mining_points
+            after_commit(db, lambda: leaderboard.record_user(user_id, mining_points=mining_points))
             
             message = f"Successfully claimed {points_earned:.2f} mining points!"
         else:
@@ -860,12 +949,27 @@ async def start_mining(current_user: User = Depends(get_current_user), db: Sessi
                 detail=f"Please wait {remaining_hours:.1f} more hours before claiming mining rewards."
             )
     else:
-        # Start new mining session
-        current_user.is_mining = True
-        current_user.last_mining_claim = now
+        # Start new mining session - only if it is still not started
+        session_unchanged = User.last_mining_claim.is_(None) if seen_claim is None else User.last_mining_claim == seen_claim
+        started = db.execute(
+            update(User)
+            .where(
+                User.id == current_user.id,
+                User.is_mining == current_user.is_mining,
+                session_unchanged
+            )
+            .values(is_mining=True, last_mining_claim=now)
+            .returning(User.id)
+            .execution_options(synchronize_session="fetch")
+        ).first()
+        if not started:
+            db.rollback()
+            raise mining_claim_conflict()
+        
         message = "Mining started! You can claim rewards after 24 hours."
     
     db.commit()
+    mining_stats_cache.invalidate(current_user.id)
     
     # Get updated mining stats
     mining_stats = await get_mining_stats(current_user)
@@ -879,16 +983,17 @@ async def start_mining(current_user: User = Depends(get_current_user), db: Sessi
 async def update_mining_speed(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Update mining speed based on referral levels"""
     # Calculate mining speed based on referral levels
-    # Use configurable base speed and referral bonuses
-    base_speed = settings.BASE_MINING_SPEED
-    level1_bonus = current_user.level1_referrals * settings.REFERRAL_REWARDS.get("level1SpeedBonus", 2.0)
-    level2_bonus = current_user.level2_referrals * settings.REFERRAL_REWARDS.get("level2SpeedBonus", 1.0)
-    level3_bonus = current_user.level3_referrals * settings.REFERRAL_REWARDS.get("level3SpeedBonus", 0.5)
-    
-    new_speed = base_speed + level1_bonus + level2_bonus + level3_bonus
+    # Use configurable base speed and referral bonuses (admin settings override config)
+    new_speed = mining_speed_expression(
+        current_user.level1_referrals,
+        current_user.level2_referrals,
+        current_user.level3_referrals,
+        get_reward_parameters(db)
+    )
     current_user.mining_speed = new_speed
     
     db.commit()
+    mining_stats_cache.invalidate(current_user.id)
     
     return {
         "message": f"Mining speed updated to {new_speed:.1f} points/hour",
@@ -900,108 +1005,123 @@ async def update_mining_speed(current_user: User = Depends(get_current_user), db
 
 async def update_mining_speed_for_user(db: Session, user_id: int):
     """Update mining speed for a specific user based on their referral levels"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return
+    # Recompute from the stored counts inside the UPDATE so it sees concurrent increments
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(mining_speed=mining_speed_expression(
+            User.level1_referrals,
+            User.level2_referrals,
+            User.level3_referrals,
+            get_reward_parameters(db)
+        ))
+    )
+    # Invalidated once the caller commits, so a concurrent read can't re-cache the old row
+    after_commit(db, lambda: mining_stats_cache.invalidate(user_id))
+
+def credit_referrer(db: Session, referral_code: str, level: int, new_user_id: int = None):
+    """Atomically credit one referral level to the owner of referral_code.
+    
+    Bumps the level counter, adds the instant points bonus and recomputes the
+    mining speed in a single UPDATE ... RETURNING statement. Returns the
+    (id, referred_by) row of the credited referrer, or None if the code is unknown.
+    """
+    params = get_reward_parameters(db)
+    counter = getattr(User, f"level{level}_referrals")
+    points_bonus = params[f"level{level}PointsBonus"]
+    
+    # SET expressions read the pre-update row, so the speed formula uses the bumped counter explicitly
+    counts = {
+        1: User.level1_referrals,
+        2: User.level2_referrals,
+        3: User.level3_referrals
+    }
+    counts[level] = counts[level] + 1
+    
+    referrer = db.execute(
+        update(User)
+        .where(User.referral_code == referral_code)
+        .values({
+            counter: counter + 1,
+            User.mining_points: User.mining_points + points_bonus,
+            User.mining_speed: mining_speed_expression(counts[1], counts[2], counts[3], params)
+        })
+        .returning(
+            User.id,
+            User.referred_by,
+            User.level1_referrals,
+            User.level2_referrals,
+            User.level3_referrals,
+            User.mining_points
+        )
+    ).first()
     
-    # Calculate mining speed based on referral levels using configurable values
-    base_speed = settings.BASE_MINING_SPEED
-    level1_bonus = user.level1_referrals * settings.REFERRAL_REWARDS.get("level1SpeedBonus", 2.0)
-    level2_bonus = user.level2_referrals * settings.REFERRAL_REWARDS.get("level2SpeedBonus", 1.0)
-    level3_bonus = user.level3_referrals * settings.REFERRAL_REWARDS.get("level3SpeedBonus", 0.5)
+    if referrer:
+        record_reward(db, referrer.id, f"referral_level{level}", "mining_points", points_bonus, related_user_id=new_user_id)
+        # Published once the caller commits; a rolled-back credit never shows up
+        after_commit(db, lambda: mining_stats_cache.invalidate(referrer.id))
+        after_commit(db, lambda: leaderboard.record_user(
+            referrer.id,
+            referrals=referrer.level1_referrals + referrer.level2_referrals + referrer.level3_referrals,
+            mining_points=referrer.mining_points
+        ))
     
-    new_speed = base_speed + level1_bonus + level2_bonus + level3_bonus
-    user.mining_speed = new_speed
+    return referrer
 
 async def process_referral(db: Session, referral_code: str, new_user_id: int):
     """Process referral and award mining speed/points rewards (no tokens)"""
-    referrer = db.query(User).filter(User.referral_code == referral_code).first()
+    referrer = credit_referrer(db, referral_code, 1, new_user_id)
     if not referrer:
         return
     
-    # Update referral counts
-    referrer.level1_referrals += 1
-    
-    # Award mining speed bonus instead of tokens
-    # Level 1 referrals get configurable points/hour mining speed bonus
-    mining_speed_bonus = settings.REFERRAL_REWARDS.get("level1SpeedBonus", 2.0)
-    referrer.mining_speed += mining_speed_bonus
-    
-    # Award some mining points as bonus
-    points_bonus = settings.REFERRAL_REWARDS.get("level1PointsBonus", 50.0)
-    referrer.mining_points += points_bonus
-
     # Process level 2 and 3 referrals if applicable
     if referrer.referred_by:
         await process_level2_referral(db, referrer.referred_by, new_user_id)
     
-    # Update mining speed based on new referral
-    await update_mining_speed_for_user(db, referrer.id)
-    
     db.commit()
 
 async def process_level2_referral(db: Session, referral_code: str, new_user_id: int):
     """Process level 2 referral - award mining speed/points (no tokens)"""
-    referrer = db.query(User).filter(User.referral_code == referral_code).first()
+    referrer = credit_referrer(db, referral_code, 2, new_user_id)
     if not referrer:
         return
     
-    referrer.level2_referrals += 1
-    
-    # Award mining speed bonus instead of tokens
-    # Level 2 referrals get configurable points/hour mining speed bonus
-    mining_speed_bonus = settings.REFERRAL_REWARDS.get("level2SpeedBonus", 1.0)
-    referrer.mining_speed += mining_speed_bonus
-    
-    # Award some mining points as bonus
-    points_bonus = settings.REFERRAL_REWARDS.get("level2PointsBonus", 25.0)
-    referrer.mining_points += points_bonus
-
     # Process level 3 if applicable
     if referrer.referred_by:
         await process_level3_referral(db, referrer.referred_by, new_user_id)
     
-    # Update mining speed based on new referral
-    await update_mining_speed_for_user(db, referrer.id)
-    
     db.commit()
 
 async def process_level3_referral(db: Session, referral_code: str, new_user_id: int):
     """Process level 3 referral - award mining speed/points (no tokens)"""
-    referrer = db.query(User).filter(User.referral_code == referral_code).first()
+    referrer = credit_referrer(db, referral_code, 3, new_user_id)
     if not referrer:
         return
     
-    referrer.level3_referrals += 1
-    
-    # Award mining speed bonus instead of tokens
-    # Level 3 referrals get configurable points/hour mining speed bonus
-    mining_speed_bonus = settings.REFERRAL_REWARDS.get("level3SpeedBonus", 0.5)
-    referrer.mining_speed += mining_speed_bonus
-    
-    # Award some mining points as bonus
-    points_bonus = settings.REFERRAL_REWARDS.get("level3PointsBonus", 10.0)
-    referrer.mining_points += points_bonus
-
-    # Update mining speed based on new referral
-    await update_mining_speed_for_user(db, referrer.id)
-    
     db.commit()
 
 async def award_base_tokens(db: Session, user_id: int):
     """Award base airdrop tokens and mining setup to new user"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return
-    
-    # Award base airdrop tokens
-    user.total_earnings += settings.BASE_AIRDROP_TOKENS
-    
-    # Set base mining speed and points from config
-    user.mining_speed = settings.BASE_MINING_SPEED
-    user.mining_points = settings.BASE_MINING_POINTS
+    # Award base airdrop tokens and set base mining speed and points (admin settings override config)
+    params = get_reward_parameters(db)
+    awarded = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            total_earnings=User.total_earnings + params["baseAirdropTokens"],
+            mining_speed=params["baseMiningSpeed"],
+            mining_points=User.mining_points + params["baseMiningPoints"]
+        )
+        .returning(User.mining_points)
+    ).first()
+    if awarded:
+        record_reward(db, user_id, "base_airdrop", "total_earnings", params["baseAirdropTokens"])
+        record_reward(db, user_id, "base_mining_points", "mining_points", params["baseMiningPoints"])
 
     db.commit()
+    mining_stats_cache.invalidate(user_id)
+    if awarded:
+        leaderboard.record_user(user_id, mining_points=awarded.mining_points)
 
 @router.post("/submit-referral", response_model=dict)
 async def submit_referral_code(
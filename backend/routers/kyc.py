@@ -1,89 +1,69 @@
 import os
 import uuid
 import time
+import asyncio
 import hashlib
 import base64
 import io
-import json
 import threading
 from typing import Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
-import boto3
-from PIL import Image
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from database import get_db
+from config import settings
+from database import get_db, SessionLocal
 from models import User, SystemSettings
-from routers.auth import get_current_user, get_admin_user
+from routers.auth import get_current_user, get_admin_user, etag_matches
+from services.kyc_state import kyc_state, USER, FACE
+from services.kyc_providers import get_kyc_provider, get_session_provider
+from services.kyc_provider_health import ProviderUnavailableError, is_outage_error, provider_health
+from services.face_similarity import landmark_vector, find_similar_face, store_face_vector, face_index_stats
+from services.kyc_image_store import kyc_images, parse_range
+from services.kyc_image_preprocess import decode_image, encode_jpeg, image_preprocessor
+from services.kyc_session_watcher import session_watcher, TERMINAL_STATUSES
+from services.kyc_review_queue import KycReviewQueue, ReviewJob
+from services.kyc_metrics import kyc_metrics
+from services.kyc_rededup import rededup_clusters, rededup_status
+from services.leaderboard_service import leaderboard
+from services.session_hooks import after_commit
 
 router = APIRouter()
 
-# Initialize AWS Rekognition client (only if credentials are available)
-aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
-aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-aws_region = os.getenv('AWS_REGION', 'us-east-1')
+# Liveness checks go through a provider (services/kyc_providers.py): AWS Rekognition,
+# or the local simulator when AWS credentials are not configured (KYC_PROVIDER)
 
-rekognition = boto3.client(
-    'rekognition',
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    region_name=aws_region
-)
-
-# Store active liveness sessions (in production, use Redis or database)
-active_sessions = {}
+# Liveness sessions, attempt counters, bans and duplicate violations live in the
+# shared KYC state store (services/kyc_state.py) so every worker sees them
 
 # Rate limiting and ban system
-user_attempts = {}  # Track attempts per user
-banned_users = set()  # Set of banned user IDs
-face_attempts = {}  # Track attempts per face hash
-banned_faces = set()  # Set of banned face hashes
 MAX_ATTEMPTS = 3  # Maximum attempts allowed per user
 MAX_FACE_ATTEMPTS = 2  # Maximum attempts per face
-BAN_DURATION = 3600  # Ban duration in seconds (1 hour)
+BAN_DURATION = settings.KYC_BAN_DURATION  # Ban duration in seconds (1 hour)
 
-# Face deduplication storage (in production, use database)
-face_hash_storage = {}  # face_hash -> user_id mapping
-duplicate_violations = {}  # Track duplicate KYC violations
+# Face deduplication is enforced by the unique index on users.face_hash
+# (legacy face_hashes.json files are imported with scripts/import_face_hashes.py)
+# and, for recaptures of the same face, by the landmark similarity index
+# (services/face_similarity.py)
 
-# File-based persistent storage for face hashes
-FACE_HASH_FILE = "face_hashes.json"
+# After a live result, face hashing, dedup and bans run in background review batches
+# (services/kyc_review_queue.py); the session reports PENDING_REVIEW until they finish
 
-def load_face_hashes():
-    """Load face hashes from persistent storage"""
-    global face_hash_storage
-    try:
-        if os.path.exists(FACE_HASH_FILE):
-            with open(FACE_HASH_FILE, 'r') as f:
-                face_hash_storage = json.load(f)
-        else:
-            face_hash_storage = {}
+# Reference and audit images are kept server-side (services/kyc_image_store.py);
+# results carry handles and the bytes are served by GET /images/{session_id}/{name}
 
-    except Exception as e:
-        face_hash_storage = {}
-
-def save_face_hashes():
-    """Save face hashes to persistent storage"""
-    try:
-        with open(FACE_HASH_FILE, 'w') as f:
-            json.dump(face_hash_storage, f, indent=2)
-    except Exception as e:
-        pass
-
-# Load face hashes on startup
-load_face_hashes()
+FINALIZE_WAIT_SECONDS = 10  # How long a concurrent poll waits for another request to apply the verdict
 
 # Cache clearing configuration
-CACHE_CLEAR_INTERVAL = 300  # Clear cache every 5 minutes
-SESSION_TIMEOUT = 1800  # Session timeout in seconds (30 minutes)
-ATTEMPT_CLEANUP_INTERVAL = 3600  # Clean up old attempts every hour
+CACHE_CLEAR_INTERVAL = settings.KYC_EXPIRY_TICK_INTERVAL  # Retire due entries every few seconds
+SESSION_TIMEOUT = settings.KYC_SESSION_TTL  # Session timeout in seconds (30 minutes)
 
 def base64_to_image(base64_string):
     """Convert base64 string to PIL Image"""
@@ -95,50 +75,34 @@ def base64_to_image(base64_string):
         # Decode base64 string
         image_data = base64.b64decode(base64_string)
         
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        return image
+        # Draft-mode decode, upright and RGB, at most the provider's useful resolution
+        return decode_image(image_data, settings.KYC_IMAGE_MAX_DIMENSION)
     except Exception as e:
         raise ValueError(f"Invalid image data: {str(e)}")
 
 def image_to_bytes(image):
     """Convert PIL Image to bytes"""
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='JPEG')
-    return img_byte_arr.getvalue()
-
-def generate_face_hash(image_bytes):
-    """Generate a hash for face tracking"""
-    try:
+    return encode_jpeg(image)
+
+async def extract_face_features(image_bytes, provider=None):
+    """Face hash and normalized landmark vector (None if unavailable) of an image.
+
+    Provider errors, including ProviderUnavailableError while the circuit is open,
+    propagate so the review fails instead of passing with an undeduplicated hash.
+    """
+    with kyc_metrics.timed("generate_face_hash"):
+        # Use the liveness provider to get face landmarks for consistent hashing
+        provider = provider or get_kyc_provider()
+        # Landmarks are relative to the image size, so a downscaled upright copy gives the same face
+        landmarks = await provider.detect_face_landmarks(await image_preprocessor.prepare(image_bytes))
         
-        # Check if AWS credentials are available
-        if not aws_access_key or not aws_secret_key:
-
+        if not landmarks:
+            # Fallback to image hash if no face was detected
             fallback_hash = hashlib.sha256(image_bytes).hexdigest()[:16]
 
-            return fallback_hash
-        
-        # Use AWS Rekognition to get face landmarks for consistent hashing
-        response = rekognition.detect_faces(
-            Image={'Bytes': image_bytes},
-            Attributes=['ALL']
-        )
-        
-        if not response['FaceDetails']:
-
-            fallback_hash = hashlib.sha256(image_bytes).hexdigest()[:16]
-
-            return fallback_hash
-        
-        face = response['FaceDetails'][0]
+            return fallback_hash, None
         
         # Create a hash based on face landmarks and key features
-        landmarks = face.get('Landmarks', [])
         landmark_data = []
         
         # Extract key facial landmarks for consistent hashing
@@ -150,58 +114,33 @@ def generate_face_hash(image_bytes):
         face_string = "|".join(landmark_data)
         face_hash = hashlib.sha256(face_string.encode()).hexdigest()[:16]
 
-        return face_hash
-        
-    except Exception as e:
-        # Fallback to image hash if face detection fails
-        fallback_hash = hashlib.sha256(image_bytes).hexdigest()[:16]
+        return face_hash, landmark_vector(landmarks)
 
-        return fallback_hash
+async def generate_face_hash(image_bytes, provider=None):
+    """Generate a hash for face tracking"""
+    face_hash, _ = await extract_face_features(image_bytes, provider)
+    return face_hash
 
 def is_face_banned(face_hash):
-    """Check if face hash is banned"""
-    if face_hash in banned_faces:
-        # Check if ban has expired
-        if time.time() - face_attempts.get(face_hash, {}).get('banned_at', 0) > BAN_DURATION:
-            # Unban the face
-            banned_faces.discard(face_hash)
-            if face_hash in face_attempts:
-                del face_attempts[face_hash]
-            return False
-        return True
-    return False
+    """Check if face hash is banned (bans expire on their own)"""
+    return kyc_state.is_banned(FACE, face_hash)
 
 def check_face_rate_limit(face_hash):
     """Check if face has exceeded rate limit"""
     if not face_hash:
         return True, 0
     
-    current_time = time.time()
-    
-    # Clean up old attempts (older than 1 hour)
-    if face_hash in face_attempts:
-        attempts = face_attempts[face_hash]
-        attempts['attempts'] = [t for t in attempts['attempts'] if current_time - t < 3600]
-        
-        # If no recent attempts, reset
-        if not attempts['attempts']:
-            del face_attempts[face_hash]
-            return True, 0
-    
     # Check if face is banned
     if is_face_banned(face_hash):
         return False, -1  # -1 indicates banned
     
     # Count recent attempts
-    if face_hash not in face_attempts:
-        face_attempts[face_hash] = {'attempts': [], 'banned_at': 0}
-    
-    recent_attempts = len(face_attempts[face_hash]['attempts'])
+    recent_attempts = kyc_state.attempt_count(FACE, face_hash)
     
     if recent_attempts >= MAX_FACE_ATTEMPTS:
         # Ban the face
-        banned_faces.add(face_hash)
-        face_attempts[face_hash]['banned_at'] = current_time
+        kyc_state.ban(FACE, face_hash, BAN_DURATION)
+        kyc_state.reset_attempts(FACE, face_hash)
         return False, -1  # -1 indicates banned
     
     return True, recent_attempts
@@ -211,11 +150,7 @@ def record_face_attempt(face_hash):
     if not face_hash:
         return
     
-    current_time = time.time()
-    if face_hash not in face_attempts:
-        face_attempts[face_hash] = {'attempts': [], 'banned_at': 0}
-    
-    face_attempts[face_hash]['attempts'].append(current_time)
+    kyc_state.record_attempt(FACE, face_hash, settings.KYC_ATTEMPT_WINDOW)
 
 class CreateSessionRequest(BaseModel):
     userId: Optional[str] = None
@@ -228,110 +163,30 @@ class VerificationResult(BaseModel):
 
 # Duplicate function removed - using the main generate_face_hash function above
 
-def cleanup_old_attempts():
-    """Clean up old attempts and expired bans"""
-    current_time = time.time()
-    
-    # Clean up user attempts older than 1 hour
-    for user_id in list(user_attempts.keys()):
-        attempts = [attempt for attempt in user_attempts[user_id] if current_time - attempt < 3600]
-        if attempts:
-            user_attempts[user_id] = attempts
-        else:
-            del user_attempts[user_id]
-    
-    # Clean up face attempts older than 1 hour
-    for face_hash in list(face_attempts.keys()):
-        attempts = [attempt for attempt in face_attempts[face_hash] if current_time - attempt < 3600]
-        if attempts:
-            face_attempts[face_hash] = attempts
-        else:
-            del face_attempts[face_hash]
-
-def clear_expired_sessions():
-    """Clear expired liveness sessions"""
-    current_time = time.time()
-    expired_sessions = []
-    
-    for session_id, session_data in active_sessions.items():
-        if current_time - session_data.get('created_at', 0) > SESSION_TIMEOUT:
-            expired_sessions.append(session_id)
-    
-    for session_id in expired_sessions:
-        del active_sessions[session_id]
-
-
-def clear_expired_bans():
-    """Clear expired bans from memory"""
-    current_time = time.time()
-    
-    # Clear expired user bans
-    expired_users = []
-    for user_id in banned_users:
-        if user_id in user_attempts:
-            ban_time = user_attempts[user_id].get('banned_at', 0)
-            if current_time - ban_time > BAN_DURATION:
-                expired_users.append(user_id)
-    
-    for user_id in expired_users:
-        banned_users.discard(user_id)
-        if user_id in user_attempts:
-            del user_attempts[user_id]
-    
-    # Clear expired face bans
-    expired_faces = []
-    for face_hash in banned_faces:
-        if face_hash in face_attempts:
-            ban_time = face_attempts[face_hash].get('banned_at', 0)
-            if current_time - ban_time > BAN_DURATION:
-                expired_faces.append(face_hash)
-    
-    for face_hash in expired_faces:
-        banned_faces.discard(face_hash)
-        if face_hash in face_attempts:
-            del face_attempts[face_hash]
-    
-
 def clear_kyc_cache():
     """Clear all KYC-related caches"""
-    global active_sessions, user_attempts, face_attempts, banned_users, banned_faces, face_hash_storage
-    
-    # Clear all caches
-    active_sessions.clear()
-    user_attempts.clear()
-    face_attempts.clear()
-    banned_users.clear()
-    banned_faces.clear()
-    face_hash_storage.clear()
-    save_face_hashes()
+    # Sessions, attempts, bans and violations; face hashes are durable records, not cache
+    kyc_state.clear()
+    kyc_images.clear()
 
 def auto_cache_cleanup():
     """Automatic cache cleanup function that runs in background"""
+    last_image_purge = 0.0
     while True:
         try:
-
-            # Clear expired sessions
-            clear_expired_sessions()
-            
-            # Clear expired bans
-            clear_expired_bans()
-            
-            # Clean up old attempts
-            cleanup_old_attempts()
-            
-            # Clear old duplicate violations (older than 24 hours)
-            current_time = time.time()
-            old_violations = []
-            for violation_id, violation_data in duplicate_violations.items():
-                if current_time - violation_data.get('timestamp', 0) > 86400:  # 24 hours
-                    old_violations.append(violation_id)
-            
-            for violation_id in old_violations:
-                del duplicate_violations[violation_id]
-            
-
+            # Retire only the sessions, attempts, bans and violations whose deadline has passed
+            # (a no-op on Redis, which expires them itself)
+            kyc_state.expire_due()
         except Exception as e:
             pass
+        
+        # Session images outlive nothing but their session; sweep the image directory once a minute
+        if time.time() - last_image_purge >= 60:
+            try:
+                kyc_images.purge_expired()
+            except Exception as e:
+                pass
+            last_image_purge = time.time()
 
         # Wait for next cleanup cycle
         time.sleep(CACHE_CLEAR_INTERVAL)
@@ -341,120 +196,221 @@ def start_cache_cleanup_thread():
     cleanup_thread = threading.Thread(target=auto_cache_cleanup, daemon=True)
     cleanup_thread.start()
 
-def generate_face_hash_from_mock(user_email: str):
-    """Generate a consistent face hash for mock KYC (for testing)"""
-    # For mock KYC, we'll use a deterministic hash based on user email
-    # This ensures the same user always gets the same face hash
-    return hashlib.md5(f"mock_face_{user_email}".encode()).hexdigest()[:16]
-
 def check_duplicate_face(face_hash, current_user_id, db):
     """Check if face hash is already used by another user"""
     if not face_hash:
+        return None
+    
+    with kyc_metrics.timed("check_duplicate_face"):
+        return db.query(User).filter(User.face_hash == face_hash, User.id != current_user_id).first()
 
+def find_near_duplicate_face(face_vector, current_user_id, db):
+    """Another user whose enrolled face lies within KYC_FACE_MATCH_THRESHOLD"""
+    if face_vector is None:
         return None
+    
+    with kyc_metrics.timed("find_similar_face"):
+        match = find_similar_face(db, face_vector, exclude_user_id=current_user_id)
+        if match is None:
+            return None
+        return db.query(User).filter(User.id == match[0]).first()
+
+def claim_face_hash(user, face_hash, db, face_vector=None):
+    """Complete KYC for a user and store their face hash (and vector) in one commit.
+
+    The unique index on users.face_hash makes this insert-or-conflict: if another
+    account already holds the hash the commit fails, nothing is changed, and that
+    account is returned. Returns None only when the commit succeeded; any other
+    conflict (e.g. a concurrent review inserting the same user's face vector) is re-raised.
+    """
+    user.face_hash = face_hash
+    user.kyc_completed = True
+    try:
+        with kyc_metrics.timed("store_face_hash"):
+            if face_vector is not None:
+                store_face_vector(db, user.id, face_vector)
+            db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+        existing_user = check_duplicate_face(face_hash, user.id, db)
+        if existing_user is None:
+            raise
+        return existing_user
 
+def ban_duplicate_kyc_users(user1_id, user2_id, db):
+    """Ban both users involved in duplicate KYC"""
+    with kyc_metrics.timed("ban_duplicate_kyc_users"):
+        try:
+            # Get both users
+            user1 = db.query(User).filter(User.id == user1_id).first()
+            user2 = db.query(User).filter(User.id == user2_id).first()
+        
+            if user1:
+                user1.is_active = False
+                user1.kyc_completed = False  # Reset KYC status
+        
+            if user2:
+                user2.is_active = False
+                user2.kyc_completed = False  # Reset KYC status
+        
+            # Banned accounts leave the public boards once the ban commits
+            after_commit(db, lambda: leaderboard.remove_user(user1_id))
+            after_commit(db, lambda: leaderboard.remove_user(user2_id))
+        
+            # Record violation
+            violation_id = f"{min(user1_id, user2_id)}_{max(user1_id, user2_id)}"
+            kyc_state.record_violation(violation_id, {
+                'user1_id': user1_id,
+                'user2_id': user2_id,
+                'user1_email': user1.email if user1 else 'Unknown',
+                'user2_email': user2.email if user2 else 'Unknown',
+                'timestamp': time.time(),
+                'reason': 'Duplicate KYC verification'
+            }, settings.KYC_VIOLATION_TTL)
+        
+            # Create admin notification for KYC ban
+            try:
+                from services.notification_service import NotificationService
+                NotificationService.create_kyc_ban_notification(
+                    db=db,
+                    user1_id=user1_id,
+                    user2_id=user2_id,
+                    user1_email=user1.email if user1 else 'Unknown',
+                    user2_email=user2.email if user2 else 'Unknown',
+                    violation_reason='Duplicate KYC verification'
+                )
+            except Exception as notification_error:
+                # Don't fail the ban process if notification fails
+                pass
+        
+            db.commit()
+        
+        except Exception as e:
+            db.rollback()
 
-    # Check in-memory storage first
-    if face_hash in face_hash_storage:
-        existing_user_id = face_hash_storage[face_hash]
+def apply_face_review(user, face_hash, face_vector, db):
+    """Dedup a live face and complete or reject the user's KYC; returns the result fields to set"""
+    if face_hash:
 
-        if existing_user_id != current_user_id:
-            # Get user details from database
-            existing_user = db.query(User).filter(User.id == existing_user_id).first()
-            if existing_user:
-                return existing_user
-            else:
-                del face_hash_storage[face_hash]
-                save_face_hashes()  # Save changes to file
-        else:
-            pass
+        # Recaptures of an enrolled face hash differently, so look for near matches first
+        existing_user = find_near_duplicate_face(face_vector, user.id, db)
+        if existing_user is None:
+            existing_user = claim_face_hash(user, face_hash, db, face_vector)
+        
+        if existing_user:
 
-    else:
-        pass
-
-    # TODO: Check database for face_hash when column is added
-    # For now, only check in-memory storage
-    # try:
-    #     existing_user = db.query(User).filter(User.face_hash == face_hash).first()
-    #     if existing_user and existing_user.id != current_user_id:
-    #         print(f"🚨 DUPLICATE FACE DETECTED: Face hash {face_hash} already used by user {existing_user.id} ({existing_user.email})")
-    #         return existing_user
-    # except Exception as e:
-    #     print(f"❌ Error checking database for face hash: {e}")
-    
-    return None
+            # Ban both users for duplicate KYC
+            ban_duplicate_kyc_users(user.id, existing_user.id, db)
+            return {
+                'message': f"KYC verification failed: Face already used by another account ({existing_user.email}). Both accounts have been suspended.",
+                'success': False,
+                'isLive': False
+            }
 
-def store_face_hash(user_id, face_hash, db):
-    """Store face hash for a user in memory (database storage disabled until migration)"""
-    if not face_hash:
+        # Clear user's attempts from cache on successful KYC
+        kyc_state.reset_attempts(USER, user.id)
+        kyc_state.unban(USER, user.id)
+        
+        return {'message': "KYC verification completed successfully"}
 
-        return
+    # If we can't generate face hash, still allow KYC but log warning
+    user.kyc_completed = True
+    db.commit()
+    
+    # Clear user's attempts from cache on successful KYC
+    kyc_state.reset_attempts(USER, user.id)
+    kyc_state.unban(USER, user.id)
     
-    # TODO: Store in database when face_hash column is added
-    # For now, only store in memory
-    # try:
-    #     user = db.query(User).filter(User.id == user_id).first()
-    #     if user:
-    #         user.face_hash = face_hash
-    #         db.commit()
-    #         print(f"✅ Stored face hash {face_hash} for user {user_id} in database")
-    #     else:
-    #         print(f"❌ User {user_id} not found")
-    # except Exception as e:
-    #     print(f"❌ Error storing face hash: {e}")
-    #     db.rollback()
+    return {'message': "KYC verification completed successfully (face hash not available)"}
+
+async def review_face_features(job, results):
+    """Face hash and landmark vector for a review job"""
+    image_bytes = job.reference_image
+    if image_bytes is None and results.get('referenceImage'):
+        # Re-queued review: the image is in the shared image store
+        stored = kyc_images.get(job.session_id, 'reference')
+        if stored is None:
+            raise ValueError("Reference image is no longer available")
+        image_bytes = stored.data
     
-    # Store in memory for quick access
-    face_hash_storage[face_hash] = user_id
+    if image_bytes:
+        async with review_queue.concurrency:
+            return await extract_face_features(image_bytes, get_kyc_provider(job.provider))
     
-    # Save to persistent storage
-    save_face_hashes()
+    # For testing duplicate prevention, use a consistent face hash
+    # This simulates the same person using different accounts
 
-def ban_duplicate_kyc_users(user1_id, user2_id, db):
-    """Ban both users involved in duplicate KYC"""
+    # Use a consistent face hash for testing
+    # In production, this should be replaced with proper face detection
+    test_face_id = "test_face_123"  # This will be the same for all test users
+    return hashlib.md5(f"test_face_{test_face_id}".encode()).hexdigest()[:16], None
+
+def apply_review_batch(pending, features):
+    """Dedup a batch of reviewed faces with one DB session and publish each verdict"""
+    db = SessionLocal()
     try:
-        # Get both users
-        user1 = db.query(User).filter(User.id == user1_id).first()
-        user2 = db.query(User).filter(User.id == user2_id).first()
-        
-        if user1:
-            user1.is_active = False
-            user1.kyc_completed = False  # Reset KYC status
+        user_ids = {job.user_id for job, _ in pending}
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids)).all()}
         
-        if user2:
-            user2.is_active = False
-            user2.kyc_completed = False  # Reset KYC status
-        
-        # Record violation
-        violation_id = f"{min(user1_id, user2_id)}_{max(user2_id, user2_id)}"
-        duplicate_violations[violation_id] = {
-            'user1_id': user1_id,
-            'user2_id': user2_id,
-            'user1_email': user1.email if user1 else 'Unknown',
-            'user2_email': user2.email if user2 else 'Unknown',
-            'timestamp': time.time(),
-            'reason': 'Duplicate KYC verification'
-        }
-        
-        # Create admin notification for KYC ban
-        try:
-            from services.notification_service import NotificationService
-            NotificationService.create_kyc_ban_notification(
-                db=db,
-                user1_id=user1_id,
-                user2_id=user2_id,
-                user1_email=user1.email if user1 else 'Unknown',
-                user2_email=user2.email if user2 else 'Unknown',
-                violation_reason='Duplicate KYC verification'
+        # Sequential on purpose: each claim is committed before the next face is matched,
+        # so two duplicates inside one batch still find each other
+        for (job, results), feature in zip(pending, features):
+            if isinstance(feature, ProviderUnavailableError) or (isinstance(feature, Exception) and is_outage_error(feature)):
+                # Left pending: the next poll after KYC_REVIEW_STALE_SECONDS re-queues the review
+                continue
+            results = dict(results)
+            try:
+                if isinstance(feature, Exception):
+                    raise feature
+                user = users.get(job.user_id)
+                if user is None:
+                    raise ValueError("User not found")
+                face_hash, face_vector = feature
+                results.update(apply_face_review(user, face_hash, face_vector, db))
+                kyc_metrics.record_outcome('live' if results['isLive'] else 'duplicate')
+            except Exception as e:
+                kyc_metrics.record_outcome('error')
+                db.rollback()
+                # A concurrent review of the same session may have stored its verdict already
+                current = kyc_state.get_session(job.session_id)
+                if current and current.get('finalized'):
+                    continue
+                results.update(
+                    success=False,
+                    isLive=False,
+                    message="KYC face check could not be completed. Please try again."
+                )
+            
+            results['status'] = 'SUCCEEDED'
+            kyc_state.update_session(
+                job.session_id,
+                results=results,
+                finalized=True,
+                pending_review=False,
+                reviewed_at=time.time()
             )
-        except Exception as notification_error:
-            # Don't fail the ban process if notification fails
-            pass
-        
-        db.commit()
-        
-    except Exception as e:
-        db.rollback()
+    finally:
+        db.close()
+
+async def process_review_batch(jobs):
+    """Review processor: provider calls at bounded concurrency, then DB work off the event loop"""
+    pending = []
+    for job in jobs:
+        session_data = kyc_state.get_session(job.session_id)
+        # Re-queued reviews may already have been completed by the original run
+        if session_data and session_data.get('pending_review') and not session_data.get('finalized'):
+            pending.append((job, session_data['results']))
+    if not pending:
+        return
+    
+    features = await asyncio.gather(
+        *(review_face_features(job, results) for job, results in pending),
+        return_exceptions=True
+    )
+    await asyncio.to_thread(apply_review_batch, pending, features)
+
+review_queue = KycReviewQueue(process_review_batch)
 
 @router.get("/test-aws")
 async def test_aws_credentials():
@@ -475,16 +431,8 @@ async def test_aws_credentials():
     
     if aws_access_key and aws_secret_key:
         try:
-            # Test AWS connection
-            rekognition = boto3.client(
-                'rekognition',
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key,
-                region_name=aws_region
-            )
-            
             # Try to create a test session
-            test_session = rekognition.create_face_liveness_session()
+            test_session = await get_kyc_provider("rekognition").client.create_face_liveness_session()
             result["aws_connection"] = "success"
             result["test_session_id"] = test_session['SessionId']
             
@@ -516,321 +464,244 @@ async def create_kyc_session(
     kyc_setting = db.query(SystemSettings).filter(SystemSettings.key == "kyc_required").first()
     kyc_required = kyc_setting and kyc_setting.value
 
-    # Clean up old attempts
-    cleanup_old_attempts()
-    
     # Clear rate limiting for testing
-    if current_user.id in banned_users:
-        banned_users.remove(current_user.id)
-    if current_user.id in user_attempts:
-        del user_attempts[current_user.id]
+    kyc_state.unban(USER, current_user.id)
+    kyc_state.reset_attempts(USER, current_user.id)
     
     # Check if user is banned (DISABLED FOR TESTING)
-    # if current_user.id in banned_users:
+    # if kyc_state.is_banned(USER, current_user.id):
     #     raise HTTPException(
     #         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
     #         detail="User is temporarily banned due to excessive verification attempts"
     #     )
     
     # Check user attempt limits (DISABLED FOR TESTING)
-    current_time = time.time()  # Still need this for recording attempts
-    # user_attempts_list = user_attempts.get(current_user.id, [])
-    # recent_attempts = [attempt for attempt in user_attempts_list if current_time - attempt < 3600]
+    # recent_attempts = kyc_state.attempt_count(USER, current_user.id)
     
-    # if len(recent_attempts) >= MAX_ATTEMPTS:
-    #     banned_users.add(current_user.id)
+    # if recent_attempts >= MAX_ATTEMPTS:
+    #     kyc_state.ban(USER, current_user.id, BAN_DURATION)
     #     raise HTTPException(
     #         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
     #         detail=f"Too many verification attempts. Please try again in {BAN_DURATION // 3600} hour(s)"
     #     )
     
-    try:
+    with kyc_metrics.timed("create_kyc_session"):
+        try:
+            # The configured provider, or KYC_PROVIDER_FALLBACK while its circuit is open
+            provider = get_session_provider()
         
-        # Get AWS credentials from environment
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_REGION', 'us-east-1')
+            # Create a unique session ID
+            session_id = str(uuid.uuid4())
         
-        # Create a unique session ID
-        session_id = str(uuid.uuid4())
+            # Create the liveness session with the configured provider
+            provider_session_id = await provider.create_session(request)
         
-        # Check if Face Liveness API is available in this region
-        try:
-            
-            # Prepare parameters for AWS Face Liveness session
-            session_params = {}
-            
-            # Only add KmsKeyId if provided
-            if request.get('kms_key_id'):
-                session_params['KmsKeyId'] = request.get('kms_key_id')
-            
-            # Only add Settings if S3 bucket is provided
-            if request.get('s3_bucket'):
-                session_params['Settings'] = {
-                    'OutputConfig': {
-                        'S3Bucket': request.get('s3_bucket'),
-                        'S3KeyPrefix': request.get('s3_key_prefix', 'face-liveness/')
-                    }
-                }
-            
-            # Create the liveness session using AWS Rekognition
-            response = rekognition.create_face_liveness_session(**session_params)
-            
             # Store session information
-            active_sessions[session_id] = {
-                'session_id': response['SessionId'],
+            kyc_state.create_session(session_id, {
+                'session_id': provider_session_id,
+                'provider': provider.name,
                 'user_id': current_user.id,
                 'created_at': time.time(),  # Use current timestamp for consistency
-                'status': 'created'
-            }
-            
+                'status': 'created',
+                'is_mock': provider.is_mock
+            }, SESSION_TIMEOUT)
+        
             # Record attempt
-            if current_user.id not in user_attempts:
-                user_attempts[current_user.id] = []
-            user_attempts[current_user.id].append(current_time)
-            
+            kyc_state.record_attempt(USER, current_user.id, settings.KYC_ATTEMPT_WINDOW)
+        
             result = {
                 "success": True,
                 "sessionId": session_id,
-                "aws_session_id": response['SessionId'],
-                "message": "AWS Face Liveness session created successfully",
+                "aws_session_id": provider_session_id,
+                "provider": provider.name,
+                "message": "Mock liveness session created (simulator)" if provider.is_mock else "AWS Face Liveness session created successfully",
                 "attemptsRemaining": 999  # Disabled for testing
             }
             return result
-            
-        except Exception as aws_error:
-            # If AWS Face Liveness API is not available, create a mock session for demo
-            error_msg = str(aws_error)
-            
-            if any(keyword in error_msg.lower() for keyword in ['not supported', 'not available', 'invalid', 'access denied', 'unauthorized']):
-                # Create a mock session for demonstration
-                active_sessions[session_id] = {
-                    'session_id': f'mock-{session_id}',
-                    'user_id': current_user.id,
-                    'created_at': '2024-01-01T00:00:00Z',
-                    'status': 'created',
-                    'is_mock': True
-                }
-                
-                # Record attempt
-                if current_user.id not in user_attempts:
-                    user_attempts[current_user.id] = []
-                user_attempts[current_user.id].append(current_time)
-                
-                result = {
-                    "success": True,
-                    "sessionId": session_id,
-                    "aws_session_id": f'mock-{session_id}',
-                    "message": "Mock liveness session created (AWS Face Liveness not available)",
-                    "warning": f"Using mock session for demonstration. AWS Error: {error_msg}",
-                    "attemptsRemaining": 999  # Disabled for testing
-                }
-                return result
-            else:
-                raise aws_error
         
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create verification session: {str(e)}"
-        )
+        except ProviderUnavailableError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Face verification is temporarily unavailable. Please try again shortly."
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to create verification session: {str(e)}"
+            )
+
+async def wait_for_finalized_result(session_id, pending_results, timeout=FINALIZE_WAIT_SECONDS, accept_pending_review=False):
+    """Wait for a session's verdict to be stored, then return it (or pending_results on timeout)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+        session_data = kyc_state.get_session(session_id)
+        if session_data is None:
+            break
+        if session_data.get('results') and (
+            session_data.get('finalized') or (accept_pending_review and session_data.get('pending_review'))
+        ):
+            return session_data['results']
+    
+    return pending_results
+
+def image_handle(session_id, name, image_bytes):
+    """Store a session image and describe where to fetch it"""
+    handle = kyc_images.put(session_id, name, image_bytes)
+    handle['url'] = f"/api/kyc/images/{session_id}/{name}"
+    return handle
 
 @router.get("/verify-result/{session_id}")
 async def get_verification_result(
     session_id: str,
+    wait: float = 0,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get the result of a KYC verification session"""
+    """Get the result of a KYC verification session.
+
+    With ?wait=<seconds> the request is held until the session reaches a terminal
+    status or the wait runs out (capped at KYC_LONG_POLL_MAX_SECONDS).
+    """
     
     # Check if session exists
-    if session_id not in active_sessions:
+    session_data = kyc_state.get_session(session_id)
+    if session_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
     
-    session_data = active_sessions[session_id]
     aws_session_id = session_data['session_id']
     
     # Verify session belongs to current user
-    if session_data['user_id'] != current_user.id:
+    user_id = current_user.id
+    if session_data['user_id'] != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Session does not belong to current user"
         )
     
+    # Nothing below touches the DB; hand the pooled connection back before a long poll holds it
+    db.close()
+    
+    # Terminal verdicts are cached on the session, so repeat polls skip the provider,
+    # the image encoding and the dedup side effects
+    if session_data.get('finalized') and session_data.get('results'):
+        return session_data['results']
+    
+    # Live result waiting on the background face review
+    if session_data.get('pending_review') and session_data.get('results'):
+        if time.time() - session_data.get('review_enqueued_at', 0) > settings.KYC_REVIEW_STALE_SECONDS:
+            # The worker that queued it went away; any worker can pick the review up
+            kyc_state.update_session(session_id, review_enqueued_at=time.time())
+            review_queue.submit(ReviewJob(session_id, user_id, session_data.get('provider') or 'rekognition'))
+        if wait > 0:
+            return await wait_for_finalized_result(
+                session_id, session_data['results'], min(wait, settings.KYC_LONG_POLL_MAX_SECONDS)
+            )
+        return session_data['results']
+    
+    claimed = False
+    review_job = None
     try:
-        # Check if this is a mock session
-        if session_data.get('is_mock', False):
-            # Simulate mock results after a delay
-            time.sleep(2)  # Simulate processing time
-            
-            # Generate mock results
-            mock_confidence = 85.5  # Simulate a live face detection
-            results = {
-                'success': True,
-                'sessionId': session_id,
-                'status': 'SUCCEEDED',
-                'confidence': mock_confidence,
-                'referenceImage': None,  # No reference image in mock
-                'auditImages': [],
-                'isLive': mock_confidence > 80,
-                'isMock': True,
-                'message': 'Mock liveness results - This is a demonstration'
-            }
-            
-            # Update session status
-            active_sessions[session_id]['status'] = 'SUCCEEDED'
-            active_sessions[session_id]['results'] = results
-            
-            # Update user KYC status if verification succeeded
-            if results['isLive']:
-                # Check for duplicate face across different accounts
-                face_hash = generate_face_hash_from_mock(current_user.email)  # Generate mock face hash
-                existing_user = check_duplicate_face(face_hash, current_user.id, db)
-                
-                if existing_user:
-                    # Ban both users for duplicate KYC
-                    ban_duplicate_kyc_users(current_user.id, existing_user.id, db)
-                    results['message'] = f"KYC verification failed: Face already used by another account ({existing_user.email}). Both accounts have been suspended."
-                    results['success'] = False
-                    results['isLive'] = False
-                else:
-                    current_user.kyc_completed = True
-                    # Store face hash for future deduplication
-                    store_face_hash(current_user.id, face_hash, db)
-                    db.commit()
-                    
-                    # Clear user's attempts from cache on successful KYC
-                    if current_user.id in user_attempts:
-                        del user_attempts[current_user.id]
-                    if current_user.id in banned_users:
-                        banned_users.discard(current_user.id)
-                    
-                    results['message'] = "KYC verification completed successfully (Mock)"
-            
-            return results
-        
-        # Get the liveness session results from AWS
-        response = rekognition.get_face_liveness_session_results(
-            SessionId=aws_session_id
-        )
+        # Sessions are answered by the provider that created them
+        provider = get_kyc_provider(session_data.get('provider') or ('simulator' if session_data.get('is_mock') else 'rekognition'))
         
-        # Update session status
-        active_sessions[session_id]['status'] = response['Status']
-        active_sessions[session_id]['results'] = response
+        # Get the liveness session results from the provider
+        if wait > 0:
+            # Long poll: all waiters on this session share one backing-off provider poller
+            response = await session_watcher.wait(
+                session_id, provider, aws_session_id, min(wait, settings.KYC_LONG_POLL_MAX_SECONDS)
+            )
+            if response is None:
+                response = {"status": "IN_PROGRESS", "confidence": None, "reference_image": None, "audit_images": []}
+        else:
+            response = await provider.get_session_results(aws_session_id)
         
         # Parse the results
         results = {
             'success': True,
             'sessionId': session_id,
-            'status': response['Status'],
+            'status': response['status'],
             'confidence': None,
             'referenceImage': None,
             'auditImages': [],
             'isLive': False,
-            'isMock': False
+            'isMock': provider.is_mock
         }
         
-        if response['Status'] == 'SUCCEEDED':
+        # Exactly one request applies a terminal verdict; concurrent polls wait for it
+        terminal = response['status'] in TERMINAL_STATUSES
+        if terminal:
+            claimed = kyc_state.claim_session(session_id, 'finalizing')
+            if not claimed:
+                # Keep the client polling until the verdict is stored
+                results['status'] = 'IN_PROGRESS'
+                results['message'] = "KYC verification is being finalized"
+                return await wait_for_finalized_result(session_id, results, accept_pending_review=wait <= 0)
+        
+        if response['status'] == 'SUCCEEDED':
             # Extract confidence score
-            if 'Confidence' in response:
-                results['confidence'] = response['Confidence']
-                results['isLive'] = response['Confidence'] > 80  # Threshold for live detection
+            if response['confidence'] is not None:
+                results['confidence'] = response['confidence']
+                results['isLive'] = response['confidence'] > 80  # Threshold for live detection
             
-            # Extract reference image (base64 encoded)
-            if 'ReferenceImage' in response:
-                reference_image = response['ReferenceImage']
-                if 'Bytes' in reference_image:
-                    results['referenceImage'] = base64.b64encode(reference_image['Bytes']).decode('utf-8')
+            # Keep the images server-side and return handles to them
+            reference_image = response['reference_image']
+            if reference_image:
+                results['referenceImage'] = image_handle(session_id, 'reference', reference_image)
             
-            # Extract audit images
-            if 'AuditImages' in response:
-                for audit_image in response['AuditImages']:
-                    if 'Bytes' in audit_image:
-                        results['auditImages'].append(
-                            base64.b64encode(audit_image['Bytes']).decode('utf-8')
-                        )
+            for index, audit_image in enumerate(response['audit_images']):
+                results['auditImages'].append(image_handle(session_id, f"audit-{index}", audit_image))
             
-            # Update user KYC status if verification succeeded
+            # Face hashing, dedup and bans run in the background review pipeline
             if results['isLive']:
-                
-                # Generate face hash from reference image for deduplication
-                face_hash = None
-                if results.get('referenceImage'):
-                    try:
-
-                        # Decode base64 image and generate face hash
-                        image_bytes = base64.b64decode(results['referenceImage'])
-                        face_hash = generate_face_hash(image_bytes)
-
-                    except Exception as e:
-
-                        # Fallback: use image hash directly
-                        face_hash = hashlib.sha256(image_bytes).hexdigest()[:16]
-
-                else:
-
-                    # For testing duplicate prevention, use a consistent face hash
-                    # This simulates the same person using different accounts
-
-                    # Use a consistent face hash for testing
-                    # In production, this should be replaced with proper face detection
-                    test_face_id = "test_face_123"  # This will be the same for all test users
-                    face_hash = hashlib.md5(f"test_face_{test_face_id}".encode()).hexdigest()[:16]
-                
-                # Check for duplicate face across different accounts
-                if face_hash:
-
-                    existing_user = check_duplicate_face(face_hash, current_user.id, db)
-                    
-                    if existing_user:
-
-                        # Ban both users for duplicate KYC
-                        ban_duplicate_kyc_users(current_user.id, existing_user.id, db)
-                        results['message'] = f"KYC verification failed: Face already used by another account ({existing_user.email}). Both accounts have been suspended."
-                        results['success'] = False
-                        results['isLive'] = False
-                    else:
-
-                        current_user.kyc_completed = True
-                        # Store face hash for future deduplication
-                        store_face_hash(current_user.id, face_hash, db)
-                        db.commit()
-                        
-                        # Clear user's attempts from cache on successful KYC
-                        if current_user.id in user_attempts:
-                            del user_attempts[current_user.id]
-                        if current_user.id in banned_users:
-                            banned_users.discard(current_user.id)
-                        
-                        results['message'] = "KYC verification completed successfully"
-                else:
-
-                    # If we can't generate face hash, still allow KYC but log warning
-                    current_user.kyc_completed = True
-                    db.commit()
-                    
-                    # Clear user's attempts from cache on successful KYC
-                    if current_user.id in user_attempts:
-                        del user_attempts[current_user.id]
-                    if current_user.id in banned_users:
-                        banned_users.discard(current_user.id)
-                    
-                    results['message'] = "KYC verification completed successfully (face hash not available)"
+                review_job = ReviewJob(session_id, user_id, provider.name, reference_image)
+                results['status'] = 'PENDING_REVIEW'
+                results['message'] = "Liveness confirmed - checking your face against existing accounts"
             else:
                 results['message'] = "KYC verification failed - face not detected as live"
         
-        elif response['Status'] == 'FAILED':
+        elif response['status'] in ('FAILED', 'EXPIRED'):
             results['message'] = "KYC verification failed"
         else:
             results['message'] = "KYC verification is still in progress"
         
+        # Update session status
+        kyc_state.update_session(
+            session_id,
+            status=response['status'],
+            results=results,
+            finalized=terminal and review_job is None,
+            pending_review=review_job is not None,
+            review_enqueued_at=time.time()
+        )
+        
+        # Queued only once the session is marked pending, which is what the review checks for
+        if review_job is not None:
+            review_queue.submit(review_job)
+        
+        if terminal:
+            if review_job is None:
+                kyc_metrics.record_outcome('expired' if response['status'] == 'EXPIRED' else 'not_live')
+            if provider.is_mock:
+                kyc_metrics.record_outcome('mock')
+        
         return results
         
     except Exception as e:
-
+        
+        # Let a later poll retry the verdict
+        if claimed:
+            kyc_state.update_session(session_id, finalizing=False)
+        kyc_metrics.record_outcome('error')
+
+        if isinstance(e, ProviderUnavailableError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Face verification is temporarily unavailable. Please try again shortly."
+            )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get verification result: {str(e)}"
@@ -849,10 +720,11 @@ async def get_duplicate_kyc_violations(
             detail="Email verification required for admin access"
         )
     
+    violations = kyc_state.list_violations()
+    
     return {
-        "violations": list(duplicate_violations.values()),
-        "total_violations": len(duplicate_violations),
-        "face_hash_storage": face_hash_storage
+        "violations": violations,
+        "total_violations": len(violations)
     }
 
 @router.post("/admin/clear-violations")
@@ -868,10 +740,7 @@ async def clear_duplicate_violations(
             detail="Email verification required for admin access"
         )
     
-    global duplicate_violations, face_hash_storage
-    duplicate_violations.clear()
-    face_hash_storage.clear()
-    save_face_hashes()
+    kyc_state.clear_violations()
     
     return {
         "message": "All duplicate KYC violations cleared",
@@ -879,7 +748,7 @@ async def clear_duplicate_violations(
     }
 
 @router.post("/admin/clear-kyc-cache")
-async def clear_kyc_cache(
+async def clear_kyc_cache_endpoint(
     current_user: User = Depends(get_current_user)
 ):
     """Clear all KYC cache data (admin only)"""
@@ -891,17 +760,8 @@ async def clear_kyc_cache(
             detail="Email verification required for admin access"
         )
     
-    global active_sessions, user_attempts, banned_users, face_attempts, banned_faces, face_hash_storage, duplicate_violations
-    
     # Clear all KYC-related cache
-    active_sessions.clear()
-    user_attempts.clear()
-    banned_users.clear()
-    face_attempts.clear()
-    banned_faces.clear()
-    face_hash_storage.clear()
-    save_face_hashes()
-    duplicate_violations.clear()
+    clear_kyc_cache()
     
     return {
         "message": "All KYC cache data cleared",
@@ -912,29 +772,32 @@ async def clear_kyc_cache(
             "banned_users",
             "face_attempts",
             "banned_faces",
-            "face_hash_storage",
             "duplicate_violations"
         ]
     }
 
 @router.get("/admin/kyc-cache-status")
-async def get_kyc_cache_status(current_user: User = Depends(get_admin_user)):
+async def get_kyc_cache_status(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
     """Get KYC cache status and statistics"""
     try:
         cache_stats = {
-            "active_sessions": len(active_sessions),
-            "user_attempts": len(user_attempts),
-            "face_attempts": len(face_attempts),
-            "banned_users": len(banned_users),
-            "banned_faces": len(banned_faces),
-            "face_hash_storage": len(face_hash_storage),
-            "duplicate_violations": len(duplicate_violations)
+            **kyc_state.stats(),
+            "face_hash_storage": db.query(func.count(User.id)).filter(User.face_hash.isnot(None)).scalar()
         }
         
         return {
             "success": True,
             "cache_stats": cache_stats,
-            "face_hashes": face_hash_storage,  # Include actual face hashes for debugging
+            "expiry": kyc_state.expiry_stats(),
+            "face_index": face_index_stats(),
+            "attempt_keys": kyc_state.attempt_stats(),
+            "images": kyc_images.stats(),
+            "preprocessing": image_preprocessor.stats(),
+            "long_poll": session_watcher.stats(),
+            "review_queue": review_queue.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -944,6 +807,86 @@ async def get_kyc_cache_status(current_user: User = Depends(get_admin_user)):
             detail="Failed to get KYC cache status"
         )
 
+def kyc_state_gauges(db):
+    """Sessions, bans and stored face hashes, read at scrape time (blocking; run off the event loop)"""
+    state = kyc_state.stats()
+    return {
+        "sessions": state["active_sessions"],
+        "banned_users": state["banned_users"],
+        "banned_faces": state["banned_faces"],
+        "duplicate_violations": state["duplicate_violations"],
+        "face_hashes": db.query(func.count(User.id)).filter(User.face_hash.isnot(None)).scalar()
+    }
+
+@router.get("/admin/kyc-metrics")
+async def get_kyc_metrics(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Per-stage latency, verdict counts and state sizes of the KYC pipeline"""
+    try:
+        gauges = await asyncio.to_thread(kyc_state_gauges, db)
+        return {
+            "success": True,
+            "metrics": kyc_metrics.to_dict(gauges),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get KYC metrics: {str(e)}"
+        )
+
+@router.get("/admin/kyc-metrics/prometheus")
+async def get_kyc_metrics_prometheus(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """The same metrics in the Prometheus text exposition format"""
+    try:
+        gauges = await asyncio.to_thread(kyc_state_gauges, db)
+        return Response(
+            content=kyc_metrics.to_prometheus(gauges),
+            media_type="text/plain; version=0.0.4"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get KYC metrics: {str(e)}"
+        )
+
+@router.get("/admin/kyc-rededup-status")
+async def get_kyc_rededup_status(
+    current_user: User = Depends(get_admin_user)
+):
+    """Progress of the batch re-dedup run (scripts/rededup_faces.py)"""
+    return {
+        "success": True,
+        "run": rededup_status(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/admin/kyc-rededup-clusters")
+async def get_kyc_rededup_clusters(
+    run_id: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Duplicate clusters stored by re-dedup runs"""
+    try:
+        return {
+            "success": True,
+            "clusters": rededup_clusters(db, run_id, max(offset, 0), min(max(limit, 1), 500)),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get re-dedup clusters: {str(e)}"
+        )
+
 @router.post("/admin/test-duplicate-prevention")
 async def test_duplicate_prevention(
     current_user: User = Depends(get_admin_user),
@@ -971,8 +914,7 @@ async def test_duplicate_prevention(
             return {
                 "success": True,
                 "message": f"No duplicate found for face hash {test_face_hash}",
-                "face_hash": test_face_hash,
-                "face_hash_storage": face_hash_storage
+                "face_hash": test_face_hash
             }
     except Exception as e:
 
@@ -981,6 +923,86 @@ async def test_duplicate_prevention(
             detail="Failed to test duplicate prevention"
         )
 
+@router.get("/review/{session_id}")
+async def get_review_status(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Progress of the background face review for a session"""
+    
+    session_info = kyc_state.get_session(session_id)
+    if session_info is None or session_info['user_id'] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    
+    results = session_info.get('results') or {}
+    return {
+        "sessionId": session_id,
+        "status": results.get('status') or session_info.get('status'),
+        "pendingReview": bool(session_info.get('pending_review')),
+        "finalized": bool(session_info.get('finalized')),
+        "enqueuedAt": session_info.get('review_enqueued_at') if session_info.get('pending_review') or session_info.get('reviewed_at') else None,
+        "reviewedAt": session_info.get('reviewed_at'),
+        "results": results or None
+    }
+
+@router.get("/images/{session_id}/{name}")
+async def get_session_image(
+    session_id: str,
+    name: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Raw JPEG bytes of a session's reference or audit image, with range and cache support"""
+    
+    session_info = kyc_state.get_session(session_id)
+    if session_info is None or (session_info['user_id'] != current_user.id and not current_user.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    try:
+        image = kyc_images.get(session_id, name)
+    except ValueError:
+        image = None
+    if image is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    # A handle always names the same bytes, so clients may keep them for the session's lifetime
+    max_age = max(int(image.created_at + kyc_images.ttl - time.time()), 0)
+    headers = {
+        "ETag": f'"{image.etag}"',
+        "Cache-Control": f"private, max-age={max_age}, immutable",
+        "Accept-Ranges": "bytes"
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    size = len(image.data)
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+    if byte_range is None:
+        return Response(content=image.data, media_type="image/jpeg", headers=headers)
+    
+    start, end = byte_range
+    return Response(
+        content=image.data[start:end + 1],
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type="image/jpeg",
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+    )
+
 @router.delete("/session/{session_id}")
 async def delete_verification_session(
     session_id: str,
@@ -989,20 +1011,22 @@ async def delete_verification_session(
     """Delete a KYC verification session"""
     
     # Check if session exists and user owns it
-    if session_id in active_sessions:
-        session_info = active_sessions[session_id]
+    session_info = kyc_state.get_session(session_id)
+    if session_info is not None:
         if session_info['user_id'] == current_user.id:
             try:
-                # Delete from AWS if available
-                if rekognition:
-                    rekognition.delete_face_liveness_session(SessionId=session_id)
+                # Delete from the provider that created it (legacy mock sessions only exist locally)
+                if session_info.get('provider'):
+                    await get_kyc_provider(session_info['provider']).delete_session(session_info['session_id'])
                 # Remove from local storage
-                del active_sessions[session_id]
+                kyc_state.delete_session(session_id)
+                kyc_images.delete_session(session_id)
                 return {"message": "Session deleted successfully"}
             except Exception as e:
 
                 # Still remove from local storage even if AWS deletion fails
-                del active_sessions[session_id]
+                kyc_state.delete_session(session_id)
+                kyc_images.delete_session(session_id)
                 return {"message": "Session removed locally"}
     
     raise HTTPException(
@@ -1022,17 +1046,16 @@ async def get_kyc_status(
     kyc_enabled = kyc_setting and kyc_setting.value
     
     # Get user attempt info
-    current_time = time.time()
-    user_attempts_list = user_attempts.get(current_user.id, [])
-    recent_attempts = [attempt for attempt in user_attempts_list if current_time - attempt < 3600]
-    remaining_attempts = max(0, MAX_ATTEMPTS - len(recent_attempts))
+    recent_attempts = kyc_state.attempt_count(USER, current_user.id)
+    remaining_attempts = max(0, MAX_ATTEMPTS - recent_attempts)
+    ban_expires_at = kyc_state.ban_expires_at(USER, current_user.id)
     
     return {
         "kycEnabled": kyc_enabled,
         "kycCompleted": current_user.kyc_completed,
         "remainingAttempts": remaining_attempts,
-        "isBanned": current_user.id in banned_users,
-        "banExpiresAt": None  # Could implement ban expiration tracking
+        "isBanned": ban_expires_at is not None,
+        "banExpiresAt": datetime.fromtimestamp(ban_expires_at).isoformat() if ban_expires_at else None
     }
 
 @router.get("/test")
@@ -1040,8 +1063,9 @@ async def test_kyc_endpoint():
     """Test endpoint for KYC service"""
     return {
         "message": "KYC service is working",
-        "aws_configured": rekognition is not None,
-        "active_sessions": len(active_sessions)
+        "aws_configured": bool(os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY')),
+        "provider": get_kyc_provider().name,
+        "active_sessions": kyc_state.session_count()
     }
 
 @router.get("/status")
@@ -1052,18 +1076,11 @@ async def get_kyc_status(
     """Get current user's KYC status"""
     try:
         # Get cache data for this user
-        user_attempts_count = len(user_attempts.get(current_user.id, []))
-        is_banned = current_user.id in banned_users
-        
-        # Find user's face hash
-        user_face_hash = None
-        for fh, uid in face_hash_storage.items():
-            if uid == current_user.id:
-                user_face_hash = fh
-                break
+        user_attempts_count = kyc_state.attempt_count(USER, current_user.id)
+        is_banned = kyc_state.is_banned(USER, current_user.id)
         
         # Find active sessions for this user
-        user_sessions = [sid for sid, data in active_sessions.items() if data.get('user_id') == current_user.id]
+        user_sessions = kyc_state.sessions_for_user(current_user.id)
         
         return {
             "success": True,
@@ -1077,7 +1094,7 @@ async def get_kyc_status(
                 "can_start_verification": not current_user.kyc_completed,
                 "attempts_count": user_attempts_count,
                 "is_banned": is_banned,
-                "has_face_hash": user_face_hash is not None,
+                "has_face_hash": current_user.face_hash is not None,
                 "active_sessions": len(user_sessions)
             },
             "timestamp": time.time()
@@ -1090,30 +1107,40 @@ async def get_kyc_status(
 
 @router.get("/health")
 async def kyc_health_check():
-    """Health check for KYC service"""
-    try:
-        if rekognition:
-            # Test AWS connection
-            rekognition.list_collections()
-            return {
-                "status": "healthy",
-                "aws_connected": True,
-                "active_sessions": len(active_sessions)
-            }
-        else:
-            return {
-                "status": "degraded",
-                "aws_connected": False,
-                "error": "AWS credentials not configured",
-                "active_sessions": len(active_sessions)
-            }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "aws_connected": False,
-            "error": str(e),
-            "active_sessions": len(active_sessions)
-        }
+    """Health check for KYC service, served from the background provider probe"""
+    provider = get_kyc_provider()
+    health = provider_health.snapshot()
+    probe = health["last_probe"]
+    
+    if probe is None:
+        service_status, error = "unknown", "Provider has not been probed yet"
+    elif not probe["healthy"]:
+        service_status, error = "unhealthy", probe["error"]
+    elif provider.is_mock:
+        service_status, error = "degraded", "Using the local KYC simulator"
+    elif not provider.available:
+        service_status, error = "degraded", "Provider circuit is open"
+    else:
+        service_status, error = "healthy", None
+    
+    result = {
+        "status": service_status,
+        "aws_connected": bool(probe and probe["healthy"] and not provider.is_mock),
+        "active_sessions": kyc_state.session_count(),
+        "provider": provider.stats(),
+        "probe": health
+    }
+    if error:
+        result["error"] = error
+    return result
 
 # Start the automatic cache cleanup thread when module loads
 start_cache_cleanup_thread()
+
+# Probe the configured provider in the background for /health and its circuit breaker
+provider_health.start(get_kyc_provider)
+
+# Queue and index sizes for the KYC metrics gauges
+kyc_metrics.register_gauge("review_queue", lambda: review_queue.stats()["queued"] + review_queue.in_progress)
+kyc_metrics.register_gauge("long_poll_waiters", lambda: session_watcher.stats()["waiters"])
+kyc_metrics.register_gauge("face_vectors", lambda: face_index_stats()["faces"])
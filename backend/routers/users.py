@@ -6,6 +6,7 @@ from database import get_db
 from models import User
 from schemas import UserResponse
 from routers.auth import get_current_user
+from services.leaderboard_service import leaderboard, BOARDS
 
 router = APIRouter()
 
@@ -35,3 +36,51 @@ async def get_referral_link(current_user: User = Depends(get_current_user)):
         "referral_code": current_user.referral_code,
         "referral_link": f"{base_url}/airdrop?ref={current_user.referral_code}"
     }
+
+def validate_board(board: str):
+    if board not in BOARDS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown leaderboard. Available: {', '.join(BOARDS)}"
+        )
+
+@router.get("/leaderboard/{board}")
+async def get_leaderboard(board: str, limit: int = 10, db: Session = Depends(get_db)):
+    """Get the top users of a leaderboard (referrals or mining)"""
+    validate_board(board)
+    limit = max(1, min(limit, 100))
+    
+    top_entries = leaderboard.top(board, limit)
+    
+    # Only the ranked rows are loaded, never the whole users table
+    user_ids = [user_id for user_id, _ in top_entries]
+    users = {u.id: u for u in db.query(User.id, User.username).filter(User.id.in_(user_ids)).all()} if user_ids else {}
+    
+    return {
+        "board": board,
+        "entries": [
+            {
+                "rank": rank + 1,
+                "user_id": user_id,
+                "username": users[user_id].username if user_id in users else None,
+                "score": score
+            }
+            for rank, (user_id, score) in enumerate(top_entries)
+        ],
+        "total_ranked": leaderboard.size(board)
+    }
+
+@router.get("/leaderboard/{board}/me")
+async def get_my_leaderboard_rank(board: str, current_user: User = Depends(get_current_user)):
+    """Get current user's rank on a leaderboard"""
+    validate_board(board)
+    
+    ranking = leaderboard.rank(board, current_user.id)
+    
+    return {
+        "board": board,
+        "user_id": current_user.id,
+        "rank": ranking[0] + 1 if ranking else None,
+        "score": ranking[1] if ranking else None,
+        "total_ranked": leaderboard.size(board)
+    }
@@ -30,6 +30,16 @@ class MiningStatsResponse(BaseModel):
     time_until_next_claim: Optional[int]  # seconds
     points_earned_since_last_claim: float
 
+class MiningAnchorResponse(BaseModel):
+    mining_points: float
+    mining_speed: float
+    points_per_second: float
+    is_mining: bool
+    anchor_at: Optional[datetime]  # last_mining_claim; accrual starts here
+    next_claim_at: Optional[datetime]
+    max_claim_points: float  # accrual stops at this many points per claim window
+    server_time: datetime
+
 class StartMiningResponse(BaseModel):
     message: str
     mining_stats: MiningStatsResponse
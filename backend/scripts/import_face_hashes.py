@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+One-shot importer for the legacy face_hashes.json file
+
+Copies every face_hash -> user_id pair into users.face_hash. Pairs whose user no
+longer exists, whose user already holds a different hash, or whose hash already
+belongs to another user are reported and skipped.
+
+Run the add_face_hash_unique_index migration first.
+
+Usage:
+    python scripts/import_face_hashes.py
+    python scripts/import_face_hashes.py --file /path/to/face_hashes.json --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import face_hashes.json into users.face_hash")
+    parser.add_argument("--file", default="face_hashes.json", help="Legacy face hash file")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be imported without writing")
+    return parser.parse_args()
+
+def import_face_hashes(path: str, dry_run: bool = False) -> dict:
+    from database import SessionLocal
+    from models import User
+
+    with open(path, 'r') as f:
+        face_hashes = json.load(f)
+
+    summary = {"imported": 0, "already_set": 0, "missing_user": 0, "conflicts": []}
+    db = SessionLocal()
+    try:
+        users = {
+            user.id: user
+            for user in db.query(User).filter(User.id.in_({int(uid) for uid in face_hashes.values()})).all()
+        } if face_hashes else {}
+        owners = {
+            face_hash: user_id
+            for face_hash, user_id in db.query(User.face_hash, User.id)
+                                        .filter(User.face_hash.in_(list(face_hashes)))
+                                        .all()
+        } if face_hashes else {}
+
+        for face_hash, user_id in face_hashes.items():
+            user = users.get(int(user_id))
+            if user is None:
+                summary["missing_user"] += 1
+            elif user.face_hash == face_hash:
+                summary["already_set"] += 1
+            elif user.face_hash or owners.get(face_hash, user.id) != user.id:
+                summary["conflicts"].append({
+                    "face_hash": face_hash,
+                    "user_id": user.id,
+                    "user_face_hash": user.face_hash,
+                    "hash_owner_id": owners.get(face_hash)
+                })
+            else:
+                user.face_hash = face_hash
+                owners[face_hash] = user.id
+                summary["imported"] += 1
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    finally:
+        db.close()
+
+    return summary
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.exists(args.file):
+        print(f"❌ Face hash file not found: {args.file}")
+        sys.exit(1)
+
+    print(f"🔄 Importing face hashes from {args.file}{' (dry run)' if args.dry_run else ''}...")
+    summary = import_face_hashes(args.file, args.dry_run)
+    print(f"✅ Imported {summary['imported']}, already set {summary['already_set']}, "
+          f"missing users {summary['missing_user']}, conflicts {len(summary['conflicts'])}")
+    for conflict in summary["conflicts"]:
+        print(f"   - {conflict['face_hash']}: user {conflict['user_id']} "
+              f"(has {conflict['user_face_hash']}), owner {conflict['hash_owner_id']}")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Batch re-dedup of every stored face
+
+Scans face_embeddings for clusters of accounts verified with the same face and
+records each cluster in the kyc_duplicate_clusters table, the KYC violations
+store and as an admin notification. Accounts are not banned; admins review the
+violations. KYC state must be in Redis (KYC_STATE_BACKEND), or the violations
+would vanish with this process.
+
+Exact face hash duplicates cannot exist (users.face_hash has a unique index),
+so the scan compares landmark vectors. A run checkpoints into --work-dir and
+picks up where it stopped when started again; use --restart to begin a new one.
+
+Usage:
+    python scripts/rededup_faces.py
+    python scripts/rededup_faces.py --workers 16 --partitions 256
+    python scripts/rededup_faces.py --restart
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find duplicate face clusters among all stored faces")
+    parser.add_argument("--work-dir", default=None, help="Checkpoint directory (defaults to KYC_REDEDUP_DIR)")
+    parser.add_argument("--workers", type=int, default=None, help="Scan processes (defaults to the CPU count)")
+    parser.add_argument("--partitions", type=int, default=None, help="Bucket partitions for a new run (defaults to KYC_REDEDUP_PARTITIONS)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Faces exported per checkpoint (defaults to KYC_REDEDUP_CHUNK_SIZE)")
+    parser.add_argument("--restart", action="store_true", help="Discard the existing checkpoint and start over")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    from services.kyc_rededup import FaceRededupJob, reset_rededup
+
+    if args.restart:
+        reset_rededup(args.work_dir)
+
+    try:
+        job = FaceRededupJob(
+            work_dir=args.work_dir,
+            partitions=args.partitions,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            progress=lambda message: print(f"🔄 {message}")
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if job.state["phase"] != "export" or job.state["rows"]:
+        print(f"🔄 Resuming run in {job.work_dir} at the {job.state['phase']} phase...")
+    state = job.run()
+    print(f"✅ Scanned {state['rows']} faces: {state['pairs'] or 0} matching pairs, "
+          f"{state['clusters'] or 0} clusters, {state['violations']} violations recorded")
@@ -0,0 +1,301 @@
+"""
+Face Similarity
+Near-duplicate face search over normalized landmark vectors
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+from config import settings
+from models import FaceEmbedding
+
+# Landmark types returned by Rekognition DetectFaces, in vector order
+FACE_LANDMARKS = (
+    "eyeLeft", "eyeRight", "nose", "mouthLeft", "mouthRight",
+    "leftEyeBrowLeft", "leftEyeBrowRight", "leftEyeBrowUp",
+    "rightEyeBrowLeft", "rightEyeBrowRight", "rightEyeBrowUp",
+    "leftEyeLeft", "leftEyeRight", "leftEyeUp", "leftEyeDown",
+    "rightEyeLeft", "rightEyeRight", "rightEyeUp", "rightEyeDown",
+    "noseLeft", "noseRight", "mouthUp", "mouthDown", "leftPupil", "rightPupil",
+    "upperJawlineLeft", "midJawlineLeft", "chinBottom", "midJawlineRight", "upperJawlineRight"
+)
+VECTOR_DIM = 2 * len(FACE_LANDMARKS)
+BUCKET_WIDTH_FACTOR = 4.0  # LSH bucket width in multiples of the match threshold
+REINDEX_MIN_TAIL = 1024  # Unsorted rows tolerated before the LSH tables are re-sorted
+
+def landmark_vector(landmarks: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Unit-length vector of landmark positions relative to their centroid.
+
+    Removing translation and scale makes captures of one face at different
+    distances and framings comparable. Returns None unless every landmark is present.
+    """
+    points = {landmark['Type']: (landmark['X'], landmark['Y']) for landmark in landmarks or []}
+    if any(landmark not in points for landmark in FACE_LANDMARKS):
+        return None
+    coords = np.array([points[landmark] for landmark in FACE_LANDMARKS], dtype=np.float64)
+    coords -= coords.mean(axis=0)
+    norm = np.linalg.norm(coords)
+    if not norm:
+        return None
+    return (coords / norm).ravel().astype(np.float32)
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def vector_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
+
+class FaceSimilarityIndex:
+    """Nearest-face lookup with a distance threshold.
+
+    Up to KYC_FACE_INDEX_BRUTE_FORCE_MAX faces every vector is compared directly.
+    Beyond that, candidates come from p-stable LSH tables (one sorted code array
+    per table, binary searched) plus the rows appended since the last sort, and
+    only those candidates are compared exactly. Bucket width follows the
+    threshold, so faces within it collide in at least one table with high probability.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        brute_force_max: Optional[int] = None,
+        tables: Optional[int] = None,
+        hashes: Optional[int] = None,
+        seed: int = 0
+    ):
+        self.threshold = threshold or settings.KYC_FACE_MATCH_THRESHOLD
+        self.brute_force_max = brute_force_max if brute_force_max is not None else settings.KYC_FACE_INDEX_BRUTE_FORCE_MAX
+        self.tables = tables or settings.KYC_FACE_INDEX_TABLES
+        self.hashes = hashes or settings.KYC_FACE_INDEX_HASHES
+        self._lock = threading.RLock()
+
+        self._size = 0
+        self._vectors = np.empty((0, VECTOR_DIM), dtype=np.float32)
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._rows: Dict[int, int] = {}
+
+        # Same seed in every worker, so tables are identical across processes
+        rng = np.random.default_rng(seed)
+        self._width = BUCKET_WIDTH_FACTOR * self.threshold
+        self._projections = rng.standard_normal((self.tables * self.hashes, VECTOR_DIM)).astype(np.float32)
+        self._offsets = rng.uniform(0, self._width, self.tables * self.hashes).astype(np.float32)
+        self._mix = rng.integers(1, 2 ** 31, size=self.hashes, dtype=np.int64)
+        self._codes = np.empty((self.tables, 0), dtype=np.int64)
+        self._sorted_codes: List[np.ndarray] = []
+        self._sorted_rows: List[np.ndarray] = []
+        self._indexed = 0  # Rows below this are in the sorted tables
+
+        self.last_embedding_id = 0
+        self.loaded_at = time.time()
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.candidates = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH codes, shape (tables, len(vectors))"""
+        buckets = np.floor((vectors @ self._projections.T + self._offsets) / self._width).astype(np.int64)
+        # Fold each table's bucket ids into one code; rare fold collisions only add candidates
+        codes = (buckets.reshape(len(vectors), self.tables, self.hashes) * self._mix).sum(axis=2)
+        return codes.T
+
+    def lsh_codes(self, vectors: np.ndarray) -> np.ndarray:
+        """Bucket code of each vector in every table, shape (tables, len(vectors))"""
+        return self._hash(np.asarray(vectors, dtype=np.float32).reshape(-1, VECTOR_DIM))
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._user_ids):
+            return
+        capacity = max(needed, 2 * len(self._user_ids), 1024)
+        vectors = np.empty((capacity, VECTOR_DIM), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        user_ids = np.empty(capacity, dtype=np.int64)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        active = np.zeros(capacity, dtype=bool)
+        active[:self._size] = self._active[:self._size]
+        codes = np.empty((self.tables, capacity), dtype=np.int64)
+        codes[:, :self._size] = self._codes[:, :self._size]
+        self._vectors, self._user_ids, self._active, self._codes = vectors, user_ids, active, codes
+
+    def add_many(self, user_ids: np.ndarray, vectors: np.ndarray, embedding_ids: Optional[np.ndarray] = None):
+        """Insert or replace the faces of the given users"""
+        if not len(user_ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(user_ids), VECTOR_DIM)
+        codes = self._hash(vectors)
+        with self._lock:
+            self._reserve(len(user_ids))
+            start = self._size
+            end = start + len(user_ids)
+            self._vectors[start:end] = vectors
+            self._user_ids[start:end] = user_ids
+            self._active[start:end] = True
+            self._codes[:, start:end] = codes
+            for row, user_id in enumerate(user_ids.tolist(), start):
+                previous = self._rows.get(user_id)
+                if previous is not None:
+                    self._active[previous] = False
+                self._rows[user_id] = row
+            self._size = end
+            if embedding_ids is not None and len(embedding_ids):
+                self.last_embedding_id = max(self.last_embedding_id, int(np.max(embedding_ids)))
+            self._maybe_reindex()
+
+    def add(self, user_id: int, vector: np.ndarray, embedding_id: Optional[int] = None):
+        self.add_many(
+            np.array([user_id], dtype=np.int64),
+            vector[None, :],
+            np.array([embedding_id]) if embedding_id else None
+        )
+
+    def remove(self, user_id: int):
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is not None:
+                self._active[row] = False
+
+    def _maybe_reindex(self):
+        if self._size <= self.brute_force_max:
+            return
+        tail = self._size - self._indexed
+        if tail > max(REINDEX_MIN_TAIL, self._size // 20):
+            self._sorted_codes = []
+            self._sorted_rows = []
+            for table in range(self.tables):
+                order = np.argsort(self._codes[table, :self._size], kind='stable').astype(np.int32)
+                self._sorted_codes.append(self._codes[table, order])
+                self._sorted_rows.append(order)
+            self._indexed = self._size
+
+    def _candidate_rows(self, vector: np.ndarray) -> Optional[np.ndarray]:
+        """Rows worth comparing, or None to compare everything"""
+        if self._size <= self.brute_force_max or not self._indexed:
+            return None
+        codes = self._hash(vector[None, :])[:, 0]
+        parts = [np.arange(self._indexed, self._size, dtype=np.int32)]
+        for table, code in enumerate(codes):
+            lo = np.searchsorted(self._sorted_codes[table], code, side='left')
+            hi = np.searchsorted(self._sorted_codes[table], code, side='right')
+            parts.append(self._sorted_rows[table][lo:hi])
+        return np.unique(np.concatenate(parts))
+
+    def search(
+        self,
+        vector: np.ndarray,
+        exclude_user_id: Optional[int] = None,
+        threshold: Optional[float] = None
+    ) -> Optional[Tuple[int, float]]:
+        """Closest face within the threshold as (user_id, distance), or None"""
+        threshold = threshold if threshold is not None else self.threshold
+        vector = np.asarray(vector, dtype=np.float32)
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._candidate_rows(vector)
+            if rows is None:
+                vectors = self._vectors[:self._size]
+                mask = self._active[:self._size].copy()
+                user_ids = self._user_ids[:self._size]
+            else:
+                vectors = self._vectors[rows]
+                mask = self._active[rows]
+                user_ids = self._user_ids[rows]
+            if exclude_user_id is not None:
+                mask &= user_ids != exclude_user_id
+
+            match = None
+            if mask.any():
+                diff = vectors - vector
+                distances = np.einsum('ij,ij->i', diff, diff)
+                distances[~mask] = np.inf
+                best = int(np.argmin(distances))
+                distance = float(np.sqrt(distances[best]))
+                if distance <= threshold:
+                    match = (int(user_ids[best]), distance)
+
+            self.searches += 1
+            self.candidates += len(vectors)
+            self.search_seconds += time.perf_counter() - started
+        return match
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "faces": len(self._rows),
+                "rows": self._size,
+                "mode": "lsh" if self._size > self.brute_force_max and self._indexed else "brute_force",
+                "threshold": self.threshold,
+                "tables": self.tables,
+                "hashes": self.hashes,
+                "unsorted_rows": self._size - self._indexed,
+                "searches": self.searches,
+                "avg_candidates": self.candidates / self.searches if self.searches else 0.0,
+                "avg_search_ms": self.search_seconds * 1000 / self.searches if self.searches else 0.0,
+                "last_embedding_id": self.last_embedding_id,
+                "loaded_at": self.loaded_at
+            }
+
+def _load_embeddings(db: Session, after_id: int = 0, chunk_size: int = 50000):
+    rows = db.query(FaceEmbedding.id, FaceEmbedding.user_id, FaceEmbedding.vector) \
+             .filter(FaceEmbedding.id > after_id) \
+             .order_by(FaceEmbedding.id) \
+             .yield_per(chunk_size)
+    ids, user_ids, vectors = [], [], []
+    for embedding_id, user_id, data in rows:
+        vector = vector_from_bytes(data)
+        if len(vector) != VECTOR_DIM:
+            continue
+        ids.append(embedding_id)
+        user_ids.append(user_id)
+        vectors.append(vector)
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(user_ids, dtype=np.int64),
+        np.array(vectors, dtype=np.float32).reshape(len(vectors), VECTOR_DIM)
+    )
+
+_index: Optional[FaceSimilarityIndex] = None
+_index_lock = threading.Lock()
+
+def get_face_index(db: Session, full_reload: bool = False) -> FaceSimilarityIndex:
+    """Process-wide index, topped up with faces stored since the last call.
+
+    Rows only ever get appended with increasing ids, so catching up is one
+    indexed range query. A full reload every KYC_FACE_INDEX_RELOAD_INTERVAL also
+    drops faces that other workers deleted.
+    """
+    global _index
+    with _index_lock:
+        if full_reload or _index is None or time.time() - _index.loaded_at >= settings.KYC_FACE_INDEX_RELOAD_INTERVAL:
+            ids, user_ids, vectors = _load_embeddings(db)
+            index = FaceSimilarityIndex()
+            index.add_many(user_ids, vectors, ids)
+            _index = index
+        else:
+            ids, user_ids, vectors = _load_embeddings(db, _index.last_embedding_id)
+            _index.add_many(user_ids, vectors, ids)
+        return _index
+
+def find_similar_face(db: Session, vector: np.ndarray, exclude_user_id: Optional[int] = None) -> Optional[Tuple[int, float]]:
+    """(user_id, distance) of an enrolled face within KYC_FACE_MATCH_THRESHOLD, or None"""
+    return get_face_index(db).search(vector, exclude_user_id)
+
+def store_face_vector(db: Session, user_id: int, vector: np.ndarray):
+    """Stage a user's face vector, replacing any previous one; the caller commits"""
+    db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user_id).delete(synchronize_session=False)
+    db.add(FaceEmbedding(user_id=user_id, vector=vector_to_bytes(vector)))
+
+def remove_face_vector(db: Session, user_id: int):
+    """Stage deletion of a user's face vector and drop it from this worker's index"""
+    db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user_id).delete(synchronize_session=False)
+    if _index is not None:
+        _index.remove(user_id)
+
+def face_index_stats() -> Dict[str, Any]:
+    return _index.stats() if _index is not None else {"faces": 0, "loaded": False}
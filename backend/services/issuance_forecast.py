@@ -0,0 +1,227 @@
+"""
+Issuance Forecast
+Projects mining points and airdrop tokens issued under proposed reward parameters
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+from config import settings
+from models import User
+from services.mining_speed_service import get_reward_parameters, mining_speed_expression
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+class UserSnapshot:
+    """Column arrays of the reward-relevant user fields, one row per active user"""
+
+    def __init__(self, mining_speed, is_mining, last_claim_ts, level1, level2, level3, has_referrer, taken_at):
+        self.mining_speed = mining_speed
+        self.is_mining = is_mining
+        self.last_claim_ts = last_claim_ts  # Unix seconds, NaN if never claimed
+        self.level1 = level1
+        self.level2 = level2
+        self.level3 = level3
+        self.has_referrer = has_referrer
+        self.taken_at = taken_at
+
+    def __len__(self) -> int:
+        return len(self.mining_speed)
+
+    @classmethod
+    def load(cls, db: Session, chunk_size: int = 50000) -> "UserSnapshot":
+        rows = db.query(
+            User.mining_speed,
+            User.is_mining,
+            User.last_mining_claim,
+            User.level1_referrals,
+            User.level2_referrals,
+            User.level3_referrals,
+            User.referred_by.isnot(None)
+        ).filter(User.is_active == True).yield_per(chunk_size)
+
+        columns = ([], [], [], [], [], [], [])
+        for row in rows:
+            last_claim = row[2]
+            if last_claim is not None and last_claim.tzinfo is None:
+                last_claim = last_claim.replace(tzinfo=timezone.utc)
+            values = (
+                row[0] or 0.0,
+                bool(row[1]),
+                last_claim.timestamp() if last_claim else np.nan,
+                row[3] or 0,
+                row[4] or 0,
+                row[5] or 0,
+                bool(row[6])
+            )
+            for column, value in zip(columns, values):
+                column.append(value)
+
+        return cls(
+            mining_speed=np.array(columns[0], dtype=np.float64),
+            is_mining=np.array(columns[1], dtype=bool),
+            last_claim_ts=np.array(columns[2], dtype=np.float64),
+            level1=np.array(columns[3], dtype=np.int64),
+            level2=np.array(columns[4], dtype=np.int64),
+            level3=np.array(columns[5], dtype=np.int64),
+            has_referrer=np.array(columns[6], dtype=bool),
+            taken_at=time.time()
+        )
+
+_snapshot: Optional[UserSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+def get_snapshot(db: Session, refresh: bool = False) -> UserSnapshot:
+    """Cached snapshot, reloaded after FORECAST_SNAPSHOT_TTL seconds"""
+    global _snapshot
+    with _snapshot_lock:
+        if refresh or _snapshot is None or time.time() - _snapshot.taken_at >= settings.FORECAST_SNAPSHOT_TTL:
+            _snapshot = UserSnapshot.load(db)
+        return _snapshot
+
+def _decayed_running_sum(daily_inflow: np.ndarray, retention: float) -> np.ndarray:
+    """out[d] = sum over k <= d of daily_inflow[k] * retention ** (d - k)"""
+    if retention == 1.0:
+        return np.cumsum(daily_inflow)
+    days = np.arange(len(daily_inflow))
+    # Scale into a common base so the recurrence becomes one cumulative sum
+    scale = retention ** -days.astype(np.float64) if retention > 0 else None
+    if scale is None or not np.all(np.isfinite(scale)):
+        out = np.empty_like(daily_inflow)
+        running = 0.0
+        for day, inflow in enumerate(daily_inflow):
+            running = running * retention + inflow
+            out[day] = running
+        return out
+    return np.cumsum(daily_inflow * scale) / scale
+
+def forecast_scenario(
+    snapshot: UserSnapshot,
+    params: Dict[str, float],
+    days: int,
+    retention: float = 1.0,
+    daily_signups: float = 0.0,
+    referral_share: Optional[float] = None,
+    mining_adoption: Optional[float] = None
+) -> Dict[str, Any]:
+    """Project daily issuance for one parameter set.
+
+    Existing miners claim mining_speed * 24 once per day starting on the day their
+    current window matures, and each day a fraction `retention` of them keeps claiming.
+    New signups receive the airdrop tokens and base points, credit referral bonuses up
+    the chain and, for the adopting share, start mining at base speed the next day.
+    """
+    now = time.time()
+    speed = mining_speed_expression(snapshot.level1, snapshot.level2, snapshot.level3, params)
+    daily_claim = speed * 24
+
+    # Day index of each miner's first claim inside the horizon (matured windows claim today)
+    hours_until_claim = np.nan_to_num((snapshot.last_claim_ts + 24 * 3600 - now) / 3600, nan=0.0)
+    first_day = np.clip(np.floor(np.maximum(hours_until_claim, 0) / 24), 0, days).astype(np.int64)
+    miners = snapshot.is_mining & ~np.isnan(snapshot.last_claim_ts)
+
+    # Existing miners: first-claim inflow per day, carried forward with retention
+    inflow = np.bincount(first_day[miners], weights=daily_claim[miners], minlength=days + 1)[:days]
+    existing_points = _decayed_running_sum(inflow, retention)
+
+    # New signups
+    user_count = len(snapshot)
+    if referral_share is None:
+        referral_share = snapshot.has_referrer.mean() if user_count else 0.0
+    if mining_adoption is None:
+        mining_adoption = snapshot.is_mining.mean() if user_count else 0.0
+    referral_share = float(referral_share)
+    mining_adoption = float(mining_adoption)
+    chain_share = referral_share  # Share of referrers that are themselves referred
+    referral_points_per_signup = referral_share * (
+        params["level1PointsBonus"]
+        + chain_share * params["level2PointsBonus"]
+        + chain_share * chain_share * params["level3PointsBonus"]
+    )
+    referral_speed_per_signup = referral_share * (
+        params["level1SpeedBonus"]
+        + chain_share * params["level2SpeedBonus"]
+        + chain_share * chain_share * params["level3SpeedBonus"]
+    )
+    signup_points = np.full(days, daily_signups * (params["baseMiningPoints"] + referral_points_per_signup))
+    # Each day's cohort (and the referral speed it adds to referrers) starts claiming the next day
+    new_miner_inflow = np.zeros(days)
+    if days > 1:
+        new_miner_inflow[1:] = daily_signups * 24 * (mining_adoption * params["baseMiningSpeed"] + referral_speed_per_signup)
+    new_miner_points = _decayed_running_sum(new_miner_inflow, retention)
+
+    daily_points = existing_points + signup_points + new_miner_points
+    daily_tokens = np.full(days, daily_signups * params["baseAirdropTokens"])
+
+    # Per existing user expected points over the horizon
+    claim_days = np.where(miners, days - first_day, 0).astype(np.float64)
+    expected_claims = claim_days if retention == 1.0 else (1 - retention ** claim_days) / (1 - retention)
+    per_user_points = daily_claim * expected_claims
+
+    return {
+        "parameters": params,
+        "daily_points": daily_points.tolist(),
+        "cumulative_points": np.cumsum(daily_points).tolist(),
+        "daily_tokens": daily_tokens.tolist(),
+        "total_points": float(daily_points.sum()),
+        "total_tokens": float(daily_tokens.sum()),
+        "existing_miner_points": float(existing_points.sum()),
+        "new_signup_points": float(signup_points.sum() + new_miner_points.sum()),
+        "mining_speed_percentiles": dict(zip(map(str, PERCENTILES), np.percentile(speed, PERCENTILES).tolist())) if user_count else {},
+        "user_points_percentiles": dict(zip(map(str, PERCENTILES), np.percentile(per_user_points[miners], PERCENTILES).tolist())) if miners.any() else {},
+        "assumptions": {
+            "retention": retention,
+            "daily_signups": daily_signups,
+            "referral_share": referral_share,
+            "mining_adoption": mining_adoption
+        }
+    }
+
+def run_forecast(
+    db: Session,
+    scenarios: List[Dict[str, Any]],
+    days: int = 30,
+    retention: float = 1.0,
+    daily_signups: float = 0.0,
+    referral_share: Optional[float] = None,
+    mining_adoption: Optional[float] = None,
+    refresh_snapshot: bool = False
+) -> Dict[str, Any]:
+    """Evaluate the current parameters plus every proposed scenario against one user snapshot"""
+    started = time.perf_counter()
+    snapshot = get_snapshot(db, refresh=refresh_snapshot)
+    loaded = time.perf_counter()
+
+    current = get_reward_parameters(db)
+    evaluated = {}
+    for index, scenario in enumerate([{"name": "current"}] + list(scenarios)):
+        name = scenario.get("name") or f"scenario_{index}"
+        params = dict(current)
+        for key, value in scenario.items():
+            if key in params:
+                params[key] = float(value)
+        evaluated[name] = forecast_scenario(
+            snapshot, params, days,
+            retention=retention,
+            daily_signups=daily_signups,
+            referral_share=referral_share,
+            mining_adoption=mining_adoption
+        )
+    finished = time.perf_counter()
+
+    return {
+        "days": days,
+        "users": len(snapshot),
+        "miners": int(snapshot.is_mining.sum()),
+        "current_daily_capacity": float(snapshot.mining_speed[snapshot.is_mining].sum() * 24),
+        "snapshot_taken_at": datetime.fromtimestamp(snapshot.taken_at, timezone.utc).isoformat(),
+        "scenarios": evaluated,
+        "timing_ms": {
+            "snapshot": (loaded - started) * 1000,
+            "evaluation": (finished - loaded) * 1000
+        }
+    }
@@ -0,0 +1,102 @@
+"""
+KYC Image Preprocessing
+Shrinks face images to the resolution the liveness provider can use before they are sent
+"""
+
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageOps
+from config import settings
+
+EXIF_ORIENTATION = 0x0112
+
+def decode_image(data: bytes, max_dimension: Optional[int] = None) -> Image.Image:
+    """Decode to an upright RGB image no larger than max_dimension on its longest side.
+
+    JPEGs are decoded in draft mode, letting libjpeg scale by 1/2, 1/4 or 1/8 while
+    decoding, so a 12 MP upload never materializes at full size.
+    """
+    image = Image.open(io.BytesIO(data))
+    if max_dimension and image.format == 'JPEG':
+        image.draft('RGB', (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    return image
+
+def encode_jpeg(image: Image.Image, quality: Optional[int] = None) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality or settings.KYC_IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+def preprocess_image(data: bytes, max_dimension: Optional[int] = None, quality: Optional[int] = None) -> bytes:
+    """Provider-ready JPEG bytes; small upright JPEGs are passed through untouched"""
+    max_dimension = max_dimension or settings.KYC_IMAGE_MAX_DIMENSION
+    with Image.open(io.BytesIO(data)) as probe:
+        upright = probe.getexif().get(EXIF_ORIENTATION, 1) == 1
+        small = max(probe.size) <= max_dimension
+        if probe.format == 'JPEG' and small and upright:
+            return data
+
+    processed = encode_jpeg(decode_image(data, max_dimension), quality)
+    # Re-encoding a small upright PNG or WebP can come out larger; keep whichever is smaller
+    if small and upright and len(processed) >= len(data):
+        return data
+    return processed
+
+class ImagePreprocessor:
+    """Runs preprocess_image on a small dedicated thread pool and tracks its effect"""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.KYC_IMAGE_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kyc-image")
+        self._lock = threading.Lock()
+        self.images = 0
+        self.passed_through = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def _run(self, data: bytes) -> bytes:
+        started = time.perf_counter()
+        try:
+            processed = preprocess_image(data)
+        except Exception:
+            # Let the provider judge images Pillow cannot read
+            with self._lock:
+                self.failed += 1
+            return data
+        with self._lock:
+            self.images += 1
+            self.passed_through += int(processed is data)
+            self.bytes_in += len(data)
+            self.bytes_out += len(processed)
+            self.seconds += time.perf_counter() - started
+        return processed
+
+    async def prepare(self, data: bytes) -> bytes:
+        return await asyncio.wrap_future(self._executor.submit(self._run, data))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "images": self.images,
+                "passed_through": self.passed_through,
+                "failed": self.failed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "avg_ms": self.seconds * 1000 / self.images if self.images else 0.0,
+                "max_dimension": settings.KYC_IMAGE_MAX_DIMENSION,
+                "quality": settings.KYC_IMAGE_JPEG_QUALITY
+            }
+
+image_preprocessor = ImagePreprocessor()
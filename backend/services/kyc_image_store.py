@@ -0,0 +1,187 @@
+"""
+KYC Image Store
+Reference and audit images of liveness sessions, kept server-side and served by handle
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+
+_SAFE_PART = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+class StoredImage:
+    __slots__ = ("data", "etag", "created_at")
+
+    def __init__(self, data: bytes, etag: str, created_at: float):
+        self.data = data
+        self.etag = etag
+        self.created_at = created_at
+
+class KycImageStore:
+    """Byte-capped image store for KYC sessions.
+
+    Every image is written through to KYC_IMAGE_DIR, which all workers on the host
+    share, and the most recently used ones are also held in an in-memory LRU capped
+    at KYC_IMAGE_MEMORY_MAX_BYTES. Images live as long as their session
+    (KYC_SESSION_TTL) and are purged from disk by purge_expired().
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_max_bytes: Optional[int] = None, ttl: Optional[int] = None):
+        self.directory = directory or settings.KYC_IMAGE_DIR
+        self.memory_max_bytes = memory_max_bytes or settings.KYC_IMAGE_MEMORY_MAX_BYTES
+        self.ttl = ttl or settings.KYC_SESSION_TTL
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, str], StoredImage]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.disk_reads = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, session_id: str, name: str) -> str:
+        if not _SAFE_PART.match(session_id) or not _SAFE_PART.match(name):
+            raise ValueError("Invalid image handle")
+        return os.path.join(self.directory, session_id, f"{name}.jpg")
+
+    def _remember(self, key: Tuple[str, str], image: StoredImage):
+        # Caller holds the lock
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.data)
+        if len(image.data) > self.memory_max_bytes:
+            return
+        self._memory[key] = image
+        self._memory_bytes += len(image.data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.data)
+            self.evictions += 1
+
+    def put(self, session_id: str, name: str, data: bytes) -> Dict[str, Any]:
+        """Store an image and return its handle"""
+        path = self._path(session_id, name)
+        image = StoredImage(data, hashlib.sha256(data).hexdigest()[:32], time.time())
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._remember((session_id, name), image)
+        return {"name": name, "size": len(data), "etag": image.etag}
+
+    def get(self, session_id: str, name: str) -> Optional[StoredImage]:
+        key = (session_id, name)
+        path = self._path(session_id, name)
+        now = time.time()
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                if now - image.created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return image
+                del self._memory[key]
+                self._memory_bytes -= len(image.data)
+
+        # Written by this or another worker and not in memory
+        try:
+            created_at = os.path.getmtime(path)
+            if now - created_at >= self.ttl:
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        image = StoredImage(data, hashlib.sha256(data).hexdigest()[:32], created_at)
+        with self._lock:
+            self.disk_reads += 1
+            self._remember(key, image)
+        return image
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == session_id]:
+                self._memory_bytes -= len(self._memory.pop(key).data)
+        if _SAFE_PART.match(session_id):
+            shutil.rmtree(os.path.join(self.directory, session_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Remove session image directories older than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in [key for key, image in self._memory.items() if image.created_at <= cutoff]:
+                self._memory_bytes -= len(self._memory.pop(key).data)
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+
+        purged = 0
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime <= cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    purged += 1
+            except OSError:
+                continue
+        return purged
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "memory_images": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "hits": self.hits,
+                "disk_reads": self.disk_reads,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+kyc_images = KycImageStore()
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single "bytes=" range, or None for the whole body.
+
+    Raises ValueError if the range cannot be satisfied.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # Unsupported forms get the full body
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+    except ValueError:
+        raise ValueError("Invalid range")
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
@@ -0,0 +1,139 @@
+"""
+KYC Metrics
+Per-stage latency histograms, outcome counters and state gauges for the KYC pipeline
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Upper bounds in seconds; provider calls sit in the 0.1-5s range, DB stages well below
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+OUTCOMES = ("live", "not_live", "duplicate", "expired", "mock", "error")
+
+class StageHistogram:
+    __slots__ = ("counts", "count", "total", "max", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += int(error)
+
+    def cumulative(self) -> List[int]:
+        running, out = 0, []
+        for count in self.counts:
+            running += count
+            out.append(running)
+        return out
+
+class KycMetrics:
+    """Latency per pipeline stage, verdict counters and gauges read at export time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageHistogram] = {}
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.observe(seconds, error)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Time a block (sync, or spanning awaits); exceptions are counted as stage errors"""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, error)
+
+    def record_outcome(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def register_gauge(self, name: str, read: Callable[[], float]):
+        """Gauge evaluated whenever metrics are exported"""
+        self._gauges[name] = read
+
+    def read_gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                gauges[name] = float(read())
+            except Exception as e:
+                continue
+        return gauges
+
+    def to_dict(self, gauges: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "avg_ms": histogram.total * 1000 / histogram.count if histogram.count else 0.0,
+                    "max_ms": histogram.max * 1000,
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], histogram.cumulative()))
+                }
+                for stage, histogram in sorted(self.stages.items())
+            }
+            outcomes = dict(self.outcomes)
+        return {
+            "pid": os.getpid(),
+            "stages": stages,
+            "outcomes": outcomes,
+            "gauges": {**self.read_gauges(), **(gauges or {})}
+        }
+
+    def to_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition format
+
+        Histograms, counters and registered gauges live in this worker only, so
+        they carry a pid label; sum across pids in queries. The passed-in gauges
+        describe shared state and are exported without it.
+        """
+        pid = os.getpid()
+        lines = [
+            "# HELP kyc_stage_duration_seconds Time spent per KYC pipeline stage",
+            "# TYPE kyc_stage_duration_seconds histogram"
+        ]
+        errors = []
+        with self._lock:
+            for stage, histogram in sorted(self.stages.items()):
+                bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative()):
+                    lines.append(f'kyc_stage_duration_seconds_bucket{{pid="{pid}",stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'kyc_stage_duration_seconds_sum{{pid="{pid}",stage="{stage}"}} {histogram.total}')
+                lines.append(f'kyc_stage_duration_seconds_count{{pid="{pid}",stage="{stage}"}} {histogram.count}')
+                errors.append(f'kyc_stage_errors_total{{pid="{pid}",stage="{stage}"}} {histogram.errors}')
+            outcomes = dict(self.outcomes)
+
+        lines += ["# HELP kyc_stage_errors_total Stage executions that raised", "# TYPE kyc_stage_errors_total counter"] + errors
+        lines += ["# HELP kyc_outcomes_total KYC verdicts by outcome", "# TYPE kyc_outcomes_total counter"]
+        lines += [f'kyc_outcomes_total{{pid="{pid}",outcome="{outcome}"}} {count}' for outcome, count in outcomes.items()]
+        lines += ["# HELP kyc_state_size Current size of KYC state", "# TYPE kyc_state_size gauge"]
+        lines += [f'kyc_state_size{{pid="{pid}",kind="{name}"}} {value}' for name, value in sorted(self.read_gauges().items())]
+        lines += [f'kyc_state_size{{kind="{name}"}} {value}' for name, value in sorted((gauges or {}).items())]
+        return "\n".join(lines) + "\n"
+
+kyc_metrics = KycMetrics()
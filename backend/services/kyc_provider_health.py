@@ -0,0 +1,193 @@
+"""
+KYC Provider Health
+Circuit breaker for liveness provider calls and a background health probe
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Provider error codes that mean the service, not the request, is in trouble
+OUTAGE_ERROR_CODES = {
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "ServiceUnavailableException",
+    "InternalServerError",
+    "InternalFailure"
+}
+
+class ProviderUnavailableError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+def is_outage_error(error: Exception) -> bool:
+    """Timeouts, connection failures, throttling and 5xx count against the breaker; bad requests do not"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in ("EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError"):
+        return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        if response.get("Error", {}).get("Code") in OUTAGE_ERROR_CODES:
+            return True
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    return False
+
+class CircuitBreaker:
+    """Closed -> open after KYC_BREAKER_FAILURE_THRESHOLD consecutive outage errors.
+
+    While open every call is rejected immediately. After KYC_BREAKER_RESET_SECONDS
+    (or as soon as a health probe succeeds) the breaker goes half-open and lets a
+    single trial call through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.KYC_BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or settings.KYC_BREAKER_RESET_SECONDS
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self.opened_count = 0
+        self.last_failure: Optional[str] = None
+
+    def _current_state(self, now: float) -> str:
+        # Caller holds the lock
+        if self._state == OPEN and now - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.time())
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state(time.time())
+            if state == CLOSED:
+                return True
+            # A trial that never reported back (e.g. a cancelled request) is given up after one reset period
+            if state == HALF_OPEN and (not self._trial_in_flight or time.time() - self._trial_started >= self.reset_seconds):
+                self._trial_in_flight = True
+                self._trial_started = time.time()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._trial_in_flight = False
+            self.consecutive_failures = 0
+
+    def record_failure(self, error: Optional[Exception] = None):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_failure = str(error) if error else None
+            state = self._current_state(time.time())
+            if state == HALF_OPEN or (state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._trial_in_flight = False
+                self.opened_count += 1
+
+    def record_probe(self, healthy: bool, error: Optional[Exception] = None):
+        """Health probes can open the breaker, and shorten an open period once the provider answers again"""
+        if not healthy:
+            self.record_failure(error)
+            return
+        with self._lock:
+            if self._current_state(time.time()) == OPEN:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state(time.time())
+            return {
+                "state": state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_seconds,
+                "opened_at": self._opened_at or None,
+                "opened_count": self.opened_count,
+                "rejected": self.rejected,
+                "last_failure": self.last_failure
+            }
+
+class ProviderHealthMonitor:
+    """Probes the default provider every KYC_HEALTH_PROBE_INTERVAL seconds on a daemon thread.
+
+    /kyc/health reads the cached result, so load balancer checks never reach AWS,
+    and every probe also feeds the provider's circuit breaker.
+    """
+
+    def __init__(self, interval: Optional[float] = None, timeout: Optional[float] = None):
+        self.interval = interval or settings.KYC_HEALTH_PROBE_INTERVAL
+        self.timeout = timeout or settings.KYC_HEALTH_PROBE_TIMEOUT
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.probes = 0
+        self.failures = 0
+
+    def probe(self, provider) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error = None
+        try:
+            asyncio.run(asyncio.wait_for(provider.health_check(), self.timeout))
+        except Exception as e:
+            error = e
+        result = {
+            "provider": provider.name,
+            "healthy": error is None,
+            "error": str(error) if error else None,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "checked_at": time.time()
+        }
+        breaker = getattr(provider, "breaker", None)
+        if breaker is not None:
+            breaker.record_probe(error is None, error)
+        with self._lock:
+            self.last_result = result
+            self.probes += 1
+            self.failures += int(error is not None)
+        return result
+
+    def _run(self, provider_factory: Callable[[], Any]):
+        while True:
+            try:
+                self.probe(provider_factory())
+            except Exception as e:
+                pass
+            time.sleep(self.interval)
+
+    def start(self, provider_factory: Callable[[], Any]):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(provider_factory,), daemon=True)
+            self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "last_probe": dict(self.last_result) if self.last_result else None,
+                "probes": self.probes,
+                "failures": self.failures,
+                "interval_seconds": self.interval
+            }
+
+provider_health = ProviderHealthMonitor()
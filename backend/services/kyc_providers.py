@@ -0,0 +1,283 @@
+"""
+KYC Providers
+Liveness providers behind one async interface: AWS Rekognition and a local simulator
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+from config import settings
+from services.face_similarity import FACE_LANDMARKS
+from services.kyc_provider_health import CircuitBreaker, ProviderUnavailableError, OPEN, is_outage_error
+from services.kyc_metrics import kyc_metrics
+
+class KycProvider:
+    """Interface for liveness providers.
+
+    get_session_results returns a normalized dict:
+    {"status": "CREATED" | "IN_PROGRESS" | "SUCCEEDED" | "FAILED" | "EXPIRED",
+     "confidence": float | None, "reference_image": bytes | None, "audit_images": [bytes]}
+    """
+
+    name = "base"
+    is_mock = False
+
+    async def create_session(self, request: Dict[str, Any]) -> str:
+        """Start a liveness session and return the provider's session id"""
+        raise NotImplementedError
+
+    async def get_session_results(self, provider_session_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def delete_session(self, provider_session_id: str):
+        raise NotImplementedError
+
+    async def detect_face_landmarks(self, image_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+        """Landmarks ({"Type", "X", "Y"}) of the first face in the image, or None if no face was found"""
+        raise NotImplementedError
+
+    async def health_check(self):
+        """Raise if the provider is unreachable"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name}
+
+class RekognitionProvider(KycProvider):
+    name = "rekognition"
+
+    def __init__(self):
+        from services.rekognition_client import AsyncRekognitionClient
+
+        self.client = AsyncRekognitionClient(
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            region_name=os.getenv('AWS_REGION', 'us-east-1')
+        )
+
+    async def create_session(self, request: Dict[str, Any]) -> str:
+        session_params = {}
+
+        # Only add KmsKeyId if provided
+        if request.get('kms_key_id'):
+            session_params['KmsKeyId'] = request.get('kms_key_id')
+
+        # Only add Settings if S3 bucket is provided
+        if request.get('s3_bucket'):
+            session_params['Settings'] = {
+                'OutputConfig': {
+                    'S3Bucket': request.get('s3_bucket'),
+                    'S3KeyPrefix': request.get('s3_key_prefix', 'face-liveness/')
+                }
+            }
+
+        response = await self.client.create_face_liveness_session(**session_params)
+        return response['SessionId']
+
+    async def get_session_results(self, provider_session_id: str) -> Dict[str, Any]:
+        response = await self.client.get_face_liveness_session_results(provider_session_id)
+        return {
+            "status": response['Status'],
+            "confidence": response.get('Confidence'),
+            "reference_image": response.get('ReferenceImage', {}).get('Bytes'),
+            "audit_images": [image['Bytes'] for image in response.get('AuditImages', []) if 'Bytes' in image]
+        }
+
+    async def delete_session(self, provider_session_id: str):
+        await self.client.delete_face_liveness_session(provider_session_id)
+
+    async def detect_face_landmarks(self, image_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+        response = await self.client.detect_faces(image_bytes)
+        if not response['FaceDetails']:
+            return None
+        return response['FaceDetails'][0].get('Landmarks', [])
+
+    async def health_check(self):
+        await self.client.list_collections()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name, **self.client.stats()}
+
+class SimulatorProvider(KycProvider):
+    """Local stand-in for load tests and development.
+
+    Outcomes are derived from the session id, so any worker can answer for any
+    session without shared state. Call latency is lognormal around
+    KYC_SIMULATOR_LATENCY_MS and awaited with asyncio.sleep, never blocking the loop.
+    """
+
+    name = "simulator"
+    is_mock = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    async def _latency(self):
+        with self._lock:
+            self.calls += 1
+        median = settings.KYC_SIMULATOR_LATENCY_MS / 1000
+        if median > 0:
+            await asyncio.sleep(random.lognormvariate(0, settings.KYC_SIMULATOR_LATENCY_SIGMA) * median)
+
+    async def create_session(self, request: Dict[str, Any]) -> str:
+        await self._latency()
+        # Creation time travels inside the id so results can be computed statelessly
+        return f"sim-{uuid.uuid4().hex}-{int(time.time() * 1000)}"
+
+    @staticmethod
+    def _reference_image(face_seed: str) -> bytes:
+        rng = random.Random(face_seed)
+        image = Image.new('RGB', (96, 96), tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(12):
+            x, y = rng.randrange(80), rng.randrange(80)
+            image.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 16, y + 16))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        return buffer.getvalue()
+
+    async def get_session_results(self, provider_session_id: str) -> Dict[str, Any]:
+        await self._latency()
+        try:
+            created_at = int(provider_session_id.rsplit('-', 1)[1]) / 1000
+        except (IndexError, ValueError):
+            return {"status": "EXPIRED", "confidence": None, "reference_image": None, "audit_images": []}
+
+        if time.time() - created_at < settings.KYC_SIMULATOR_PROCESSING_SECONDS:
+            return {"status": "IN_PROGRESS", "confidence": None, "reference_image": None, "audit_images": []}
+
+        rng = random.Random(provider_session_id)
+        passed = rng.random() < settings.KYC_SIMULATOR_PASS_RATE
+        confidence = rng.uniform(80.5, 99.9) if passed else rng.uniform(5.0, 79.0)
+        # Duplicate faces share one seed so dedup can be exercised end to end
+        duplicate = rng.random() < settings.KYC_SIMULATOR_DUPLICATE_RATE
+        face_seed = "simulated-duplicate-face" if duplicate else provider_session_id
+
+        reference_image = await asyncio.to_thread(self._reference_image, face_seed)
+        return {
+            "status": "SUCCEEDED",
+            "confidence": confidence,
+            "reference_image": reference_image,
+            "audit_images": []
+        }
+
+    async def delete_session(self, provider_session_id: str):
+        await self._latency()
+
+    async def detect_face_landmarks(self, image_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+        await self._latency()
+        # Full Rekognition landmark set so simulated faces also get similarity vectors
+        digest = hashlib.sha512(image_bytes).digest()
+        return [
+            {"Type": landmark, "X": digest[2 * i] / 255, "Y": digest[2 * i + 1] / 255}
+            for i, landmark in enumerate(FACE_LANDMARKS)
+        ]
+
+    async def health_check(self):
+        await self._latency()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "calls": self.calls,
+            "latency_ms": settings.KYC_SIMULATOR_LATENCY_MS,
+            "latency_sigma": settings.KYC_SIMULATOR_LATENCY_SIGMA,
+            "processing_seconds": settings.KYC_SIMULATOR_PROCESSING_SECONDS,
+            "pass_rate": settings.KYC_SIMULATOR_PASS_RATE,
+            "duplicate_rate": settings.KYC_SIMULATOR_DUPLICATE_RATE
+        }
+
+class CircuitBreakingProvider(KycProvider):
+    """Wraps a provider so calls fail fast with ProviderUnavailableError while its circuit is open"""
+
+    def __init__(self, provider: KycProvider):
+        self.inner = provider
+        self.name = provider.name
+        self.is_mock = provider.is_mock
+        self.breaker = CircuitBreaker(provider.name)
+
+    def __getattr__(self, name):
+        # Provider-specific attributes such as RekognitionProvider.client
+        return getattr(self.inner, name)
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != OPEN
+
+    async def _call(self, method: str, *args):
+        if not self.breaker.allow():
+            raise ProviderUnavailableError(f"KYC provider {self.name} is temporarily unavailable")
+        try:
+            with kyc_metrics.timed(f"provider.{self.name}.{method}"):
+                result = await getattr(self.inner, method)(*args)
+        except Exception as e:
+            if is_outage_error(e):
+                self.breaker.record_failure(e)
+            else:
+                # The provider answered; the request itself was bad
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def create_session(self, request: Dict[str, Any]) -> str:
+        return await self._call("create_session", request)
+
+    async def get_session_results(self, provider_session_id: str) -> Dict[str, Any]:
+        return await self._call("get_session_results", provider_session_id)
+
+    async def delete_session(self, provider_session_id: str):
+        return await self._call("delete_session", provider_session_id)
+
+    async def detect_face_landmarks(self, image_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+        return await self._call("detect_face_landmarks", image_bytes)
+
+    async def health_check(self):
+        # Probes bypass the breaker; the health monitor reports their outcome to it
+        await self.inner.health_check()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.inner.stats(), "breaker": self.breaker.stats()}
+
+PROVIDERS = {
+    RekognitionProvider.name: RekognitionProvider,
+    SimulatorProvider.name: SimulatorProvider
+}
+
+_providers: Dict[str, CircuitBreakingProvider] = {}
+_providers_lock = threading.Lock()
+
+def default_provider_name() -> str:
+    """KYC_PROVIDER, where "auto" means Rekognition when AWS credentials are set"""
+    if settings.KYC_PROVIDER != "auto":
+        return settings.KYC_PROVIDER
+    if os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY'):
+        return RekognitionProvider.name
+    return SimulatorProvider.name
+
+def get_kyc_provider(name: Optional[str] = None) -> CircuitBreakingProvider:
+    """Provider by name (defaults to the configured one); instances are shared per process"""
+    name = name or default_provider_name()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown KYC provider: {name}")
+    if name not in _providers:
+        with _providers_lock:
+            if name not in _providers:
+                _providers[name] = CircuitBreakingProvider(PROVIDERS[name]())
+    return _providers[name]
+
+def get_session_provider() -> CircuitBreakingProvider:
+    """Provider for new sessions: the configured one, or KYC_PROVIDER_FALLBACK while its circuit is open"""
+    provider = get_kyc_provider()
+    fallback = settings.KYC_PROVIDER_FALLBACK
+    if not provider.available and fallback and fallback != provider.name:
+        return get_kyc_provider(fallback)
+    return provider
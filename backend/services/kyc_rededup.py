@@ -0,0 +1,377 @@
+"""
+KYC Re-dedup
+Offline scan of every stored face vector for duplicate clusters, resumable from a checkpoint
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from config import settings
+from database import SessionLocal, engine
+from models import FaceEmbedding, KycDuplicateCluster, User
+from services.face_similarity import FaceSimilarityIndex, VECTOR_DIM, vector_from_bytes
+from services.kyc_state import kyc_state
+
+# One LSH bucket membership: (table, code) is the bucket, row indexes vectors.f32
+ENTRY_DTYPE = np.dtype([('table', '<i2'), ('code', '<i8'), ('row', '<i4')])
+PAIR_DTYPE = np.int64
+PAIR_BLOCK = 2048  # Rows of an oversized bucket compared at once
+TABLE_SPREAD = 1000003  # Keeps equal codes of different tables in different partitions
+
+STATE_FILE = "state.json"
+VECTORS_FILE = "vectors.f32"
+USERS_FILE = "users.i64"
+
+def _partition_file(partition: int) -> str:
+    return f"part-{partition:04d}.bin"
+
+def _pairs_file(partition: int) -> str:
+    return f"pairs-{partition:04d}.npy"
+
+def scan_partition(partition_path: str, vectors_path: str, rows: int, threshold: float, out_path: str) -> int:
+    """Every pair of rows sharing a bucket in this partition and lying within threshold.
+
+    Runs in a worker process. Vectors are memory-mapped, so workers share the
+    page cache instead of each loading the whole export. Pairs are written as
+    (low row, high row) to out_path, atomically; returns how many were found.
+    """
+    entries = np.fromfile(partition_path, dtype=ENTRY_DTYPE)
+    vectors = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(rows, VECTOR_DIM))
+    entries = entries[np.lexsort((entries['code'], entries['table']))]
+
+    changes = np.flatnonzero((np.diff(entries['table']) != 0) | (np.diff(entries['code']) != 0)) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes, [len(entries)]))
+    shared = ends - starts > 1
+
+    limit = threshold * threshold
+    found = []
+    for start, end in zip(starts[shared], ends[shared]):
+        bucket_rows = np.sort(entries['row'][start:end]).astype(PAIR_DTYPE)
+        bucket = np.asarray(vectors[bucket_rows], dtype=np.float64)
+        norms = np.einsum('ij,ij->i', bucket, bucket)
+        for offset in range(0, len(bucket_rows), PAIR_BLOCK):
+            block = bucket[offset:offset + PAIR_BLOCK]
+            rest = bucket[offset:]
+            distances = norms[offset:offset + len(block), None] + norms[None, offset:] - 2 * block @ rest.T
+            i, j = np.nonzero(distances <= limit)
+            upper = i < j
+            found.append(np.stack((bucket_rows[offset + i[upper]], bucket_rows[offset + j[upper]]), axis=1))
+
+    pairs = np.unique(np.concatenate(found), axis=0) if found else np.empty((0, 2), dtype=PAIR_DTYPE)
+    with open(out_path + ".tmp", 'wb') as f:
+        np.save(f, pairs)
+    os.replace(out_path + ".tmp", out_path)
+    return len(pairs)
+
+class FaceRededupJob:
+    """Finds every cluster of near-identical faces among the stored face vectors.
+
+    The run has three phases, each checkpointed in <work_dir>/state.json:
+
+    1. export: face_embeddings are streamed in id order, KYC_REDEDUP_CHUNK_SIZE rows
+       at a time, into a flat vector file. Each vector's bucket in every LSH table
+       (the tables of the live similarity index) is appended to one of
+       KYC_REDEDUP_PARTITIONS partition files, chosen by bucket.
+    2. scan: a process pool compares the vectors within each bucket, one partition
+       per task. Finished partitions leave a pairs file behind.
+    3. report: the pairs are merged into clusters with union-find. Each cluster is
+       stored in kyc_duplicate_clusters, then copied into the violations store
+       (for KYC_REDEDUP_VIOLATION_TTL) and the admin notifications.
+
+    After a crash, run() truncates the export to the last checkpoint, skips
+    partitions that are already scanned, and skips clusters that were already
+    reported. A notification can be repeated at most once, for the cluster that
+    was in flight. Faces stored after the export phase are left to the live
+    dedup in the KYC router.
+
+    The violations must outlive this process, so the job refuses to run unless
+    KYC state is kept in Redis.
+    """
+
+    def __init__(
+        self,
+        work_dir: Optional[str] = None,
+        partitions: Optional[int] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        progress: Optional[Callable[[str], None]] = None
+    ):
+        if kyc_state.backend_name != "redis":
+            raise ValueError("KYC state is not in Redis; violations recorded by this process would be lost when it exits")
+        self.work_dir = work_dir or settings.KYC_REDEDUP_DIR
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size or settings.KYC_REDEDUP_CHUNK_SIZE
+        self.progress = progress or (lambda message: None)
+        self.index = FaceSimilarityIndex(brute_force_max=0)
+        self.state = self._load_state() or {
+            "run_id": uuid.uuid4().hex,
+            "started_at": time.time(),
+            "threshold": self.index.threshold,
+            "tables": self.index.tables,
+            "hashes": self.index.hashes,
+            "partitions": partitions or settings.KYC_REDEDUP_PARTITIONS,
+            "phase": "export",
+            "last_embedding_id": 0,
+            "rows": 0,
+            "partition_bytes": [0] * (partitions or settings.KYC_REDEDUP_PARTITIONS),
+            "scanned": [],
+            "partition_pairs": 0,
+            "pairs": None,
+            "clusters": None,
+            "reported": 0,
+            "violations": 0,
+            "finished_at": None
+        }
+        for key in ("threshold", "tables", "hashes"):
+            if self.state[key] != getattr(self.index, key):
+                raise ValueError(f"Checkpoint in {self.work_dir} was made with a different {key}; restart the run")
+        self.partitions = self.state["partitions"]
+        # Checkpoints written before runs had ids
+        self.state.setdefault("run_id", str(int(self.state["started_at"])))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.work_dir, name)
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(STATE_FILE), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        with open(self._path(STATE_FILE) + ".tmp", 'w') as f:
+            json.dump(self.state, f)
+        os.replace(self._path(STATE_FILE) + ".tmp", self._path(STATE_FILE))
+
+    def run(self) -> Dict[str, Any]:
+        os.makedirs(self.work_dir, exist_ok=True)
+        if self.state["phase"] == "export":
+            self.export()
+        if self.state["phase"] == "scan":
+            self.scan()
+        if self.state["phase"] == "report":
+            self.report()
+        return self.state
+
+    def _truncate_to_checkpoint(self):
+        """Drop anything written after the last saved chunk"""
+        sizes = {
+            VECTORS_FILE: self.state["rows"] * VECTOR_DIM * 4,
+            USERS_FILE: self.state["rows"] * 8,
+            **{_partition_file(p): size for p, size in enumerate(self.state["partition_bytes"])}
+        }
+        for name, size in sizes.items():
+            with open(self._path(name), 'ab') as f:
+                f.truncate(size)
+
+    def export(self):
+        self._truncate_to_checkpoint()
+        db = SessionLocal()
+        try:
+            while True:
+                rows = db.query(FaceEmbedding.id, FaceEmbedding.user_id, FaceEmbedding.vector) \
+                         .filter(FaceEmbedding.id > self.state["last_embedding_id"]) \
+                         .order_by(FaceEmbedding.id) \
+                         .limit(self.chunk_size) \
+                         .all()
+                if not rows:
+                    break
+
+                user_ids, vectors = [], []
+                for _, user_id, data in rows:
+                    vector = vector_from_bytes(data)
+                    if len(vector) == VECTOR_DIM:
+                        user_ids.append(user_id)
+                        vectors.append(vector)
+                self._append_chunk(np.array(user_ids, dtype=np.int64), np.array(vectors, dtype=np.float32).reshape(-1, VECTOR_DIM))
+
+                self.state["last_embedding_id"] = rows[-1][0]
+                self._save_state()
+                self.progress(f"Exported {self.state['rows']} faces")
+        finally:
+            db.close()
+
+        self.state["phase"] = "scan"
+        self._save_state()
+
+    def _append_chunk(self, user_ids: np.ndarray, vectors: np.ndarray):
+        base = self.state["rows"]
+        if len(user_ids):
+            codes = self.index.lsh_codes(vectors)
+            entries = np.empty(codes.size, dtype=ENTRY_DTYPE)
+            entries['table'] = np.repeat(np.arange(self.index.tables, dtype=np.int16), len(user_ids))
+            entries['code'] = codes.ravel()
+            entries['row'] = np.tile(np.arange(base, base + len(user_ids), dtype=np.int32), self.index.tables)
+            targets = (entries['code'] + entries['table'].astype(np.int64) * TABLE_SPREAD) % self.partitions
+
+            for partition in np.unique(targets).tolist():
+                chunk = entries[targets == partition]
+                with open(self._path(_partition_file(partition)), 'ab') as f:
+                    chunk.tofile(f)
+                self.state["partition_bytes"][partition] += chunk.nbytes
+            with open(self._path(VECTORS_FILE), 'ab') as f:
+                vectors.tofile(f)
+            with open(self._path(USERS_FILE), 'ab') as f:
+                user_ids.tofile(f)
+        self.state["rows"] = base + len(user_ids)
+
+    def scan(self):
+        scanned = set(self.state["scanned"])
+        remaining = [p for p in range(self.partitions) if p not in scanned]
+        if remaining and self.state["rows"]:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {
+                    pool.submit(
+                        scan_partition,
+                        self._path(_partition_file(partition)),
+                        self._path(VECTORS_FILE),
+                        self.state["rows"],
+                        self.state["threshold"],
+                        self._path(_pairs_file(partition))
+                    ): partition
+                    for partition in remaining
+                }
+                for future in as_completed(futures):
+                    self.state["partition_pairs"] += future.result()
+                    self.state["scanned"].append(futures[future])
+                    self._save_state()
+                    self.progress(f"Scanned {len(self.state['scanned'])}/{self.partitions} partitions")
+
+        self.state["phase"] = "report"
+        self._save_state()
+
+    def clusters(self) -> List[List[int]]:
+        """User ids of every duplicate cluster, in a stable order so reporting can resume by position"""
+        found = [np.load(self._path(_pairs_file(p))) for p in range(self.partitions) if os.path.exists(self._path(_pairs_file(p)))]
+        # Pairs close in several tables are found once per table
+        pairs = np.unique(np.concatenate(found), axis=0) if found else np.empty((0, 2), dtype=PAIR_DTYPE)
+        self.state["pairs"] = len(pairs)
+
+        parent: Dict[int, int] = {}
+        def root(row: int) -> int:
+            parent.setdefault(row, row)
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        for low, high in pairs.tolist():
+            a, b = root(low), root(high)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        members: Dict[int, List[int]] = {}
+        for row in parent:
+            members.setdefault(root(row), []).append(row)
+
+        user_ids = np.memmap(self._path(USERS_FILE), dtype=np.int64, mode='r', shape=(self.state["rows"],)) if self.state["rows"] else None
+        return [sorted(int(user_ids[row]) for row in rows) for _, rows in sorted(members.items())]
+
+    def report(self):
+        from services.notification_service import NotificationService
+
+        clusters = self.clusters()
+        self.state["clusters"] = len(clusters)
+        self._save_state()
+        # The scan runs as a script, possibly before the app has created the table
+        KycDuplicateCluster.__table__.create(bind=engine, checkfirst=True)
+
+        db = SessionLocal()
+        try:
+            for position in range(self.state["reported"], len(clusters)):
+                emails = dict(db.query(User.id, User.email).filter(User.id.in_(clusters[position])).all())
+                # Accounts deleted since the export no longer count
+                cluster = [user_id for user_id in clusters[position] if user_id in emails]
+                if len(cluster) > 1:
+                    self._record_cluster(db, NotificationService, position, cluster, emails)
+
+                self.state["reported"] = position + 1
+                self._save_state()
+                if self.state["reported"] % 100 == 0:
+                    self.progress(f"Reported {self.state['reported']}/{len(clusters)} clusters")
+        finally:
+            db.close()
+
+        self.state["phase"] = "done"
+        self.state["finished_at"] = time.time()
+        self._save_state()
+
+    def _record_cluster(self, db, notifications, position: int, cluster: List[int], emails: Dict[int, str]):
+        # Durable record first; a failure here stops the run, which resumes at this cluster
+        exists = db.query(KycDuplicateCluster.id).filter(
+            KycDuplicateCluster.run_id == self.state["run_id"],
+            KycDuplicateCluster.position == position
+        ).first()
+        if exists is None:
+            db.add(KycDuplicateCluster(
+                run_id=self.state["run_id"],
+                position=position,
+                user_ids=cluster,
+                user_emails=[emails[user_id] for user_id in cluster]
+            ))
+            db.commit()
+
+        # The oldest account is kept as the anchor; every other member is a violation against it
+        anchor = cluster[0]
+        for user_id in cluster[1:]:
+            kyc_state.record_violation(f"{anchor}_{user_id}", {
+                'user1_id': anchor,
+                'user2_id': user_id,
+                'user1_email': emails[anchor],
+                'user2_email': emails[user_id],
+                'cluster_user_ids': cluster,
+                'timestamp': time.time(),
+                'reason': 'Duplicate face found by re-dedup scan'
+            }, settings.KYC_REDEDUP_VIOLATION_TTL)
+            self.state["violations"] += 1
+
+        try:
+            notifications.create_kyc_duplicate_cluster_notification(
+                db=db,
+                user_ids=cluster,
+                user_emails=[emails[user_id] for user_id in cluster]
+            )
+        except Exception as notification_error:
+            # The violations are recorded; a failed notification should not stop the run
+            db.rollback()
+
+def reset_rededup(work_dir: Optional[str] = None):
+    """Discard a run's checkpoint and intermediate files"""
+    shutil.rmtree(work_dir or settings.KYC_REDEDUP_DIR, ignore_errors=True)
+
+def rededup_clusters(db, run_id: Optional[str] = None, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    """Stored duplicate clusters, newest run first"""
+    query = db.query(KycDuplicateCluster)
+    if run_id:
+        query = query.filter(KycDuplicateCluster.run_id == run_id)
+    rows = query.order_by(KycDuplicateCluster.id.desc()).offset(offset).limit(limit).all()
+    return [
+        {
+            "id": row.id,
+            "run_id": row.run_id,
+            "user_ids": row.user_ids,
+            "user_emails": row.user_emails,
+            "created_at": row.created_at.isoformat() if row.created_at else None
+        }
+        for row in rows
+    ]
+
+def rededup_status(work_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Checkpoint of the current or last run, or None if there is none"""
+    try:
+        with open(os.path.join(work_dir or settings.KYC_REDEDUP_DIR, STATE_FILE), 'r') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    state.pop("partition_bytes", None)
+    state["scanned"] = len(state["scanned"])
+    return state
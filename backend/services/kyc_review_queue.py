@@ -0,0 +1,110 @@
+"""
+KYC Review Queue
+Batches post-liveness face reviews (hashing, dedup, bans) off the request path
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import settings
+
+class ReviewJob:
+    __slots__ = ("session_id", "user_id", "provider", "reference_image", "enqueued_at")
+
+    def __init__(self, session_id: str, user_id: int, provider: str, reference_image: Optional[bytes] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.provider = provider
+        self.reference_image = reference_image
+        self.enqueued_at = time.time()
+
+class KycReviewQueue:
+    """In-process queue drained by KYC_REVIEW_WORKERS batch workers.
+
+    A worker takes the first waiting job, collects whatever else arrives within
+    KYC_REVIEW_BATCH_WINDOW (up to KYC_REVIEW_BATCH_SIZE jobs) and hands the batch
+    to the processor. Processors bound their provider calls with `concurrency`,
+    which is shared by every worker. Workers start on the first submit, inside
+    the running event loop.
+    """
+
+    def __init__(
+        self,
+        processor: Callable[[List[ReviewJob]], Awaitable[None]],
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        batch_window: Optional[float] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.processor = processor
+        self.batch_size = batch_size or settings.KYC_REVIEW_BATCH_SIZE
+        self.workers = workers or settings.KYC_REVIEW_WORKERS
+        self.batch_window = batch_window if batch_window is not None else settings.KYC_REVIEW_BATCH_WINDOW
+        self.concurrency = asyncio.Semaphore(concurrency or settings.KYC_REVIEW_CONCURRENCY)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.processed = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self.in_progress = 0
+        self.batch_seconds = 0.0
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def submit(self, job: ReviewJob):
+        """Queue a review; must be called from the event loop"""
+        self._ensure_workers()
+        self._queue.put_nowait(job)
+        self.submitted += 1
+
+    async def _next_batch(self) -> List[ReviewJob]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            self.in_progress += len(batch)
+            started = time.perf_counter()
+            try:
+                await self.processor(batch)
+            except Exception as e:
+                self.failed_batches += 1
+            finally:
+                self.in_progress -= len(batch)
+                self.processed += len(batch)
+                self.batches += 1
+                self.batch_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_progress": self.in_progress,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": self.processed / self.batches if self.batches else 0.0,
+            "avg_batch_seconds": self.batch_seconds / self.batches if self.batches else 0.0,
+            "workers": len([task for task in self._tasks if not task.done()])
+        }
@@ -0,0 +1,93 @@
+"""
+KYC Session Watcher
+One provider poller per liveness session, shared by every long-polling request
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+from config import settings
+
+# Provider statuses after which a session's verdict never changes
+TERMINAL_STATUSES = ('SUCCEEDED', 'FAILED', 'EXPIRED')
+
+class _Watch:
+    __slots__ = ("task", "finished", "response", "error", "waiters", "polls")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.finished = asyncio.Event()
+        self.response: Optional[Dict[str, Any]] = None  # Latest provider response
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.polls = 0
+
+class KycSessionWatcher:
+    """Long-poll support for verify-result.
+
+    The first waiter on a session starts a task that polls the provider with
+    exponential backoff (KYC_WATCH_INITIAL_DELAY up to KYC_WATCH_MAX_DELAY). Every
+    waiter on that session shares it and is woken together when the status turns
+    terminal. The task stops on its own once nobody is waiting. Watches are per
+    worker process, so N concurrent polls within a worker cost one provider poll.
+    """
+
+    def __init__(self, initial_delay: Optional[float] = None, max_delay: Optional[float] = None, backoff: float = 1.5):
+        self.initial_delay = initial_delay or settings.KYC_WATCH_INITIAL_DELAY
+        self.max_delay = max_delay or settings.KYC_WATCH_MAX_DELAY
+        self.backoff = backoff
+        self._watches: Dict[str, _Watch] = {}
+        self.provider_polls = 0
+        self.waits = 0
+
+    async def _run(self, session_id: str, watch: _Watch, provider, provider_session_id: str):
+        delay = self.initial_delay
+        try:
+            while True:
+                watch.response = await provider.get_session_results(provider_session_id)
+                watch.polls += 1
+                self.provider_polls += 1
+                if watch.response['status'] in TERMINAL_STATUSES:
+                    break
+                await asyncio.sleep(delay)
+                delay = min(delay * self.backoff, self.max_delay)
+                # No await between this check and the cleanup below, so no waiter can attach in between
+                if not watch.waiters:
+                    break
+        except Exception as e:
+            watch.error = e
+        finally:
+            watch.finished.set()
+            if self._watches.get(session_id) is watch:
+                del self._watches[session_id]
+
+    async def wait(self, session_id: str, provider, provider_session_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Latest provider response once terminal or after `timeout` seconds (None if no poll finished yet)"""
+        watch = self._watches.get(session_id)
+        if watch is None:
+            watch = _Watch()
+            self._watches[session_id] = watch
+            watch.task = asyncio.create_task(self._run(session_id, watch, provider, provider_session_id))
+
+        self.waits += 1
+        watch.waiters += 1
+        try:
+            await asyncio.wait_for(watch.finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watch.waiters -= 1
+
+        if watch.error is not None:
+            raise watch.error
+        return watch.response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watched_sessions": len(self._watches),
+            "waiters": sum(watch.waiters for watch in self._watches.values()),
+            "waits": self.waits,
+            "provider_polls": self.provider_polls
+        }
+
+session_watcher = KycSessionWatcher()
@@ -0,0 +1,612 @@
+"""
+KYC State Store
+Liveness sessions, attempt counters, bans and duplicate violations shared across workers
+"""
+
+import heapq
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from services.redis_client import get_redis_client
+
+USER = "user"
+FACE = "face"
+
+EXPIRY_CATEGORIES = ("sessions", "attempts", "bans", "violations")
+
+class SlidingWindowCounter:
+    """Events in the last `window` seconds, kept as a ring of per-bucket counts.
+
+    Resolution is one bucket (window / buckets). The ring is advanced lazily, so
+    record and count are amortized O(1): each elapsed bucket is cleared at most once.
+    """
+
+    __slots__ = ("window", "width", "counts", "epoch", "total", "last_at")
+
+    def __init__(self, window: int, buckets: int):
+        self.window = window
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.epoch: Optional[int] = None  # Bucket number (time // width) of the newest bucket
+        self.total = 0
+        self.last_at: Optional[float] = None
+
+    def _advance(self, now: float):
+        current = int(now // self.width)
+        if self.epoch is None:
+            self.epoch = current
+            return
+        steps = current - self.epoch
+        if steps <= 0:
+            return
+        size = len(self.counts)
+        if steps >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for epoch in range(self.epoch + 1, current + 1):
+                index = epoch % size
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.epoch = current
+
+    def record(self, now: float, amount: int = 1) -> int:
+        self._advance(now)
+        self.counts[self.epoch % len(self.counts)] += amount
+        self.total += amount
+        self.last_at = now
+        return self.total
+
+    def count(self, now: float) -> int:
+        self._advance(now)
+        return self.total
+
+    def buckets(self, now: float) -> List[int]:
+        """Counts from oldest to newest bucket"""
+        self._advance(now)
+        size = len(self.counts)
+        return [self.counts[(self.epoch + 1 + offset) % size] for offset in range(size)]
+
+class MemoryKycStateStore:
+    """In-process KYC state with per-entry deadlines (fallback when Redis is unavailable).
+
+    Only correct with a single worker. Expired entries are dropped on access, and
+    expire_due() retires the rest from a min-heap of deadlines so each tick only
+    touches entries that are actually due.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Tuple[float, Dict[str, Any]]] = {}  # session_id -> (expires_at, data)
+        self._user_sessions: Dict[int, Set[str]] = {}  # user_id -> session ids
+        self._attempts: Dict[Tuple[str, str], Tuple[float, SlidingWindowCounter]] = {}  # (kind, key) -> (expires_at, counter)
+        self._bans: Dict[Tuple[str, str], Tuple[float, float]] = {}  # (kind, key) -> (expires_at, banned_at)
+        self._violations: Dict[str, Tuple[float, Dict[str, Any]]] = {}  # violation_id -> (expires_at, data)
+        self._deadlines: List[Tuple[float, str, Any]] = []  # heap of (expires_at, category, key)
+        self.expiry_ticks = 0
+        self.expired_total = dict.fromkeys(EXPIRY_CATEGORIES, 0)
+        self.last_expiry_tick: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _live(mapping: dict, key, now: float):
+        entry = mapping.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del mapping[key]
+            return None
+        return entry
+
+    def _schedule(self, category: str, key, expires_at: float):
+        # Entries deleted or renewed before their deadline are skipped when popped
+        heapq.heappush(self._deadlines, (expires_at, category, key))
+
+    # Sessions
+    def _live_session(self, session_id: str, now: float):
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry[0] <= now:
+            self._drop_session(session_id)
+            return None
+        return entry
+
+    def _drop_session(self, session_id: str) -> bool:
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        user_id = entry[1].get("user_id")
+        user_sessions = self._user_sessions.get(user_id)
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self._user_sessions[user_id]
+        return True
+
+    def create_session(self, session_id: str, data: Dict[str, Any], ttl: int):
+        with self._lock:
+            self._drop_session(session_id)
+            expires_at = time.time() + ttl
+            self._sessions[session_id] = (expires_at, dict(data))
+            self._user_sessions.setdefault(data.get("user_id"), set()).add(session_id)
+            self._schedule("sessions", session_id, expires_at)
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._live_session(session_id, time.time())
+            return dict(entry[1]) if entry else None
+
+    def update_session(self, session_id: str, **fields) -> bool:
+        with self._lock:
+            entry = self._live_session(session_id, time.time())
+            if entry is None:
+                return False
+            fields.pop("user_id", None)  # Ownership is fixed; the user index depends on it
+            entry[1].update(fields)
+            return True
+
+    def claim_session(self, session_id: str, flag: str) -> bool:
+        """Set a flag on a session; True only for the one caller that set it first"""
+        with self._lock:
+            entry = self._live_session(session_id, time.time())
+            if entry is None or entry[1].get(flag):
+                return False
+            entry[1][flag] = True
+            return True
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._drop_session(session_id)
+
+    def delete_user_sessions(self, user_id: int) -> int:
+        with self._lock:
+            session_ids = list(self._user_sessions.get(user_id, ()))
+            for session_id in session_ids:
+                self._drop_session(session_id)
+            return len(session_ids)
+
+    def session_count(self) -> int:
+        # May include sessions that expired since the last expiry tick
+        return len(self._sessions)
+
+    def sessions_for_user(self, user_id: int) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return [
+                session_id for session_id in list(self._user_sessions.get(user_id, ()))
+                if self._live_session(session_id, now) is not None
+            ]
+
+    # Attempt counters (sliding window; an idle counter expires one window after its last attempt)
+    def record_attempt(self, kind: str, key, window: int) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._live(self._attempts, (kind, str(key)), now)
+            counter = entry[1] if entry else SlidingWindowCounter(window, settings.KYC_ATTEMPT_BUCKETS)
+            count = counter.record(now)
+            self._attempts[(kind, str(key))] = (now + window, counter)
+            self._schedule("attempts", (kind, str(key)), now + window)
+            return count
+
+    def attempt_count(self, kind: str, key) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._live(self._attempts, (kind, str(key)), now)
+            return entry[1].count(now) if entry else 0
+
+    def attempt_stats(self, kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Busiest attempt counters with their per-bucket breakdown"""
+        now = time.time()
+        with self._lock:
+            rows = [
+                {
+                    "kind": entry_kind,
+                    "key": key,
+                    "count": counter.count(now),
+                    "buckets": counter.buckets(now),
+                    "bucket_seconds": counter.width,
+                    "last_attempt_at": counter.last_at
+                }
+                for (entry_kind, key), (expires_at, counter) in self._attempts.items()
+                if expires_at > now and (kind is None or entry_kind == kind)
+            ]
+        rows.sort(key=lambda row: row["count"], reverse=True)
+        return rows[:limit]
+
+    def reset_attempts(self, kind: str, key):
+        with self._lock:
+            self._attempts.pop((kind, str(key)), None)
+
+    # Bans
+    def ban(self, kind: str, key, duration: int):
+        now = time.time()
+        with self._lock:
+            self._bans[(kind, str(key))] = (now + duration, now)
+            self._schedule("bans", (kind, str(key)), now + duration)
+
+    def is_banned(self, kind: str, key) -> bool:
+        with self._lock:
+            return self._live(self._bans, (kind, str(key)), time.time()) is not None
+
+    def ban_expires_at(self, kind: str, key) -> Optional[float]:
+        with self._lock:
+            entry = self._live(self._bans, (kind, str(key)), time.time())
+            return entry[0] if entry else None
+
+    def unban(self, kind: str, key):
+        with self._lock:
+            self._bans.pop((kind, str(key)), None)
+
+    # Duplicate violations
+    def record_violation(self, violation_id: str, data: Dict[str, Any], ttl: int):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._violations[violation_id] = (expires_at, dict(data))
+            self._schedule("violations", violation_id, expires_at)
+
+    def list_violations(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [dict(data) for expires_at, data in self._violations.values() if expires_at > now]
+
+    def clear_violations(self):
+        with self._lock:
+            self._violations.clear()
+
+    # Maintenance
+    def expire_due(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Retire every entry whose deadline has passed; cost scales with the entries due"""
+        now = now if now is not None else time.time()
+        started = time.perf_counter()
+        expired = dict.fromkeys(EXPIRY_CATEGORIES, 0)
+        mappings = {
+            "sessions": self._sessions,
+            "attempts": self._attempts,
+            "bans": self._bans,
+            "violations": self._violations
+        }
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, category, key = heapq.heappop(self._deadlines)
+                entry = mappings[category].get(key)
+                if entry is None or entry[0] > now:
+                    # Already deleted, or replaced with a later deadline
+                    continue
+                if category == "sessions":
+                    self._drop_session(key)
+                else:
+                    del mappings[category][key]
+                expired[category] += 1
+
+            self.expiry_ticks += 1
+            for category, count in expired.items():
+                self.expired_total[category] += count
+            self.last_expiry_tick = {
+                "at": now,
+                "expired": expired,
+                "pending_deadlines": len(self._deadlines),
+                "elapsed_ms": (time.perf_counter() - started) * 1000
+            }
+        return expired
+
+    def purge_expired(self) -> int:
+        """Retire due entries; returns the number removed"""
+        return sum(self.expire_due().values())
+
+    def expiry_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "deadline_heap",
+                "ticks": self.expiry_ticks,
+                "expired_total": dict(self.expired_total),
+                "pending_deadlines": len(self._deadlines),
+                "last_tick": self.last_expiry_tick
+            }
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            live = lambda mapping, kind=None: sum(
+                1 for key, entry in mapping.items()
+                if entry[0] > now and (kind is None or key[0] == kind)
+            )
+            return {
+                "active_sessions": live(self._sessions),
+                "user_attempts": live(self._attempts, USER),
+                "face_attempts": live(self._attempts, FACE),
+                "banned_users": live(self._bans, USER),
+                "banned_faces": live(self._bans, FACE),
+                "duplicate_violations": live(self._violations)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._user_sessions.clear()
+            self._attempts.clear()
+            self._bans.clear()
+            self._violations.clear()
+            self._deadlines.clear()
+
+class RedisKycStateStore:
+    """KYC state in Redis; expiry uses native key TTLs so every worker sees the same state"""
+
+    def __init__(self, client, prefix: str = "kyc"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return ":".join([self.prefix] + [str(part) for part in parts])
+
+    def _scan(self, pattern: str) -> List[str]:
+        return list(self.client.scan_iter(match=self._key(pattern), count=1000))
+
+    # Every expiring kind of entry is also indexed in a "<kind>_deadlines" sorted set
+    # scored by expiry, so sizes come from ZCARD instead of a keyspace scan
+    def _live_counts(self, *index_keys: str) -> List[int]:
+        now = time.time()
+        pipe = self.client.pipeline(transaction=True)
+        for index_key in index_keys:
+            pipe.zremrangebyscore(index_key, "-inf", now)
+            pipe.zcard(index_key)
+        return pipe.execute()[1::2]
+
+    # Sessions (with a per-user set of session ids, pruned lazily as sessions expire)
+    def create_session(self, session_id: str, data: Dict[str, Any], ttl: int):
+        index_key = self._key("user_sessions", data.get("user_id"))
+        pipe = self.client.pipeline(transaction=True)
+        pipe.setex(self._key("session", session_id), ttl, json.dumps(data))
+        pipe.sadd(index_key, session_id)
+        # The index outlives every session it lists by at most one TTL
+        pipe.expire(index_key, ttl)
+        pipe.zadd(self._key("session_deadlines"), {session_id: time.time() + ttl})
+        pipe.execute()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._key("session", session_id))
+        return json.loads(raw) if raw else None
+
+    def update_session(self, session_id: str, **fields) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self._key("session", session_id)
+        # Optimistic read-modify-write that keeps the session's remaining TTL
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if not raw:
+                        pipe.unwatch()
+                        return False
+                    data = json.loads(raw)
+                    fields.pop("user_id", None)  # Ownership is fixed; the user index depends on it
+                    data.update(fields)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(data), keepttl=True)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def claim_session(self, session_id: str, flag: str) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self._key("session", session_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    data = json.loads(raw) if raw else None
+                    if data is None or data.get(flag):
+                        pipe.unwatch()
+                        return False
+                    data[flag] = True
+                    pipe.multi()
+                    pipe.set(key, json.dumps(data), keepttl=True)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def delete_session(self, session_id: str) -> bool:
+        key = self._key("session", session_id)
+        raw = self.client.get(key)
+        if not raw:
+            return False
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.srem(self._key("user_sessions", json.loads(raw).get("user_id")), session_id)
+        pipe.zrem(self._key("session_deadlines"), session_id)
+        pipe.execute()
+        return True
+
+    def delete_user_sessions(self, user_id: int) -> int:
+        index_key = self._key("user_sessions", user_id)
+        session_ids = list(self.client.smembers(index_key))
+        pipe = self.client.pipeline(transaction=True)
+        for session_id in session_ids:
+            pipe.delete(self._key("session", session_id))
+        pipe.delete(index_key)
+        if session_ids:
+            pipe.zrem(self._key("session_deadlines"), *session_ids)
+        deleted = pipe.execute()
+        return sum(deleted[:len(session_ids)])
+
+    def session_count(self) -> int:
+        return self._live_counts(self._key("session_deadlines"))[0]
+
+    def sessions_for_user(self, user_id: int) -> List[str]:
+        index_key = self._key("user_sessions", user_id)
+        session_ids = list(self.client.smembers(index_key))
+        if not session_ids:
+            return []
+        pipe = self.client.pipeline()
+        for session_id in session_ids:
+            pipe.exists(self._key("session", session_id))
+        alive = pipe.execute()
+        expired = [session_id for session_id, exists in zip(session_ids, alive) if not exists]
+        if expired:
+            self.client.srem(index_key, *expired)
+        return [session_id for session_id, exists in zip(session_ids, alive) if exists]
+
+    # Attempt counters (sliding window: a hash of bucket number -> count per key)
+    @staticmethod
+    def _bucket_width(window: int) -> float:
+        return window / settings.KYC_ATTEMPT_BUCKETS
+
+    def _window_total(self, counter_key: str, buckets: Dict, window: int, now: float) -> int:
+        oldest = int(now // self._bucket_width(window)) - settings.KYC_ATTEMPT_BUCKETS + 1
+        stale = [field for field in buckets if int(field) < oldest]
+        if stale:
+            self.client.hdel(counter_key, *stale)
+        return sum(int(count) for field, count in buckets.items() if int(field) >= oldest)
+
+    def record_attempt(self, kind: str, key, window: int) -> int:
+        counter_key = self._key("attempt_window", kind, key)
+        now = time.time()
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hincrby(counter_key, int(now // self._bucket_width(window)), 1)
+        pipe.expire(counter_key, window)
+        pipe.hgetall(counter_key)
+        pipe.zadd(self._key("attempt_deadlines", kind), {str(key): now + window})
+        return self._window_total(counter_key, pipe.execute()[2], window, now)
+
+    def attempt_count(self, kind: str, key) -> int:
+        counter_key = self._key("attempt_window", kind, key)
+        return self._window_total(counter_key, self.client.hgetall(counter_key), settings.KYC_ATTEMPT_WINDOW, time.time())
+
+    def attempt_stats(self, kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        keys = self._scan(f"attempt_window:{kind}:*" if kind else "attempt_window:*")
+        if not keys:
+            return []
+        pipe = self.client.pipeline()
+        for counter_key in keys:
+            pipe.hgetall(counter_key)
+        now = time.time()
+        width = self._bucket_width(settings.KYC_ATTEMPT_WINDOW)
+        newest = int(now // width)
+        rows = []
+        for counter_key, buckets in zip(keys, pipe.execute()):
+            _, entry_kind, key = counter_key.split(":", 3)[1:]
+            counts = {int(field): int(count) for field, count in buckets.items()}
+            series = [counts.get(epoch, 0) for epoch in range(newest - settings.KYC_ATTEMPT_BUCKETS + 1, newest + 1)]
+            rows.append({
+                "kind": entry_kind,
+                "key": key,
+                "count": sum(series),
+                "buckets": series,
+                "bucket_seconds": width
+            })
+        rows.sort(key=lambda row: row["count"], reverse=True)
+        return rows[:limit]
+
+    def reset_attempts(self, kind: str, key):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key("attempt_window", kind, key))
+        pipe.zrem(self._key("attempt_deadlines", kind), str(key))
+        pipe.execute()
+
+    # Bans
+    def ban(self, kind: str, key, duration: int):
+        now = time.time()
+        pipe = self.client.pipeline(transaction=True)
+        pipe.setex(self._key("ban", kind, key), duration, now)
+        pipe.zadd(self._key("ban_deadlines", kind), {str(key): now + duration})
+        pipe.execute()
+
+    def is_banned(self, kind: str, key) -> bool:
+        return bool(self.client.exists(self._key("ban", kind, key)))
+
+    def ban_expires_at(self, kind: str, key) -> Optional[float]:
+        ttl = self.client.ttl(self._key("ban", kind, key))
+        return time.time() + ttl if ttl and ttl > 0 else None
+
+    def unban(self, kind: str, key):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key("ban", kind, key))
+        pipe.zrem(self._key("ban_deadlines", kind), str(key))
+        pipe.execute()
+
+    # Duplicate violations
+    def record_violation(self, violation_id: str, data: Dict[str, Any], ttl: int):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.setex(self._key("violation", violation_id), ttl, json.dumps(data))
+        pipe.zadd(self._key("violation_deadlines"), {violation_id: time.time() + ttl})
+        pipe.execute()
+
+    def list_violations(self) -> List[Dict[str, Any]]:
+        violation_ids = self.client.zrangebyscore(self._key("violation_deadlines"), time.time(), "+inf")
+        if not violation_ids:
+            return []
+        keys = [self._key("violation", violation_id) for violation_id in violation_ids]
+        return [json.loads(raw) for raw in self.client.mget(keys) if raw]
+
+    def clear_violations(self):
+        self._delete_keys(self._scan("violation:*") + [self._key("violation_deadlines")])
+
+    # Maintenance
+    def expire_due(self, now: Optional[float] = None) -> Dict[str, int]:
+        # Redis expires keys itself
+        return dict.fromkeys(EXPIRY_CATEGORIES, 0)
+
+    def purge_expired(self) -> int:
+        return 0
+
+    def expiry_stats(self) -> Dict[str, Any]:
+        return {"mode": "redis_ttl"}
+
+    def stats(self) -> Dict[str, int]:
+        counts = self._live_counts(
+            self._key("session_deadlines"),
+            self._key("attempt_deadlines", USER),
+            self._key("attempt_deadlines", FACE),
+            self._key("ban_deadlines", USER),
+            self._key("ban_deadlines", FACE),
+            self._key("violation_deadlines")
+        )
+        return dict(zip(
+            ("active_sessions", "user_attempts", "face_attempts", "banned_users", "banned_faces", "duplicate_violations"),
+            counts
+        ))
+
+    def _delete_keys(self, keys: List[str], chunk_size: int = 500):
+        for offset in range(0, len(keys), chunk_size):
+            self.client.delete(*keys[offset:offset + chunk_size])
+
+    def clear(self):
+        self._delete_keys(self._scan("*"))
+
+class KycStateService:
+    """Resolves the KYC state backend on first use and delegates to it"""
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """Redis if configured and reachable, in-process otherwise"""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        if settings.KYC_STATE_BACKEND in ("auto", "redis"):
+            client = get_redis_client(required=settings.KYC_STATE_BACKEND == "redis")
+            if client is not None:
+                return RedisKycStateStore(client)
+        return MemoryKycStateStore()
+
+    @property
+    def backend_name(self) -> str:
+        return "redis" if isinstance(self.backend, RedisKycStateStore) else "memory"
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+kyc_state = KycStateService()
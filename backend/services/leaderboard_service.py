@@ -0,0 +1,357 @@
+"""
+Leaderboard Service
+Maintains ranked referral and mining leaderboards incrementally
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from config import settings
+from models import User
+from services.redis_client import get_redis_client
+
+REFERRALS_BOARD = "referrals"
+MINING_BOARD = "mining"
+BOARDS = (REFERRALS_BOARD, MINING_BOARD)
+
+class RankedSkipList:
+    """Skip list with per-link spans: insert, remove and rank in O(log n), ordered iteration from the head"""
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    class _Node:
+        __slots__ = ("key", "next", "span")
+
+        def __init__(self, key, level: int):
+            self.key = key
+            self.next = [None] * level
+            self.span = [0] * level
+
+    def __init__(self):
+        self.head = self._Node(None, self.MAX_LEVEL)
+        self.level = 1
+        self.length = 0
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self.head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.span[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                self.head.span[i] = self.length
+            self.level = level
+
+        new_node = self._Node(key, level)
+        for i in range(level):
+            new_node.next[i] = update[i].next[i]
+            update[i].next[i] = new_node
+            new_node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        self.length += 1
+
+    def remove(self, key) -> bool:
+        update = [self.head] * self.MAX_LEVEL
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        node = node.next[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(self.level):
+            if update[i].next[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].span[i] -= 1
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """0-based position of key, or None if absent"""
+        node = self.head
+        traversed = 0
+        for i in range(self.level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key <= key:
+                traversed += node.span[i]
+                node = node.next[i]
+            if node is not self.head and node.key == key:
+                return traversed - 1
+        return None
+
+    def first(self, limit: int) -> List:
+        keys = []
+        node = self.head.next[0]
+        while node is not None and len(keys) < limit:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+    def __len__(self) -> int:
+        return self.length
+
+class MemoryLeaderboard:
+    """In-process leaderboard kept as a ranked skip list per board (fallback when Redis is unavailable)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, RankedSkipList] = {board: RankedSkipList() for board in BOARDS}  # (-score, user_id)
+        self._scores: Dict[str, Dict[int, float]] = {board: {} for board in BOARDS}
+        # Changes seen while a rebuild is reading the users table; replayed over its snapshot
+        self._rebuild_changes: Dict[str, Dict[int, Optional[float]]] = {}
+
+    def update(self, board: str, user_id: int, score: float):
+        with self._lock:
+            if board in self._rebuild_changes:
+                self._rebuild_changes[board][user_id] = score
+            entries = self._entries[board]
+            scores = self._scores[board]
+            old_score = scores.get(user_id)
+            if old_score == score:
+                return
+            if old_score is not None:
+                entries.remove((-old_score, user_id))
+            entries.insert((-score, user_id))
+            scores[user_id] = score
+
+    def remove(self, board: str, user_id: int):
+        with self._lock:
+            if board in self._rebuild_changes:
+                self._rebuild_changes[board][user_id] = None
+            old_score = self._scores[board].pop(user_id, None)
+            if old_score is not None:
+                self._entries[board].remove((-old_score, user_id))
+
+    def top(self, board: str, limit: int) -> List[Tuple[int, float]]:
+        with self._lock:
+            return [(user_id, -neg_score) for neg_score, user_id in self._entries[board].first(limit)]
+
+    def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        """Return (0-based rank, score) or None if the user is not ranked"""
+        with self._lock:
+            score = self._scores[board].get(user_id)
+            if score is None:
+                return None
+            return self._entries[board].rank((-score, user_id)), score
+
+    def size(self, board: str) -> int:
+        return len(self._scores[board])
+
+    def begin_rebuild(self, board: str):
+        """Start recording changes; call before reading the snapshot passed to replace()"""
+        with self._lock:
+            self._rebuild_changes[board] = {}
+
+    def replace(self, board: str, scores: Dict[int, float]):
+        scores = dict(scores)
+        entries = RankedSkipList()
+        for user_id, score in scores.items():
+            entries.insert((-score, user_id))
+        with self._lock:
+            # Changes recorded since begin_rebuild are newer than the snapshot
+            for user_id, score in self._rebuild_changes.pop(board, {}).items():
+                old_score = scores.pop(user_id, None)
+                if old_score is not None:
+                    entries.remove((-old_score, user_id))
+                if score is not None:
+                    entries.insert((-score, user_id))
+                    scores[user_id] = score
+            self._entries[board] = entries
+            self._scores[board] = scores
+
+class RedisLeaderboard:
+    """Leaderboard backed by Redis sorted sets (shared across workers)"""
+
+    # A rebuild abandoned mid-way stops mirroring updates after this long
+    REBUILD_MARKER_TTL = 600
+
+    def __init__(self, client, prefix: str = "leaderboard"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, board: str) -> str:
+        return f"{self.prefix}:{board}"
+
+    def _rebuild_key(self, board: str) -> str:
+        return f"{self._key(board)}:rebuild"
+
+    def _marker_key(self, board: str) -> str:
+        return f"{self._key(board)}:rebuilding"
+
+    def update(self, board: str, user_id: int, score: float):
+        member = {str(user_id): score}
+        # Mirror into the set being rebuilt before touching the live one, so the swap cannot drop it
+        if self.client.exists(self._marker_key(board)):
+            self.client.zadd(self._rebuild_key(board), member)
+        self.client.zadd(self._key(board), member)
+
+    def remove(self, board: str, user_id: int):
+        if self.client.exists(self._marker_key(board)):
+            self.client.zrem(self._rebuild_key(board), str(user_id))
+        self.client.zrem(self._key(board), str(user_id))
+
+    def top(self, board: str, limit: int) -> List[Tuple[int, float]]:
+        if limit <= 0:
+            return []
+        return [(int(member), score) for member, score in self.client.zrevrange(self._key(board), 0, limit - 1, withscores=True)]
+
+    def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        pipe = self.client.pipeline()
+        pipe.zrevrank(self._key(board), str(user_id))
+        pipe.zscore(self._key(board), str(user_id))
+        rank, score = pipe.execute()
+        if rank is None:
+            return None
+        return rank, score
+
+    def size(self, board: str) -> int:
+        return self.client.zcard(self._key(board))
+
+    def begin_rebuild(self, board: str):
+        """Start mirroring updates into the rebuild key; call before reading the snapshot passed to replace()"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._rebuild_key(board))
+        pipe.set(self._marker_key(board), 1, ex=self.REBUILD_MARKER_TTL)
+        pipe.execute()
+
+    def replace(self, board: str, scores: Dict[int, float], chunk_size: int = 5000):
+        # Build the new set under a temporary key and swap it in atomically
+        temp_key = self._rebuild_key(board)
+        items = list(scores.items())
+        for offset in range(0, len(items), chunk_size):
+            chunk = items[offset:offset + chunk_size]
+            # nx: a score mirrored by update() since begin_rebuild is newer than the snapshot
+            self.client.zadd(temp_key, {str(user_id): score for user_id, score in chunk}, nx=True)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zunionstore(self._key(board), [temp_key])
+        pipe.delete(temp_key)
+        pipe.delete(self._marker_key(board))
+        pipe.execute()
+
+class LeaderboardService:
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self.last_reconciled_at: Optional[float] = None
+
+    @property
+    def backend(self):
+        """Resolve the backend on first use: Redis if configured and reachable, in-process otherwise"""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        if settings.LEADERBOARD_BACKEND in ("auto", "redis"):
+            client = get_redis_client(required=settings.LEADERBOARD_BACKEND == "redis")
+            if client is not None:
+                return RedisLeaderboard(client)
+        return MemoryLeaderboard()
+
+    @property
+    def backend_name(self) -> str:
+        return "redis" if isinstance(self.backend, RedisLeaderboard) else "memory"
+
+    def record_user(self, user_id: int, referrals: Optional[float] = None, mining_points: Optional[float] = None):
+        """Apply new scores for a user; never fails the calling request"""
+        try:
+            if referrals is not None:
+                self.backend.update(REFERRALS_BOARD, user_id, referrals)
+            if mining_points is not None:
+                self.backend.update(MINING_BOARD, user_id, mining_points)
+        except Exception as e:
+            # Reconciliation will repair the board
+            pass
+
+    def remove_user(self, user_id: int):
+        try:
+            for board in BOARDS:
+                self.backend.remove(board, user_id)
+        except Exception as e:
+            pass
+
+    def top(self, board: str, limit: int = 10) -> List[Tuple[int, float]]:
+        return self.backend.top(board, limit)
+
+    def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        return self.backend.rank(board, user_id)
+
+    def size(self, board: str) -> int:
+        return self.backend.size(board)
+
+    def reconcile(self, db: Session, chunk_size: int = 5000) -> Dict[str, int]:
+        """Rebuild every board from the users table"""
+        referral_scores: Dict[int, float] = {}
+        mining_scores: Dict[int, float] = {}
+
+        for board in BOARDS:
+            self.backend.begin_rebuild(board)
+
+        rows = db.query(
+            User.id,
+            User.level1_referrals,
+            User.level2_referrals,
+            User.level3_referrals,
+            User.mining_points
+        ).filter(User.is_active == True).yield_per(chunk_size)
+
+        for row in rows:
+            total_referrals = (row.level1_referrals or 0) + (row.level2_referrals or 0) + (row.level3_referrals or 0)
+            if total_referrals:
+                referral_scores[row.id] = total_referrals
+            if row.mining_points:
+                mining_scores[row.id] = row.mining_points
+
+        self.backend.replace(REFERRALS_BOARD, referral_scores)
+        self.backend.replace(MINING_BOARD, mining_scores)
+        self.last_reconciled_at = time.time()
+
+        return {REFERRALS_BOARD: len(referral_scores), MINING_BOARD: len(mining_scores)}
+
+leaderboard = LeaderboardService()
+
+def auto_reconcile():
+    """Periodically reconcile leaderboards against the users table"""
+    from database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            leaderboard.reconcile(db)
+        except Exception as e:
+            pass
+        finally:
+            db.close()
+
+        time.sleep(settings.LEADERBOARD_RECONCILE_INTERVAL)
+
+def start_reconcile_thread():
+    """Start the background leaderboard reconciliation thread"""
+    reconcile_thread = threading.Thread(target=auto_reconcile, daemon=True)
+    reconcile_thread.start()
@@ -0,0 +1,149 @@
+"""
+Mining Auto-Claim Scheduler
+Credits matured mining sessions in chunked set-based UPDATEs (opt-in via MINING_AUTO_CLAIM_ENABLED)
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from config import settings
+from models import User
+from services.leaderboard_service import leaderboard
+from services.mining_stats_cache import mining_stats_cache
+from services.reward_ledger import record_reward
+
+CLAIM_WINDOW = timedelta(hours=24)
+
+class AutoClaimMetrics:
+    """Throughput counters for the auto-claim scheduler"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ticks = 0
+        self.total_claims = 0
+        self.total_points = 0.0
+        self.skipped_claims = 0  # Selected but already claimed by the user before the UPDATE
+        self.errors = 0
+        self.last_tick: Optional[Dict[str, Any]] = None
+
+    def record_tick(self, tick: Dict[str, Any]):
+        with self._lock:
+            self.ticks += 1
+            self.total_claims += tick["claims"]
+            self.total_points += tick["points"]
+            self.skipped_claims += tick["skipped"]
+            self.last_tick = tick
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.MINING_AUTO_CLAIM_ENABLED,
+            "interval_seconds": settings.MINING_AUTO_CLAIM_INTERVAL,
+            "chunk_size": settings.MINING_AUTO_CLAIM_CHUNK,
+            "ticks": self.ticks,
+            "total_claims": self.total_claims,
+            "total_points": self.total_points,
+            "skipped_claims": self.skipped_claims,
+            "errors": self.errors,
+            "last_tick": self.last_tick
+        }
+
+metrics = AutoClaimMetrics()
+
+def run_auto_claim(db: Session, chunk_size: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Claim every matured mining session, one chunk per UPDATE.
+
+    Sessions are found through the (is_mining, last_mining_claim) index, oldest first.
+    The UPDATE re-checks the maturity condition, so a window already claimed by the
+    user (or by another worker's scheduler) is never credited twice.
+    """
+    chunk_size = chunk_size or settings.MINING_AUTO_CLAIM_CHUNK
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - CLAIM_WINDOW
+    started = time.time()
+
+    claims = 0
+    skipped = 0
+    points = 0.0
+    chunks = 0
+    while True:
+        matured = db.query(User.id, User.last_mining_claim)\
+                    .filter(User.is_mining == True, User.last_mining_claim <= cutoff, User.is_active == True)\
+                    .order_by(User.last_mining_claim)\
+                    .limit(chunk_size)\
+                    .all()
+        if not matured:
+            break
+        windows = {row.id: row.last_mining_claim for row in matured}
+
+        claimed = db.execute(
+            update(User)
+            .where(User.id.in_(list(windows)), User.is_mining == True, User.last_mining_claim <= cutoff)
+            .values(
+                mining_points=User.mining_points + User.mining_speed * 24,
+                last_mining_claim=now
+            )
+            .returning(User.id, User.mining_speed, User.mining_points)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        for row in claimed:
+            earned = row.mining_speed * 24
+            window_start = windows[row.id]
+            record_reward(
+                db, row.id, "mining_auto_claim", "mining_points", earned,
+                event_data={"claim_window_start": window_start.isoformat() if window_start else None}
+            )
+            points += earned
+        db.commit()
+
+        for row in claimed:
+            leaderboard.record_user(row.id, mining_points=row.mining_points)
+            mining_stats_cache.invalidate(row.id)
+
+        claims += len(claimed)
+        skipped += len(windows) - len(claimed)
+        chunks += 1
+
+    elapsed = time.time() - started
+    tick = {
+        "started_at": now.isoformat(),
+        "chunks": chunks,
+        "claims": claims,
+        "skipped": skipped,
+        "points": points,
+        "elapsed_seconds": elapsed,
+        "claims_per_second": claims / elapsed if elapsed > 0 else 0.0
+    }
+    metrics.record_tick(tick)
+    return tick
+
+def auto_claim_loop():
+    """Run the auto-claim scheduler on an interval"""
+    from database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            run_auto_claim(db)
+        except Exception as e:
+            db.rollback()
+            metrics.record_error()
+        finally:
+            db.close()
+
+        time.sleep(settings.MINING_AUTO_CLAIM_INTERVAL)
+
+def start_auto_claim_thread():
+    """Start the background auto-claim thread if enabled"""
+    if not settings.MINING_AUTO_CLAIM_ENABLED:
+        return
+    auto_claim_thread = threading.Thread(target=auto_claim_loop, daemon=True)
+    auto_claim_thread.start()
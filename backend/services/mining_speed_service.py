@@ -0,0 +1,225 @@
+"""
+Mining Speed Service
+Resolves reward parameters from system settings and recomputes mining speeds in bulk
+"""
+
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+from config import settings
+from models import User, SystemSettings
+from services.mining_stats_cache import mining_stats_cache
+
+# Admin setting key -> reward parameter name
+REWARD_SETTING_KEYS = {
+    "base_rewards_airdrop_tokens": "baseAirdropTokens",
+    "base_rewards_base_mining_speed": "baseMiningSpeed",
+    "base_rewards_base_mining_points": "baseMiningPoints",
+    "referral_rewards_level1_speed_bonus": "level1SpeedBonus",
+    "referral_rewards_level1_points_bonus": "level1PointsBonus",
+    "referral_rewards_level2_speed_bonus": "level2SpeedBonus",
+    "referral_rewards_level2_points_bonus": "level2PointsBonus",
+    "referral_rewards_level3_speed_bonus": "level3SpeedBonus",
+    "referral_rewards_level3_points_bonus": "level3PointsBonus",
+}
+
+# Settings that feed the mining speed formula
+SPEED_SETTING_KEYS = {
+    "base_rewards_base_mining_speed",
+    "referral_rewards_level1_speed_bonus",
+    "referral_rewards_level2_speed_bonus",
+    "referral_rewards_level3_speed_bonus",
+}
+
+def default_reward_parameters() -> Dict[str, float]:
+    """Reward parameters from static config"""
+    return {
+        "baseAirdropTokens": float(settings.BASE_AIRDROP_TOKENS),
+        "baseMiningSpeed": float(settings.BASE_MINING_SPEED),
+        "baseMiningPoints": float(settings.BASE_MINING_POINTS),
+        "level1SpeedBonus": settings.REFERRAL_REWARDS.get("level1SpeedBonus", 2.0),
+        "level1PointsBonus": settings.REFERRAL_REWARDS.get("level1PointsBonus", 50.0),
+        "level2SpeedBonus": settings.REFERRAL_REWARDS.get("level2SpeedBonus", 1.0),
+        "level2PointsBonus": settings.REFERRAL_REWARDS.get("level2PointsBonus", 25.0),
+        "level3SpeedBonus": settings.REFERRAL_REWARDS.get("level3SpeedBonus", 0.5),
+        "level3PointsBonus": settings.REFERRAL_REWARDS.get("level3PointsBonus", 10.0),
+    }
+
+def get_reward_parameters(db: Session) -> Dict[str, float]:
+    """Reward parameters with admin overrides from SystemSettings applied on top of config"""
+    params = default_reward_parameters()
+    overrides = db.query(SystemSettings.key, SystemSettings.value)\
+                  .filter(SystemSettings.key.in_(REWARD_SETTING_KEYS.keys()))\
+                  .all()
+    for key, value in overrides:
+        try:
+            params[REWARD_SETTING_KEYS[key]] = float(value)
+        except (TypeError, ValueError):
+            # Ignore malformed admin values and keep the config default
+            pass
+    return params
+
+def mining_speed_expression(level1_referrals, level2_referrals, level3_referrals, params: Optional[Dict[str, float]] = None):
+    """Build the mining speed formula over referral counts (columns, expressions or plain numbers)"""
+    params = params or default_reward_parameters()
+    level1_bonus = level1_referrals * params["level1SpeedBonus"]
+    level2_bonus = level2_referrals * params["level2SpeedBonus"]
+    level3_bonus = level3_referrals * params["level3SpeedBonus"]
+
+    return params["baseMiningSpeed"] + level1_bonus + level2_bonus + level3_bonus
+
+class MiningSpeedRecomputeJob:
+    """Progress of one bulk recomputation run"""
+
+    def __init__(self, dry_run: bool, chunk_size: int):
+        self.job_id = str(uuid.uuid4())
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.status = "pending"
+        self.min_id: Optional[int] = None
+        self.max_id: Optional[int] = None
+        self.last_id: Optional[int] = None
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.rows_changed = 0
+        self.parameters: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.rerun_requested = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "dry_run": self.dry_run,
+            "chunk_size": self.chunk_size,
+            "id_range": [self.min_id, self.max_id],
+            "last_id": self.last_id,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "progress": self.chunks_done / self.chunks_total if self.chunks_total else (1.0 if self.status == "completed" else 0.0),
+            "rows_changed": self.rows_changed,
+            "parameters": self.parameters,
+            "error": self.error,
+            "rerun_requested": self.rerun_requested,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        }
+
+def recompute_mining_speeds(
+    db: Session,
+    job: MiningSpeedRecomputeJob,
+    params: Optional[Dict[str, float]] = None,
+    on_progress: Optional[Callable[[MiningSpeedRecomputeJob], None]] = None
+) -> MiningSpeedRecomputeJob:
+    """Apply the mining speed formula to every user, one id range per UPDATE statement.
+
+    Only rows whose stored speed differs from the formula are written. In dry-run
+    mode the same ranges are counted instead of updated.
+    """
+    job.status = "running"
+    job.started_at = time.time()
+    job.parameters = params or get_reward_parameters(db)
+    target_speed = mining_speed_expression(
+        User.level1_referrals,
+        User.level2_referrals,
+        User.level3_referrals,
+        job.parameters
+    )
+    stale = or_(User.mining_speed.is_(None), func.abs(User.mining_speed - target_speed) > 1e-9)
+
+    try:
+        job.min_id, job.max_id = db.query(func.min(User.id), func.max(User.id)).one()
+        if job.min_id is None:
+            job.status = "completed"
+            return job
+        job.chunks_total = (job.max_id - job.min_id) // job.chunk_size + 1
+
+        for start in range(job.min_id, job.max_id + 1, job.chunk_size):
+            in_range = (User.id >= start, User.id < start + job.chunk_size, stale)
+            if job.dry_run:
+                job.rows_changed += db.query(func.count(User.id)).filter(*in_range).scalar() or 0
+            else:
+                result = db.execute(
+                    update(User)
+                    .where(*in_range)
+                    .values(mining_speed=target_speed)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                job.rows_changed += result.rowcount or 0
+                if result.rowcount:
+                    mining_stats_cache.invalidate_all()
+
+            job.last_id = min(start + job.chunk_size - 1, job.max_id)
+            job.chunks_done += 1
+            if on_progress:
+                on_progress(job)
+
+        job.status = "completed"
+    except Exception as e:
+        db.rollback()
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+
+    return job
+
+# Most recent job, exposed to the admin status endpoint
+_current_job: Optional[MiningSpeedRecomputeJob] = None
+# (dry_run, chunk_size) of a run requested while another was in flight
+_pending_rerun: Optional[Tuple[bool, int]] = None
+_job_lock = threading.Lock()
+
+def get_current_job() -> Optional[MiningSpeedRecomputeJob]:
+    return _current_job
+
+def _launch_job(dry_run: bool, chunk_size: int) -> MiningSpeedRecomputeJob:
+    # Caller holds _job_lock
+    global _current_job
+    from database import SessionLocal
+
+    job = MiningSpeedRecomputeJob(dry_run=dry_run, chunk_size=chunk_size)
+    _current_job = job
+
+    def run():
+        global _pending_rerun
+        db = SessionLocal()
+        try:
+            recompute_mining_speeds(db, job)
+        finally:
+            db.close()
+            with _job_lock:
+                if _pending_rerun is not None:
+                    rerun, _pending_rerun = _pending_rerun, None
+                    _launch_job(*rerun)
+
+    threading.Thread(target=run, daemon=True).start()
+    return job
+
+def start_recompute_job(dry_run: bool = False, chunk_size: int = 10000) -> MiningSpeedRecomputeJob:
+    """Start a recomputation in a background thread.
+
+    While a job is in flight the request is remembered instead, and one more pass
+    starts when it finishes. That pass reads the reward settings afresh, so
+    settings saved mid-run are applied. Requests made during one run are
+    coalesced, and it is a real run if any of them was.
+    """
+    global _pending_rerun
+
+    chunk_size = max(1, chunk_size)
+    with _job_lock:
+        if _current_job and _current_job.status in ("pending", "running"):
+            if _pending_rerun is not None:
+                dry_run = dry_run and _pending_rerun[0]
+            _pending_rerun = (dry_run, chunk_size)
+            _current_job.rerun_requested = True
+            return _current_job
+        return _launch_job(dry_run, chunk_size)
@@ -0,0 +1,143 @@
+"""
+Mining Stats Cache
+Per-user mining anchors (rate + anchor timestamp) so clients can extrapolate locally
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta, timezone
+from typing import Any, Dict, Optional
+
+from config import settings
+from services.redis_client import get_redis_client
+
+CLAIM_INTERVAL_HOURS = 24
+
+def build_mining_anchor(user) -> Dict[str, Any]:
+    """Snapshot the fields a client needs to extrapolate mining progress without polling"""
+    last_claim = user.last_mining_claim
+    if last_claim is not None and last_claim.tzinfo is None:
+        last_claim = last_claim.replace(tzinfo=timezone.utc)
+
+    mining_speed = user.mining_speed or 0.0
+    mining_points = user.mining_points or 0.0
+    is_mining = bool(user.is_mining)
+    next_claim_at = last_claim + timedelta(hours=CLAIM_INTERVAL_HOURS) if is_mining and last_claim else None
+
+    fingerprint = f"{mining_speed!r}|{last_claim.isoformat() if last_claim else ''}|{mining_points!r}|{is_mining}"
+    return {
+        "user_id": user.id,
+        "mining_points": mining_points,
+        "mining_speed": mining_speed,
+        "points_per_second": mining_speed / 3600,
+        "is_mining": is_mining,
+        "anchor_at": last_claim.isoformat() if last_claim else None,
+        "next_claim_at": next_claim_at.isoformat() if next_claim_at else None,
+        "max_claim_points": mining_speed * CLAIM_INTERVAL_HOURS,
+        "etag": '"' + hashlib.sha1(fingerprint.encode()).hexdigest()[:20] + '"'
+    }
+
+class MiningStatsCache:
+    """Anchor cache in Redis when reachable (shared across workers), in-process otherwise.
+
+    Entries carry a generation number; bulk changes such as a mining speed
+    recomputation bump the generation instead of deleting every key.
+    """
+
+    KEY_PREFIX = "mining_anchor"
+    GENERATION_KEY = "mining_anchor:generation"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, tuple] = {}  # user_id -> (expires_at, generation, anchor)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _redis(self):
+        return get_redis_client()
+
+    def _current_generation(self) -> int:
+        client = self._redis
+        if client is not None:
+            return int(client.get(self.GENERATION_KEY) or 0)
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            client = self._redis
+            if client is not None:
+                generation, raw = client.mget(self.GENERATION_KEY, f"{self.KEY_PREFIX}:{user_id}")
+                entry = json.loads(raw) if raw else None
+                if entry and entry["generation"] == int(generation or 0):
+                    self.hits += 1
+                    return entry["anchor"]
+            else:
+                with self._lock:
+                    entry = self._entries.get(user_id)
+                    if entry and entry[0] > time.time() and entry[1] == self._generation:
+                        self.hits += 1
+                        return entry[2]
+        except Exception as e:
+            pass
+        self.misses += 1
+        return None
+
+    def set(self, user_id: int, anchor: Dict[str, Any]):
+        ttl = settings.MINING_STATS_CACHE_TTL
+        try:
+            client = self._redis
+            if client is not None:
+                entry = {"generation": self._current_generation(), "anchor": anchor}
+                client.setex(f"{self.KEY_PREFIX}:{user_id}", ttl, json.dumps(entry))
+            else:
+                with self._lock:
+                    now = time.time()
+                    if len(self._entries) >= settings.MINING_STATS_CACHE_MAX_ENTRIES:
+                        # Drop expired anchors first; if still full, start over rather than grow unbounded
+                        self._entries = {uid: entry for uid, entry in self._entries.items() if entry[0] > now}
+                        if len(self._entries) >= settings.MINING_STATS_CACHE_MAX_ENTRIES:
+                            self._entries.clear()
+                    self._entries[user_id] = (now + ttl, self._generation, anchor)
+        except Exception as e:
+            pass
+
+    def invalidate(self, user_id: int):
+        """Drop a user's anchor after a claim, speed change or ban"""
+        try:
+            client = self._redis
+            if client is not None:
+                client.delete(f"{self.KEY_PREFIX}:{user_id}")
+            else:
+                with self._lock:
+                    self._entries.pop(user_id, None)
+        except Exception as e:
+            pass
+
+    def invalidate_all(self):
+        """Invalidate every anchor at once (used after bulk mining speed changes)"""
+        try:
+            client = self._redis
+            if client is not None:
+                client.incr(self.GENERATION_KEY)
+            else:
+                with self._lock:
+                    self._generation += 1
+                    self._entries.clear()
+        except Exception as e:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis" if self._redis is not None else "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries) if self._redis is None else None
+        }
+
+mining_stats_cache = MiningStatsCache()
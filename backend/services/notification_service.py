@@ -6,7 +6,7 @@ Handles creating and managing admin notifications
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from models import AdminNotification
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class NotificationService:
     @staticmethod
@@ -75,6 +75,36 @@ class NotificationService:
             notification_data=notification_data
         )
     
+    @staticmethod
+    def create_kyc_duplicate_cluster_notification(
+        db: Session,
+        user_ids: List[int],
+        user_emails: List[str]
+    ) -> AdminNotification:
+        """Create a notification for a group of accounts found sharing one face by the re-dedup scan"""
+        
+        title = f"🚨 KYC Duplicate Cluster - {len(user_ids)} Accounts"
+        message = f"The KYC re-dedup scan found {len(user_ids)} accounts verified with the same face:\n\n" + \
+                 "\n".join(f"• {email} (ID: {user_id})" for user_id, email in zip(user_ids, user_emails)) + \
+                 "\n\nThe accounts have not been banned automatically. Review them in the KYC violations list."
+        
+        notification_data = {
+            "user_ids": user_ids,
+            "user_emails": user_emails,
+            "violation_reason": "Duplicate face found by re-dedup scan",
+            "detected_timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        
+        return NotificationService.create_notification(
+            db=db,
+            notification_type="kyc_duplicate_cluster",
+            title=title,
+            message=message,
+            user_id=user_ids[0],
+            user_email=user_emails[0],
+            notification_data=notification_data
+        )
+    
     @staticmethod
     def create_user_ban_notification(
         db: Session,
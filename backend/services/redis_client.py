@@ -0,0 +1,35 @@
+"""
+Redis Client
+Shared Redis connection for services that can run with or without Redis
+"""
+
+import threading
+from typing import Optional
+
+from config import settings
+
+_client = None
+_resolved = False
+_lock = threading.Lock()
+
+def get_redis_client(required: bool = False):
+    """Return a connected Redis client, or None if REDIS_URL is unreachable.
+
+    The first call pings the server and the outcome is cached for the process.
+    With required=True a connection failure is raised instead of returning None.
+    """
+    global _client, _resolved
+    if not _resolved:
+        with _lock:
+            if not _resolved:
+                try:
+                    import redis
+                    client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True, socket_timeout=2)
+                    client.ping()
+                    _client = client
+                except Exception as e:
+                    _client = None
+                _resolved = True
+    if _client is None and required:
+        raise ConnectionError(f"Redis is not reachable at {settings.REDIS_URL}")
+    return _client
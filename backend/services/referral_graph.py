@@ -0,0 +1,206 @@
+"""
+Referral Graph
+Compact in-memory index of the referral forest for admin analytics
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session, aliased
+from config import settings
+from models import User
+
+def expand_frontier(frontier: np.ndarray, offsets: np.ndarray, children: np.ndarray) -> np.ndarray:
+    """Gather the children of every node in frontier from the CSR arrays in one vectorized pass"""
+    starts = offsets[frontier]
+    lengths = offsets[frontier + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    run_starts = np.repeat(starts, lengths)
+    within_run = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return children[run_starts + within_run]
+
+class ReferralGraphSnapshot:
+    """Immutable CSR view of the referral forest.
+
+    Nodes are positions in user_ids (ascending user id). parent holds the parent
+    position or -1; children[offsets[i]:offsets[i + 1]] are the direct referrals of i.
+    Nodes on a referral cycle are unreachable from any root and keep depth -1.
+    """
+
+    def __init__(self, user_ids: np.ndarray, parent: np.ndarray):
+        self.user_ids = user_ids
+        self.parent = parent
+        n = len(user_ids)
+
+        has_parent = parent >= 0
+        child_nodes = np.nonzero(has_parent)[0]
+        parents_of_children = parent[child_nodes]
+        order = np.argsort(parents_of_children, kind="stable")
+        self.children = child_nodes[order]
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents_of_children, minlength=n), out=self.offsets[1:])
+
+        # Breadth-first from the roots, one vectorized step per depth level
+        self.depth = np.full(n, -1, dtype=np.int32)
+        levels: List[np.ndarray] = []
+        frontier = np.nonzero(~has_parent)[0]
+        while frontier.size:
+            self.depth[frontier] = len(levels)
+            levels.append(frontier)
+            frontier = expand_frontier(frontier, self.offsets, self.children)
+
+        # Subtree sizes accumulate bottom-up, deepest level first
+        self.subtree_size = np.ones(n, dtype=np.int64)
+        for level in reversed(levels[1:]):
+            np.add.at(self.subtree_size, parent[level], self.subtree_size[level])
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def index_of(self, user_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return position
+        return None
+
+    def subtree(self, user_id: int, max_depth: int = 10) -> Optional[Dict[str, Any]]:
+        node = self.index_of(user_id)
+        if node is None:
+            return None
+
+        # Per-level downline counts, walking down the CSR arrays
+        level_counts = []
+        frontier = np.array([node], dtype=np.int64)
+        while len(level_counts) < max_depth:
+            frontier = expand_frontier(frontier, self.offsets, self.children)
+            if not frontier.size:
+                break
+            level_counts.append(int(frontier.size))
+
+        parent = self.parent[node]
+        return {
+            "user_id": user_id,
+            "referred_by_user_id": int(self.user_ids[parent]) if parent >= 0 else None,
+            "depth": int(self.depth[node]),
+            "direct_referrals": int(self.offsets[node + 1] - self.offsets[node]),
+            "downline_size": int(self.subtree_size[node] - 1),
+            "downline_by_level": level_counts
+        }
+
+    def depth_histogram(self) -> Dict[str, Any]:
+        reachable = self.depth >= 0
+        return {
+            "histogram": np.bincount(self.depth[reachable]).tolist() if reachable.any() else [],
+            "roots": int((self.depth == 0).sum()),
+            "unreachable": int((~reachable).sum())
+        }
+
+    def top_downlines(self, limit: int = 10) -> List[Dict[str, Any]]:
+        limit = min(limit, len(self.user_ids))
+        if limit <= 0:
+            return []
+        downline = self.subtree_size - 1
+        top = np.argpartition(-downline, limit - 1)[:limit]
+        top = top[np.argsort(-downline[top], kind="stable")]
+        return [
+            {
+                "user_id": int(self.user_ids[node]),
+                "downline_size": int(downline[node]),
+                "direct_referrals": int(self.offsets[node + 1] - self.offsets[node]),
+                "depth": int(self.depth[node])
+            }
+            for node in top
+        ]
+
+class ReferralGraphIndex:
+    """Keeps a ReferralGraphSnapshot current: full loads periodically, new signups incrementally"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snapshot: Optional[ReferralGraphSnapshot] = None
+        self.last_user_id = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self.last_refresh_seconds = 0.0
+
+    def _load_edges(self, db: Session, after_id: int = 0, chunk_size: int = 50000):
+        # Resolve referral codes to parent ids in SQL so no code strings are held in memory
+        referrer = aliased(User)
+        rows = db.query(User.id, referrer.id)\
+                 .outerjoin(referrer, referrer.referral_code == User.referred_by)\
+                 .filter(User.id > after_id)\
+                 .order_by(User.id)\
+                 .yield_per(chunk_size)
+        user_ids = []
+        parent_ids = []
+        for user_id, parent_id in rows:
+            user_ids.append(user_id)
+            parent_ids.append(parent_id if parent_id is not None else -1)
+        return np.array(user_ids, dtype=np.int64), np.array(parent_ids, dtype=np.int64)
+
+    @staticmethod
+    def _to_positions(user_ids: np.ndarray, parent_ids: np.ndarray) -> np.ndarray:
+        if not len(user_ids):
+            return np.full(len(parent_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(user_ids, parent_ids), len(user_ids) - 1)
+        found = (parent_ids >= 0) & (user_ids[positions] == parent_ids)
+        return np.where(found, positions, -1)
+
+    def refresh(self, db: Session, full: bool = False) -> Dict[str, Any]:
+        """Reload the whole forest, or only users who signed up since the last load"""
+        started = time.time()
+        with self._lock:
+            snapshot = self.snapshot
+            full = full or snapshot is None or started - self.loaded_at >= settings.REFERRAL_GRAPH_FULL_RELOAD_INTERVAL
+
+            if full:
+                user_ids, parent_ids = self._load_edges(db)
+                parent = self._to_positions(user_ids, parent_ids)
+                added = len(user_ids)
+            else:
+                new_ids, new_parent_ids = self._load_edges(db, after_id=self.last_user_id)
+                added = len(new_ids)
+                if added:
+                    # New ids are larger than every loaded id, so appending keeps user_ids sorted
+                    user_ids = np.concatenate([snapshot.user_ids, new_ids])
+                    parent = np.concatenate([snapshot.parent, self._to_positions(user_ids, new_parent_ids)])
+
+            if full or added:
+                self.snapshot = ReferralGraphSnapshot(user_ids, parent)
+                if len(user_ids):
+                    self.last_user_id = int(user_ids[-1])
+            if full:
+                self.loaded_at = started
+
+            self.refreshed_at = time.time()
+            self.last_refresh_seconds = self.refreshed_at - started
+
+            return {
+                "mode": "full" if full else "incremental",
+                "users_added": added,
+                "total_users": len(self.snapshot),
+                "refresh_seconds": self.last_refresh_seconds
+            }
+
+    def get(self, db: Session) -> ReferralGraphSnapshot:
+        """Return a snapshot no older than REFERRAL_GRAPH_REFRESH_INTERVAL"""
+        if self.snapshot is None or time.time() - self.refreshed_at >= settings.REFERRAL_GRAPH_REFRESH_INTERVAL:
+            self.refresh(db)
+        return self.snapshot
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "loaded": snapshot is not None,
+            "total_users": len(snapshot) if snapshot is not None else 0,
+            "last_user_id": self.last_user_id,
+            "loaded_at": self.loaded_at or None,
+            "refreshed_at": self.refreshed_at or None,
+            "last_refresh_seconds": self.last_refresh_seconds
+        }
+
+referral_graph = ReferralGraphIndex()
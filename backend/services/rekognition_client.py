@@ -0,0 +1,151 @@
+"""
+Rekognition Client
+Runs blocking boto3 Rekognition calls on a bounded executor so they never stall the event loop
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import boto3
+from botocore.config import Config
+from config import settings
+
+class RekognitionCallMetrics:
+    """In-flight gauges and counters per Rekognition operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations: Dict[str, Dict[str, float]] = {}
+
+    def _get(self, operation: str) -> Dict[str, float]:
+        return self.operations.setdefault(operation, {
+            "queued": 0,  # Submitted, waiting for an executor thread
+            "in_flight": 0,  # Running against AWS
+            "calls": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0
+        })
+
+    def submitted(self, operation: str):
+        with self._lock:
+            self._get(operation)["queued"] += 1
+
+    def started(self, operation: str):
+        with self._lock:
+            gauges = self._get(operation)
+            gauges["queued"] -= 1
+            gauges["in_flight"] += 1
+
+    def finished(self, operation: str, elapsed: float, error: bool):
+        with self._lock:
+            gauges = self._get(operation)
+            gauges["in_flight"] -= 1
+            gauges["calls"] += 1
+            gauges["errors"] += int(error)
+            gauges["total_seconds"] += elapsed
+            gauges["max_seconds"] = max(gauges["max_seconds"], elapsed)
+
+    def timed_out(self, operation: str, never_started: bool):
+        with self._lock:
+            gauges = self._get(operation)
+            gauges["timeouts"] += 1
+            if never_started:
+                gauges["queued"] -= 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                operation: {
+                    **gauges,
+                    "avg_seconds": gauges["total_seconds"] / gauges["calls"] if gauges["calls"] else 0.0
+                }
+                for operation, gauges in self.operations.items()
+            }
+
+class AsyncRekognitionClient:
+    """Async facade over a boto3 Rekognition client.
+
+    Calls run on a dedicated executor sized like the HTTP connection pool, so at
+    most KYC_AWS_MAX_CONCURRENCY requests hit AWS at once and the rest queue.
+    Each call is bounded by KYC_AWS_CALL_TIMEOUT; botocore's own connect/read
+    timeouts stop the worker thread shortly after.
+    """
+
+    def __init__(
+        self,
+        aws_access_key_id: Optional[str],
+        aws_secret_access_key: Optional[str],
+        region_name: str,
+        max_concurrency: Optional[int] = None,
+        call_timeout: Optional[float] = None
+    ):
+        self.max_concurrency = max_concurrency or settings.KYC_AWS_MAX_CONCURRENCY
+        self.call_timeout = call_timeout or settings.KYC_AWS_CALL_TIMEOUT
+        self.configured = bool(aws_access_key_id and aws_secret_access_key)
+        self.region_name = region_name
+        self._client = boto3.client(
+            'rekognition',
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            region_name=region_name,
+            config=Config(
+                max_pool_connections=self.max_concurrency,
+                connect_timeout=settings.KYC_AWS_CONNECT_TIMEOUT,
+                read_timeout=settings.KYC_AWS_READ_TIMEOUT,
+                retries={"max_attempts": 2, "mode": "standard"}
+            )
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="rekognition")
+        self.metrics = RekognitionCallMetrics()
+
+    def _run(self, operation: str, kwargs: Dict[str, Any]):
+        self.metrics.started(operation)
+        started = time.perf_counter()
+        error = False
+        try:
+            return getattr(self._client, operation)(**kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.metrics.finished(operation, time.perf_counter() - started, error)
+
+    async def call(self, operation: str, timeout: Optional[float] = None, **kwargs):
+        """Run a Rekognition operation off the event loop"""
+        self.metrics.submitted(operation)
+        future = self._executor.submit(self._run, operation, kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.call_timeout)
+        except asyncio.TimeoutError:
+            # Timing out cancels the call if it is still queued; a running call finishes in its thread
+            self.metrics.timed_out(operation, never_started=future.cancelled())
+            raise TimeoutError(f"Rekognition {operation} timed out after {timeout or self.call_timeout}s")
+
+    async def create_face_liveness_session(self, **params):
+        return await self.call("create_face_liveness_session", **params)
+
+    async def get_face_liveness_session_results(self, session_id: str):
+        return await self.call("get_face_liveness_session_results", SessionId=session_id)
+
+    async def delete_face_liveness_session(self, session_id: str):
+        return await self.call("delete_face_liveness_session", SessionId=session_id)
+
+    async def detect_faces(self, image_bytes: bytes, attributes=("ALL",)):
+        return await self.call("detect_faces", Image={'Bytes': image_bytes}, Attributes=list(attributes))
+
+    async def list_collections(self):
+        return await self.call("list_collections")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "region": self.region_name,
+            "max_concurrency": self.max_concurrency,
+            "call_timeout_seconds": self.call_timeout,
+            "operations": self.metrics.to_dict()
+        }
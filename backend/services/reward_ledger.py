@@ -0,0 +1,277 @@
+"""
+Reward Ledger
+Append-only reward events with periodically compacted per-user balance snapshots
+
+The balance columns on users stay as a fast materialized view; the ledger is the
+source of truth for audits and rebuilds. Balance = snapshot + events after it.
+Credits keep updating those columns because the same single UPDATE already has to
+write the row (referral counters, mining_speed), and every read path uses them.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import String, cast, event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from config import settings
+from models import User, RewardEvent, RewardBalanceSnapshot, SystemSettings
+
+BALANCE_FIELDS = ("mining_points", "total_earnings", "referral_earnings")
+
+PENDING_EVENTS_KEY = "pending_reward_events"
+WATERMARK_SETTING_KEY = "reward_ledger_compacted_event_id"
+SEEDED_SETTING_KEY = "reward_ledger_seeded"
+
+def record_reward(
+    db: Session,
+    user_id: int,
+    event_type: str,
+    balance: str,
+    amount: float,
+    related_user_id: Optional[int] = None,
+    event_data: Optional[Dict[str, Any]] = None
+):
+    """Queue a reward event; it is inserted in the same transaction on the next commit"""
+    if balance not in BALANCE_FIELDS:
+        raise ValueError(f"Unknown balance field: {balance}")
+    if not amount:
+        return
+    db.info.setdefault(PENDING_EVENTS_KEY, []).append({
+        "user_id": user_id,
+        "event_type": event_type,
+        "balance": balance,
+        "amount": amount,
+        "related_user_id": related_user_id,
+        "event_data": event_data
+    })
+
+@event.listens_for(Session, "before_commit")
+def _insert_pending_events(session: Session):
+    """Write every queued event as batched multi-row inserts right before commit"""
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if not pending:
+        return
+    batch_size = settings.REWARD_LEDGER_BATCH_SIZE
+    for offset in range(0, len(pending), batch_size):
+        session.execute(insert(RewardEvent), pending[offset:offset + batch_size])
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_events(session: Session, previous_transaction):
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+def _get_setting(db: Session, key: str, default=None):
+    setting = db.query(SystemSettings).filter(SystemSettings.key == key).first()
+    return setting.value if setting else default
+
+def _advance_setting(db: Session, key: str, expected, value, description: str) -> bool:
+    """Compare-and-set a setting inside the current transaction.
+
+    Compaction and seeding run in every worker; each chunk first moves its
+    checkpoint from the value it started from, and a worker that loses the race
+    (no row matched, or the first insert collided) rolls back and skips the chunk.
+    """
+    if expected is None:
+        db.add(SystemSettings(key=key, value=value, description=description))
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    moved = db.execute(
+        update(SystemSettings)
+        .where(SystemSettings.key == key, cast(SystemSettings.value, String) == json.dumps(expected))
+        .values(value=value, updated_at=func.now())
+    ).rowcount
+    if not moved:
+        db.rollback()
+    return bool(moved)
+
+def _tail_totals(db: Session, user_id: int, after_event_id: int) -> Dict[str, float]:
+    totals = dict.fromkeys(BALANCE_FIELDS, 0.0)
+    rows = db.query(RewardEvent.balance, func.sum(RewardEvent.amount))\
+             .filter(RewardEvent.user_id == user_id, RewardEvent.id > after_event_id)\
+             .group_by(RewardEvent.balance)\
+             .all()
+    for balance, amount in rows:
+        totals[balance] += amount or 0.0
+    return totals
+
+def get_balance(db: Session, user_id: int) -> Dict[str, Any]:
+    """Current ledger balance: latest snapshot plus the events recorded after it"""
+    snapshot = db.get(RewardBalanceSnapshot, user_id)
+    after_event_id = snapshot.last_event_id if snapshot else 0
+    tail = _tail_totals(db, user_id, after_event_id)
+
+    return {
+        "user_id": user_id,
+        "snapshot_event_id": after_event_id,
+        "balances": {
+            field: ((getattr(snapshot, field) or 0.0) if snapshot else 0.0) + tail[field]
+            for field in BALANCE_FIELDS
+        }
+    }
+
+def audit_user(db: Session, user_id: int, limit: int = 100) -> Dict[str, Any]:
+    """Ledger balance next to the cached user columns, with the events after the snapshot"""
+    user = db.query(User).filter(User.id == user_id).first()
+    balance = get_balance(db, user_id)
+    tail_events = db.query(RewardEvent)\
+                    .filter(RewardEvent.user_id == user_id, RewardEvent.id > balance["snapshot_event_id"])\
+                    .order_by(RewardEvent.id.desc())\
+                    .limit(limit)\
+                    .all()
+
+    cached = {field: getattr(user, field) or 0.0 for field in BALANCE_FIELDS} if user else None
+    return {
+        **balance,
+        "cached_balances": cached,
+        "drift": {
+            field: cached[field] - balance["balances"][field] for field in BALANCE_FIELDS
+        } if cached else None,
+        "tail_events": [
+            {
+                "id": e.id,
+                "event_type": e.event_type,
+                "balance": e.balance,
+                "amount": e.amount,
+                "related_user_id": e.related_user_id,
+                "event_data": e.event_data,
+                "created_at": e.created_at.isoformat() if e.created_at else None
+            }
+            for e in tail_events
+        ]
+    }
+
+def rebuild_user_balance(db: Session, user_id: int) -> Optional[Dict[str, float]]:
+    """Overwrite the cached balance columns of a user with the ledger balance"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return None
+    balances = get_balance(db, user_id)["balances"]
+    for field in BALANCE_FIELDS:
+        setattr(user, field, balances[field])
+    db.commit()
+    return balances
+
+def compact_snapshots(db: Session, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+    """Fold events past the compaction watermark into per-user snapshots, one id range at a time.
+
+    Events younger than REWARD_LEDGER_COMPACTION_LAG are left in the tail so that
+    ids handed out to still-open transactions can't be skipped by the watermark.
+    """
+    chunk_size = chunk_size or settings.REWARD_LEDGER_COMPACTION_CHUNK
+    stored = _get_setting(db, WATERMARK_SETTING_KEY)
+    watermark = int(stored or 0)
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=settings.REWARD_LEDGER_COMPACTION_LAG)
+    upto = db.query(func.max(RewardEvent.id)).filter(RewardEvent.created_at < settled_before).scalar() or 0
+
+    events_folded = 0
+    users_updated = 0
+    while watermark < upto:
+        upper = min(watermark + chunk_size, upto)
+        # Claim the range before touching snapshots; another worker may already have folded it
+        if not _advance_setting(db, WATERMARK_SETTING_KEY, stored, upper, "Reward events folded into balance snapshots up to this id"):
+            break
+
+        rows = db.query(RewardEvent.user_id, RewardEvent.balance, func.sum(RewardEvent.amount), func.count(RewardEvent.id))\
+                 .filter(RewardEvent.id > watermark, RewardEvent.id <= upper)\
+                 .group_by(RewardEvent.user_id, RewardEvent.balance)\
+                 .all()
+
+        deltas: Dict[int, Dict[str, float]] = {}
+        for user_id, balance, amount, count in rows:
+            deltas.setdefault(user_id, dict.fromkeys(BALANCE_FIELDS, 0.0))[balance] += amount or 0.0
+            events_folded += count
+
+        snapshots = {
+            s.user_id: s
+            for s in db.query(RewardBalanceSnapshot).filter(RewardBalanceSnapshot.user_id.in_(list(deltas))).all()
+        } if deltas else {}
+        for user_id, user_deltas in deltas.items():
+            snapshot = snapshots.get(user_id)
+            if snapshot is None:
+                snapshot = RewardBalanceSnapshot(user_id=user_id, **dict.fromkeys(BALANCE_FIELDS, 0.0))
+                db.add(snapshot)
+            for field, amount in user_deltas.items():
+                setattr(snapshot, field, (getattr(snapshot, field) or 0.0) + amount)
+            snapshot.last_event_id = upper
+
+        db.commit()
+        watermark = stored = upper
+        users_updated += len(deltas)
+
+    return {
+        "watermark": watermark,
+        "events_folded": events_folded,
+        "snapshots_updated": users_updated
+    }
+
+def seed_opening_balances(db: Session, chunk_size: int = 5000) -> Dict[str, Any]:
+    """Record an opening_balance event for balances that predate the ledger (runs once).
+
+    Progress is kept as {"last_user_id": n} and advanced per chunk under the same
+    compare-and-set as the compaction watermark, so no user is seeded twice.
+    """
+    stored = _get_setting(db, SEEDED_SETTING_KEY)
+    if stored is True:
+        return {"seeded": False, "events_recorded": 0}
+
+    events_recorded = 0
+    last_id = stored["last_user_id"] if isinstance(stored, dict) else 0
+    while True:
+        users = db.query(User.id, User.mining_points, User.total_earnings, User.referral_earnings)\
+                  .filter(User.id > last_id)\
+                  .order_by(User.id)\
+                  .limit(chunk_size)\
+                  .all()
+        progress = {"last_user_id": users[-1].id} if users else True
+        if not _advance_setting(db, SEEDED_SETTING_KEY, stored, progress, "Opening balances recorded in the reward ledger"):
+            return {"seeded": False, "events_recorded": events_recorded}
+        if not users:
+            db.commit()
+            break
+        last_id = users[-1].id
+
+        recorded = db.query(RewardEvent.user_id, RewardEvent.balance, func.sum(RewardEvent.amount))\
+                     .filter(RewardEvent.user_id.in_([u.id for u in users]))\
+                     .group_by(RewardEvent.user_id, RewardEvent.balance)\
+                     .all()
+        recorded_totals = {(user_id, balance): amount or 0.0 for user_id, balance, amount in recorded}
+
+        for user in users:
+            for field in BALANCE_FIELDS:
+                opening = (getattr(user, field) or 0.0) - recorded_totals.get((user.id, field), 0.0)
+                if abs(opening) > 1e-9:
+                    record_reward(db, user.id, "opening_balance", field, opening)
+                    events_recorded += 1
+        db.commit()
+        stored = progress
+
+    return {"seeded": True, "events_recorded": events_recorded}
+
+def auto_compaction():
+    """Seed the ledger once, then compact snapshots on an interval"""
+    from database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            seed_opening_balances(db)
+            compact_snapshots(db)
+        except Exception as e:
+            db.rollback()
+        finally:
+            db.close()
+
+        time.sleep(settings.REWARD_LEDGER_COMPACTION_INTERVAL)
+
+def start_compaction_thread():
+    """Start the background ledger compaction thread"""
+    compaction_thread = threading.Thread(target=auto_compaction, daemon=True)
+    compaction_thread.start()
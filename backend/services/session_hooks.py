@@ -0,0 +1,28 @@
+"""
+Session Hooks
+Side effects (cache invalidation, leaderboard updates) that may only run once a transaction has committed
+"""
+
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+def after_commit(db: Session, callback: Callable[[], None]):
+    """Run callback when the session's current transaction commits; it is dropped on rollback"""
+    db.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session):
+    for callback in session.info.pop(AFTER_COMMIT_KEY, None) or ():
+        try:
+            callback()
+        except Exception as e:
+            # The data is committed; a failed side effect must not surface as a failed request
+            pass
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_commit(session: Session, previous_transaction):
+    session.info.pop(AFTER_COMMIT_KEY, None)
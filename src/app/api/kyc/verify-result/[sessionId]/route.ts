@@ -16,8 +16,8 @@ export async function GET(
 
     const { sessionId } = params
     
-    // Forward the request to the backend
-    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/kyc/verify-result/${sessionId}`, {
+    // Forward the request to the backend (including ?wait= for long polling)
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/kyc/verify-result/${sessionId}${request.nextUrl.search}`, {
       method: 'GET',
       headers: {
         'Authorization': authHeader,
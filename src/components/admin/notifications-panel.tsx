@@ -107,6 +107,7 @@ export function NotificationsPanel({ onMessage }: NotificationsPanelProps) {
   const getNotificationIcon = (type: string) => {
     switch (type) {
       case 'kyc_ban':
+      case 'kyc_duplicate_cluster':
         return <ShieldExclamationIcon className="w-5 h-5 text-red-400" />
       case 'user_ban':
         return <UserMinusIcon className="w-5 h-5 text-orange-400" />
@@ -118,6 +119,7 @@ export function NotificationsPanel({ onMessage }: NotificationsPanelProps) {
   const getNotificationBadgeColor = (type: string) => {
     switch (type) {
       case 'kyc_ban':
+      case 'kyc_duplicate_cluster':
         return 'bg-red-500/20 border-red-500/30'
       case 'user_ban':
         return 'bg-orange-500/20 border-orange-500/30'
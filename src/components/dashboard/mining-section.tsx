@@ -1,6 +1,6 @@
 'use client'
 
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { ClockIcon, BoltIcon, CurrencyDollarIcon, UserGroupIcon } from '@heroicons/react/24/outline'
 
@@ -22,6 +22,41 @@ interface MiningStats {
   points_earned_since_last_claim: number
 }
 
+interface MiningAnchor {
+  mining_points: number
+  mining_speed: number
+  points_per_second: number
+  is_mining: boolean
+  anchor_at: string | null
+  next_claim_at: string | null
+  max_claim_points: number
+  server_time: string
+}
+
+// The anchor only changes on claims and speed changes; revalidation is a cheap 304 otherwise
+const ANCHOR_REVALIDATE_MS = 60000
+
+// Extrapolate mining progress from the anchor instead of asking the server every tick
+function statsFromAnchor(anchor: MiningAnchor, clockOffsetMs: number): MiningStats {
+  const now = Date.now() + clockOffsetMs
+  const anchorAt = anchor.anchor_at ? new Date(anchor.anchor_at).getTime() : null
+  const nextClaimAt = anchor.next_claim_at ? new Date(anchor.next_claim_at).getTime() : null
+  const elapsedSeconds = anchorAt !== null ? Math.max(0, (now - anchorAt) / 1000) : 0
+
+  return {
+    mining_points: anchor.mining_points,
+    mining_speed: anchor.mining_speed,
+    is_mining: anchor.is_mining,
+    last_mining_claim: anchor.anchor_at,
+    time_until_next_claim: anchor.is_mining && nextClaimAt !== null && nextClaimAt > now
+      ? Math.floor((nextClaimAt - now) / 1000)
+      : null,
+    points_earned_since_last_claim: anchor.is_mining
+      ? Math.min(anchor.points_per_second * elapsedSeconds, anchor.max_claim_points)
+      : 0
+  }
+}
+
 interface MiningSectionProps {
   user: User | null
 }
@@ -30,6 +65,9 @@ export function MiningSection({ user }: MiningSectionProps) {
   const [miningStats, setMiningStats] = useState<MiningStats | null>(null)
   const [isLoading, setIsLoading] = useState(true)
   const [isHitting, setIsHitting] = useState(false)
+  const [anchor, setAnchor] = useState<MiningAnchor | null>(null)
+  const [clockOffsetMs, setClockOffsetMs] = useState(0)
+  const etagRef = useRef<string | null>(null)
 
   // Handle null user case
   if (!user) {
@@ -45,23 +83,43 @@ export function MiningSection({ user }: MiningSectionProps) {
   }
 
   useEffect(() => {
-    fetchMiningStats()
+    fetchMiningAnchor()
+    const revalidate = setInterval(fetchMiningAnchor, ANCHOR_REVALIDATE_MS)
+    return () => clearInterval(revalidate)
   }, [])
 
-  const fetchMiningStats = async () => {
+  // Local accrual tick - no request involved
+  useEffect(() => {
+    if (!anchor) return
+    setMiningStats(statsFromAnchor(anchor, clockOffsetMs))
+    if (!anchor.is_mining) return
+    const tick = setInterval(() => setMiningStats(statsFromAnchor(anchor, clockOffsetMs)), 1000)
+    return () => clearInterval(tick)
+  }, [anchor, clockOffsetMs])
+
+  const fetchMiningAnchor = async () => {
     try {
       const token = localStorage.getItem('user_token')
       if (!token) return
 
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/auth/mining/stats`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
+      const headers: Record<string, string> = {
+        'Authorization': `Bearer ${token}`
+      }
+      if (etagRef.current) {
+        headers['If-None-Match'] = etagRef.current
+      }
+
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/auth/mining/stats/anchor`, {
+        headers,
+        cache: 'no-store'
       })
 
+      // A 304 is not ok: the anchor we hold is still current
       if (response.ok) {
-        const data = await response.json()
-        setMiningStats(data)
+        const data: MiningAnchor = await response.json()
+        etagRef.current = response.headers.get('ETag')
+        setClockOffsetMs(new Date(data.server_time).getTime() - Date.now())
+        setAnchor(data)
       }
     } catch (error) {
       // Handle error silently
@@ -84,8 +142,9 @@ export function MiningSection({ user }: MiningSectionProps) {
       })
 
       if (response.ok) {
-        const data = await response.json()
-        setMiningStats(data.mining_stats)
+        // The claim moved the anchor; fetch the new one unconditionally
+        etagRef.current = null
+        await fetchMiningAnchor()
         setIsHitting(true)
         setTimeout(() => setIsHitting(false), 500)
       }
@@ -311,17 +311,25 @@ export function KYCVerification({ onComplete, onClose, userId }: KYCVerification
                   // Fetch verification results from backend
                   const token = localStorage.getItem('user_token') || localStorage.getItem('admin_token') || localStorage.getItem('token')
                   
-                  const response = await fetch(`/api/kyc/verify-result/${internalSessionId}`, {
-                    method: 'GET',
-                    headers: {
-                      'Authorization': `Bearer ${token}`,
-                      'Content-Type': 'application/json',
-                    },
-                  })
-                  
-                  const verificationResult = await response.json()
+                  // Long poll so the backend answers once the liveness result is final,
+                  // and again while the face check runs in the background
+                  let verificationResult: any = null
+                  for (let attempt = 0; attempt < 6; attempt++) {
+                    const response = await fetch(`/api/kyc/verify-result/${internalSessionId}?wait=20`, {
+                      method: 'GET',
+                      headers: {
+                        'Authorization': `Bearer ${token}`,
+                        'Content-Type': 'application/json',
+                      },
+                    })
+                    
+                    verificationResult = await response.json()
+                    if (!['PENDING_REVIEW', 'IN_PROGRESS', 'CREATED'].includes(verificationResult.status)) {
+                      break
+                    }
+                  }
                   
-                  if (verificationResult.success && verificationResult.isLive) {
+                  if (verificationResult.success && verificationResult.isLive && verificationResult.status === 'SUCCEEDED') {
                     onComplete({
                       success: true,
                       confidence: verificationResult.confidence || 0.95,